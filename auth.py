@@ -57,7 +57,7 @@ class AuthDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Введите логин и пароль.")
             return
 
-        user = self.db.fetch_one("SELECT * FROM employees WHERE login = %s", (login,))
+        user = self.db.fetch_one("SELECT id, password FROM employees WHERE login = %s", (login,))
         if user is None:
             QMessageBox.warning(self, "Ошибка", "Пользователь не найден.")
             return
@@ -100,7 +100,7 @@ class AuthDialog(QDialog):
                 QMessageBox.warning(dialog, "Ошибка", "Введите логин в основном окне.")
                 return
 
-            user = self.db.fetch_one("SELECT * FROM employees WHERE login = %s", (login,))
+            user = self.db.fetch_one("SELECT id, password FROM employees WHERE login = %s", (login,))
             if user is None:
                 QMessageBox.warning(dialog, "Ошибка", "Пользователь не найден.")
                 return
@@ -0,0 +1,373 @@
+# database/backends.py
+# Драйверы хранилища: сетевой MySQL и встроенный SQLite с тем же интерфейсом соединений
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from decimal import Decimal
+
+from database.sqlite_schema import load_mysql_dump
+
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST и обрыв на стороне клиента
+LOST_CONNECTION_CODES = (0, 2006, 2013)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCHEMA = os.path.join(PROJECT_DIR, "coffee_shop.sql")
+
+
+class MySQLBackend:
+    name = "mysql"
+
+    def __init__(self, host="localhost", user="root", password="", db="coffee_shop", port=3306):
+        import pymysql
+        self.pymysql = pymysql
+        self.errors = (pymysql.MySQLError,)
+        self.connect_kwargs = dict(host=host, user=user, password=password, db=db, port=port)
+
+    def key(self):
+        return (self.name,) + tuple(sorted(self.connect_kwargs.items()))
+
+    def connect(self):
+        return self.pymysql.connect(
+            charset="utf8mb4",
+            cursorclass=self.pymysql.cursors.DictCursor,
+            autocommit=True,
+            **self.connect_kwargs
+        )
+
+    def ping(self, connection):
+        connection.ping(reconnect=True)
+
+    def is_open(self, connection):
+        return connection.open
+
+    def is_lost(self, error):
+        if not isinstance(error, (self.pymysql.OperationalError, self.pymysql.InterfaceError)):
+            return False
+        code = error.args[0] if error.args else None
+        return code in LOST_CONNECTION_CODES
+
+    def is_row_error(self, error):
+        """Ошибка в данных строки (внешний ключ, переполнение): повтор того же запроса не поможет."""
+        return isinstance(error, (self.pymysql.IntegrityError, self.pymysql.DataError))
+
+    def stream_cursor(self, connection, as_tuples=False):
+        cursors = self.pymysql.cursors
+        return connection.cursor(cursors.SSCursor if as_tuples else cursors.SSDictCursor)
+
+    def max_packet(self, cursor):
+        cursor.execute("SELECT @@max_allowed_packet AS size")
+        return int(cursor.fetchone()["size"])
+
+    def hours_between(self, start, end):
+        """Выражение: часы между двумя столбцами TIME, с округлением до сотых."""
+        return f"ROUND(TIME_TO_SEC(TIMEDIFF({end}, {start})) / 3600, 2)"
+
+    def month_start(self, column):
+        """Выражение: первое число месяца даты column."""
+        return f"DATE_FORMAT({column}, '%%Y-%%m-01')"
+
+    def older_than_days(self, column):
+        """Условие: метка времени column старше %s дней."""
+        return f"{column} < NOW() - INTERVAL %s DAY"
+
+    def lock_rows_clause(self):
+        """Окончание SELECT, блокирующее прочитанные строки до конца транзакции."""
+        return " FOR UPDATE"
+
+    def upsert_clause(self, columns):
+        return " ON DUPLICATE KEY UPDATE " + ", ".join(f"`{c}` = VALUES(`{c}`)" for c in columns)
+
+    def upsert_add_clause(self, columns):
+        """Как upsert_clause, но значения прибавляются к уже записанным."""
+        return " ON DUPLICATE KEY UPDATE " + ", ".join(f"`{c}` = `{c}` + VALUES(`{c}`)" for c in columns)
+
+
+# === SQLite ===
+
+def translate_params(query):
+    """Плейсхолдеры pymysql (%s, %%) в стиль sqlite3 (?), не трогая строковые литералы."""
+    return _rewrite_placeholders(query, lambda: "?")
+
+
+def _rewrite_placeholders(query, placeholder):
+    if "%" not in query:
+        return query
+    out = []
+    quote = None
+    i = 0
+    n = len(query)
+    while i < n:
+        ch = query[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "%" and i + 1 < n:
+            nxt = query[i + 1]
+            if nxt == "s":
+                out.append(placeholder())
+                i += 2
+                continue
+            if nxt == "%":
+                out.append("%")
+                i += 2
+                continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def quote_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "X'" + bytes(value).hex() + "'"
+    if isinstance(value, datetime.timedelta):
+        value = _format_timedelta(value)
+    elif isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        value = value.isoformat(" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _format_timedelta(value):
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _parse_time(raw):
+    hours, minutes, seconds = (raw.decode().split(":") + ["0", "0"])[:3]
+    return datetime.timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+
+
+# Типы значений совпадают с тем, что возвращает pymysql
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime.date, lambda v: v.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(datetime.timedelta, _format_timedelta)
+sqlite3.register_converter("DECIMAL", lambda raw: Decimal(raw.decode()))
+sqlite3.register_converter("DATE", lambda raw: datetime.date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter("DATETIME", lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter("TIME", _parse_time)
+
+
+_like_cache = {}
+
+
+def _like(pattern, value, escape=None):
+    # LIKE без учёта регистра для любых алфавитов, включая кириллицу (как utf8mb4_unicode_ci)
+    if pattern is None or value is None:
+        return None
+    key = (pattern, escape)
+    regex = _like_cache.get(key)
+    if regex is None:
+        parts = []
+        i = 0
+        while i < len(pattern):
+            ch = pattern[i]
+            if escape and ch == escape and i + 1 < len(pattern):
+                parts.append(re.escape(pattern[i + 1]))
+                i += 2
+                continue
+            parts.append(".*" if ch == "%" else "." if ch == "_" else re.escape(ch))
+            i += 1
+        regex = re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+        if len(_like_cache) > 256:
+            _like_cache.clear()
+        _like_cache[key] = regex
+    return regex.fullmatch(str(value)) is not None
+
+
+def _sha1(value):
+    # Как SHA1() в MySQL: шестнадцатеричная строка в нижнем регистре
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha1(value).hexdigest()
+
+
+class SQLiteCursor:
+    """Курсор sqlite3 с интерфейсом курсора pymysql: %s-плейсхолдеры, строки-словари."""
+
+    def __init__(self, connection, as_dict=True):
+        self._cursor = connection.cursor()
+        if as_dict:
+            self._cursor.row_factory = lambda cursor, row: {
+                column[0]: value for column, value in zip(cursor.description, row)
+            }
+        self.max_stmt_length = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=None):
+        if params:
+            self._cursor.execute(translate_params(query), tuple(params))
+        else:
+            self._cursor.execute(query.replace("%%", "%") if "%%" in query else query)
+        return max(self._cursor.rowcount, 0)
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(translate_params(query), [tuple(p) for p in seq_params])
+        return max(self._cursor.rowcount, 0)
+
+    def mogrify(self, query, params=None):
+        if not params:
+            return query
+        values = iter(params)
+        return _rewrite_placeholders(query, lambda: quote_literal(next(values)))
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self._connection = sqlite3.connect(
+            path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # транзакции открываем явно, как autocommit в MySQL
+            check_same_thread=False,  # соединение переходит между потоками через пул
+            timeout=10
+        )
+        self._connection.create_function("like", 2, _like, deterministic=True)
+        self._connection.create_function("like", 3, _like, deterministic=True)
+        self._connection.create_function("sha1", 1, _sha1, deterministic=True)
+        self.open = True
+
+    @property
+    def raw(self):
+        return self._connection
+
+    def cursor(self, as_dict=True):
+        return SQLiteCursor(self._connection, as_dict)
+
+    def begin(self):
+        self._connection.execute("BEGIN")
+
+    def commit(self):
+        self._connection.execute("COMMIT")
+
+    def rollback(self):
+        self._connection.execute("ROLLBACK")
+
+    def close(self):
+        self.open = False
+        self._connection.close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path="coffee_shop.db", schema=DEFAULT_SCHEMA, mmap_size=256 * 1024 * 1024):
+        self.path = path
+        self.schema = schema
+        self.mmap_size = mmap_size
+        self.errors = (sqlite3.Error,)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def key(self):
+        return (self.name, os.path.abspath(self.path))
+
+    def connect(self):
+        connection = SQLiteConnection(self.path)
+        raw = connection.raw
+        raw.execute("PRAGMA journal_mode = WAL")
+        raw.execute("PRAGMA synchronous = NORMAL")
+        raw.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.execute("PRAGMA busy_timeout = 10000")
+
+        with self._init_lock:
+            if not self._initialized:
+                # Пустая база: создаём схему и данные из дампа MySQL
+                tables = raw.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+                if not tables and self.schema:
+                    load_mysql_dump(raw, self.schema)
+                self._initialized = True
+        return connection
+
+    def ping(self, connection):
+        pass
+
+    def is_open(self, connection):
+        return connection.open
+
+    def is_lost(self, error):
+        return False
+
+    def is_row_error(self, error):
+        return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError))
+
+    def stream_cursor(self, connection, as_tuples=False):
+        # Курсор sqlite3 и так читает результат построчно
+        return connection.cursor(as_dict=not as_tuples)
+
+    def max_packet(self, cursor):
+        # Предел длины запроса SQLite (SQLITE_MAX_SQL_LENGTH) с запасом
+        return 64 * 1024 * 1024
+
+    def hours_between(self, start, end):
+        # Время без даты strftime('%s') относит к 2000-01-01
+        return f"ROUND((strftime('%s', {end}) - strftime('%s', {start})) / 3600.0, 2)"
+
+    def month_start(self, column):
+        return f"strftime('%Y-%m-01', {column})"
+
+    def older_than_days(self, column):
+        # CURRENT_TIMESTAMP в SQLite — UTC, datetime('now') тоже
+        return f"{column} < datetime('now', '-' || %s || ' days')"
+
+    def lock_rows_clause(self):
+        # Пишущие транзакции SQLite и так идут по одной
+        return ""
+
+    def upsert_clause(self, columns):
+        return " ON CONFLICT DO UPDATE SET " + ", ".join(f"`{c}` = excluded.`{c}`" for c in columns)
+
+    def upsert_add_clause(self, columns):
+        return " ON CONFLICT DO UPDATE SET " + ", ".join(f"`{c}` = `{c}` + excluded.`{c}`" for c in columns)
+
+
+def make_backend(backend=None, path=None, **connect_kwargs):
+    """Выбор хранилища: аргумент backend или переменная окружения COFFEE_DB_BACKEND (mysql | sqlite)."""
+    name = (backend or os.environ.get("COFFEE_DB_BACKEND", "mysql")).lower()
+    if name == "sqlite":
+        return SQLiteBackend(path or os.environ.get("COFFEE_DB_PATH", os.path.join(PROJECT_DIR, "coffee_shop.db")))
+    if name == "mysql":
+        return MySQLBackend(**connect_kwargs)
+    raise ValueError(f"Неизвестный тип базы данных: {name}")
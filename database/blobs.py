@@ -0,0 +1,90 @@
+# database/blobs.py
+# Ленивые BLOB-столбцы: списки выбирают только хэш содержимого, байты — отдельно и пачками
+from typing import Dict, Iterable, Tuple
+
+# Сколько строк запрашивать одним WHERE id IN (...)
+BLOB_BATCH = 50
+
+# BLOB-столбец -> столбец с его SHA-1 (миграция 2)
+BLOB_COLUMNS = {
+    ("products", "photo"): "photo_hash",
+    ("employees", "photo_path"): "photo_hash",
+}
+
+
+class BlobColumn:
+    """Байты одного BLOB-столбца по id строк."""
+
+    def __init__(self, db, table, column, batch_size=BLOB_BATCH):
+        if (table, column) not in BLOB_COLUMNS:
+            raise ValueError(f"Столбец {table}.{column} не описан как BLOB")
+        self.db = db
+        self.table = table
+        self.column = column
+        self.hash_column = BLOB_COLUMNS[(table, column)]
+        self.batch_size = batch_size
+
+    def fetch(self, ids: Iterable[int]) -> Dict[int, bytes]:
+        ids = list(dict.fromkeys(ids))
+        result = {}
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            rows = self.db.fetch_all(
+                f"SELECT id, {self.column} AS data FROM {self.table} WHERE id IN ({placeholders})",
+                batch
+            )
+            result.update((row['id'], row['data']) for row in rows if row['data'] is not None)
+        return result
+
+    def fetch_one(self, row_id):
+        return self.fetch([row_id]).get(row_id)
+
+
+# Уменьшенные копии фото (миниатюра, карточка, полный размер) в photo_renditions (миграция 4):
+# (название, MIME-тип, ширина, высота, байты)
+Rendition = Tuple[str, str, int, int, bytes]
+
+
+def save_renditions(db, owner_table, owner_id, renditions: Iterable[Rendition]):
+    """Заменяет все копии фото строки owner_table.owner_id."""
+    with db.transaction():
+        db.execute("DELETE FROM photo_renditions WHERE owner_table = %s AND owner_id = %s",
+                   (owner_table, owner_id))
+        rows = [(owner_table, owner_id, name, mime, width, height, data)
+                for name, mime, width, height, data in renditions]
+        if rows:
+            db.execute_many("""
+                INSERT INTO photo_renditions (owner_table, owner_id, rendition, mime, width, height, data)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+
+
+class RenditionSource:
+    """Байты копии фото нужного размера; для строк без копий — из исходного BLOB-столбца."""
+
+    def __init__(self, db, owner_table, rendition, fallback=None, batch_size=BLOB_BATCH):
+        self.db = db
+        self.owner_table = owner_table
+        self.rendition = rendition
+        self.fallback = fallback
+        self.batch_size = batch_size
+
+    def fetch(self, ids: Iterable[int]) -> Dict[int, bytes]:
+        ids = list(dict.fromkeys(ids))
+        result = {}
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            rows = self.db.fetch_all(f"""
+                SELECT owner_id, data FROM photo_renditions
+                WHERE owner_table = %s AND rendition = %s AND owner_id IN ({placeholders})
+            """, [self.owner_table, self.rendition] + batch)
+            result.update((row['owner_id'], row['data']) for row in rows)
+        missing = [i for i in ids if i not in result]
+        if missing and self.fallback is not None:
+            result.update(self.fallback.fetch(missing))
+        return result
+
+    def fetch_one(self, row_id):
+        return self.fetch([row_id]).get(row_id)
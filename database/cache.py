@@ -0,0 +1,73 @@
+# database/cache.py
+import threading
+from typing import Dict
+
+from database.db import add_write_listener
+
+# Справочник: id -> наименование
+RefTable = Dict[int, str]
+
+# Небольшие редко меняющиеся таблицы, которые держим в памяти
+REFERENCE_TABLES = ("categories", "units", "positions")
+
+
+class ReferenceCache:
+    """Кэш справочников. Сбрасывается потаблично при записи в соответствующую таблицу."""
+
+    def __init__(self, db):
+        self.db = db
+        self._tables = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        add_write_listener(self.invalidate)
+
+    def get(self, table) -> RefTable:
+        if table not in REFERENCE_TABLES:
+            raise ValueError(f"Таблица {table} не является справочником")
+
+        with self._lock:
+            cached = self._tables.get(table)
+            generation = self._generation
+        if cached is not None:
+            return cached
+
+        rows = self.db.fetch_all(f"SELECT id, name FROM {table}")
+        data = {row['id']: row['name'] for row in rows}
+        with self._lock:
+            # Не кэшируем результат, если во время запроса таблицу успели изменить
+            if generation == self._generation:
+                self._tables[table] = data
+        return data
+
+    def categories(self) -> RefTable:
+        return self.get("categories")
+
+    def units(self) -> RefTable:
+        return self.get("units")
+
+    def positions(self) -> RefTable:
+        return self.get("positions")
+
+    def invalidate(self, table=None):
+        if table is not None and table not in REFERENCE_TABLES:
+            return
+        with self._lock:
+            self._generation += 1
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def reference_cache(db) -> ReferenceCache:
+    # Один кэш на пул соединений, чтобы все вкладки и диалоги видели одни данные
+    with _caches_lock:
+        cache = _caches.get(db.pool)
+        if cache is None:
+            cache = ReferenceCache(db)
+            _caches[db.pool] = cache
+        return cache
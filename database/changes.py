@@ -0,0 +1,110 @@
+# database/changes.py
+# Журнал изменений row_changes (миграция 3): что изменилось после версии N
+import time
+from typing import Dict, Optional
+
+# Сколько дней хранить записи журнала. Клиенты опрашивают его каждые несколько секунд,
+# а запущенный заново клиент начинает с текущих версий, так что старые записи не нужны.
+# Клиент, отставший больше чем на KEEP_DAYS, перечитывает таблицы целиком (ChangeReader)
+KEEP_DAYS = 7
+# Строк за один DELETE при очистке: таблица не блокируется надолго
+PURGE_BATCH = 10000
+# Сколько секунд дочитывать пропущенные версии. Номер версии выдаётся при вставке, а видна
+# запись становится при COMMIT: транзакция с меньшим номером может закоммититься позже
+# транзакции с большим. Номера откатанных транзакций не появятся никогда
+GAP_TIMEOUT = 120
+# Больше пропусков не отслеживаем (auto_increment_increment > 1, массовый откат)
+MAX_GAPS = 1000
+
+# Таблица -> {id строки: последняя операция I/U/D}
+ChangeSet = Dict[str, Dict[int, str]]
+
+
+def latest_version(db) -> int:
+    row = db.fetch_one("SELECT MAX(version) AS version FROM row_changes")
+    return (row and row['version']) or 0
+
+
+class ChangeReader:
+    """Чтение журнала с версии version без потерь.
+
+    Кроме последней прочитанной версии помнит номера ниже неё, которых ещё не было
+    в журнале, и дочитывает их, пока не истечёт GAP_TIMEOUT. Вызовы read() не должны
+    идти параллельно.
+    """
+
+    def __init__(self, version, gap_timeout=GAP_TIMEOUT, clock=time.monotonic):
+        self.version = version
+        self.gaps = {}  # версия -> когда замечен пропуск
+        self.gap_timeout = gap_timeout
+        self.clock = clock
+
+    def read(self, db, tables=None) -> Optional[ChangeSet]:
+        """Новые изменения таблиц tables (None — всех).
+
+        Несколько изменений одной строки сворачиваются в последнее: потребителю
+        достаточно перечитать строку или удалить её. None — нужные записи уже удалены
+        purge_changes: изменения неизвестны, таблицы нужно перечитать целиком.
+        """
+        now = self.clock()
+        gaps = {version: seen for version, seen in self.gaps.items() if now - seen < self.gap_timeout}
+        # MIN и MAX по первичному ключу — без чтения таблицы
+        row = db.fetch_one("SELECT MIN(version) AS first, MAX(version) AS last FROM row_changes")
+        if row is None or row['last'] is None:
+            self.gaps = gaps
+            return {}
+        if self.version and row['first'] > self.version:
+            # Удалена сама последняя прочитанная запись — её и всё, что после неё, удалила очистка
+            self.version, self.gaps = row['last'], {}
+            return None
+        if row['last'] <= self.version and not gaps:
+            self.gaps = gaps
+            return {}
+
+        query = "SELECT version, table_name, row_id, op FROM row_changes WHERE version > %s"
+        params = [self.version]
+        if gaps:
+            query += " OR version IN (" + ", ".join(["%s"] * len(gaps)) + ")"
+            params.extend(sorted(gaps))
+        query += " ORDER BY version"
+
+        version = self.version
+        seen = set()
+        changes = {}
+        for row in db.fetch_all(query, params):
+            seen.add(row['version'])
+            version = max(version, row['version'])
+            if tables is None or row['table_name'] in tables:
+                changes.setdefault(row['table_name'], {})[row['row_id']] = row['op']
+        for missing in range(self.version + 1, version):
+            if missing not in seen:
+                gaps[missing] = now
+        for found in seen:
+            gaps.pop(found, None)
+        if len(gaps) > MAX_GAPS:
+            gaps = dict(sorted(gaps.items())[-MAX_GAPS:])
+        self.version, self.gaps = version, gaps
+        return changes
+
+
+def purge_changes(db, days=KEEP_DAYS) -> int:
+    """Удаляет записи журнала старше days дней. Возвращает число удалённых строк.
+
+    Последняя запись остаётся всегда: по ней продолжается нумерация версий
+    (MySQL 5.7 после перезапуска начинает AUTO_INCREMENT с MAX + 1).
+    """
+    row = db.fetch_one(
+        f"SELECT MIN(version) AS first, MAX(version) AS last FROM row_changes "
+        f"WHERE {db.backend.older_than_days('changed_at')}", (days,)
+    )
+    if not row or row['last'] is None:
+        return 0
+    last = min(row['last'], latest_version(db) - 1)
+    if last < row['first']:
+        return 0
+    deleted = db.fetch_one("SELECT COUNT(*) AS n FROM row_changes WHERE version BETWEEN %s AND %s",
+                           (row['first'], last))['n']
+    for start in range(row['first'], last + 1, PURGE_BATCH):
+        db.execute("DELETE FROM row_changes WHERE version BETWEEN %s AND %s",
+                   (start, min(start + PURGE_BATCH - 1, last)))
+    return deleted
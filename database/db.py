@@ -1,37 +1,459 @@
 # database/db.py
-import pymysql
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from database import stats
+from database.backends import make_backend
+
+# Параметры пула по умолчанию
+POOL_SIZE = 5
+POOL_TIMEOUT = 10  # секунд ожидания свободного соединения
+PING_INTERVAL = 30  # проверять соединение, если оно простаивало дольше этого
+
+# Пакетная вставка: доля max_allowed_packet, которую занимает один запрос
+PACKET_FILL = 0.9
+BATCH_ROWS = 1000
+
+# Размер порции при потоковом чтении
+STREAM_CHUNK = 500
+
+# Размер страницы при постраничной (keyset) выборке
+PAGE_ROWS = 100
+
+_WHERE_RE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+
+
+def _top_level_where(query):
+    """Позиция сразу после WHERE самого запроса (не подзапроса и не строкового литерала) или None."""
+    masked = []
+    depth = 0
+    quote = None
+    for ch in query:
+        if quote:
+            if ch == quote:
+                quote = None
+            ch = " "
+        elif ch in "'\"`":
+            quote = ch
+            ch = " "
+        elif ch in "()":
+            depth += 1 if ch == "(" else -1
+            ch = " "
+        elif depth:
+            ch = " "
+        masked.append(ch)
+    match = _WHERE_RE.search("".join(masked))
+    return match.end() if match else None
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с базой, общий для всего приложения."""
+
+    def __init__(self, backend, size=POOL_SIZE):
+        self.size = size
+        self.backend = backend
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        # Соединение, закреплённое за потоком на время транзакции
+        self.local = threading.local()
+        self.max_packet = None
+        # Сразу открываем одно соединение, чтобы ошибки подключения
+        # проявлялись при создании Database, как и раньше
+        self._idle.put((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        connection = self.backend.connect()
+        with self._lock:
+            self._opened += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=POOL_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Нет свободных соединений с базой данных")
+        try:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            # Соединение могло быть закрыто сервером по wait_timeout
+            if time.monotonic() - last_used > PING_INTERVAL:
+                try:
+                    self.backend.ping(connection)
+                except self.backend.errors:
+                    self._discard(connection)
+                    return self._connect()
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    def pinned(self):
+        return getattr(self.local, "connection", None)
+
+    def release(self, connection, broken=False):
+        try:
+            if broken or not self.backend.is_open(connection):
+                self._discard(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
+# Определение таблицы, в которую пишет запрос
+_WRITE_RE = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)`?",
+    re.IGNORECASE
+)
+
+_write_listeners = []
+
+
+def written_table(query):
+    match = _WRITE_RE.match(query)
+    return match.group(1).lower() if match else None
+
+
+def add_write_listener(callback):
+    """Подписка на запись в таблицы: callback(table) вызывается после каждого изменения."""
+    _write_listeners.append(callback)
+
+
+def _notify_tables(tables):
+    for table in tables:
+        for callback in list(_write_listeners):
+            callback(table)
+
+
+def _notify_write(query, pool=None):
+    table = written_table(query)
+    if not table:
+        return
+    # Внутри транзакции оповещаем только после COMMIT
+    written = getattr(pool.local, "written", None) if pool is not None else None
+    if written is not None:
+        written.add(table)
+    else:
+        _notify_tables((table,))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Фоновые потоки для запросов: не больше, чем соединений в пуле
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+
+
+def get_pool(backend):
+    key = backend.key()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(backend)
+            _pools[key] = pool
+        return pool
+
 
 class Database:
-    def __init__(self, host="localhost", user="root", password="", db="coffee_shop", port=3306):
-        self.connection = pymysql.connect(
-            host=host,
-            user=user,
-            password=password,
-            db=db,
-            port=port,
-            charset="utf8mb4",
-            cursorclass=pymysql.cursors.DictCursor,
-            autocommit=True
-        )
+    def __init__(self, host="localhost", user="root", password="", db="coffee_shop", port=3306,
+                 backend=None, path=None):
+        # backend: "mysql" или "sqlite" (по умолчанию — из COFFEE_DB_BACKEND)
+        # Все экземпляры с одинаковыми параметрами делят один пул соединений
+        self.pool = get_pool(make_backend(backend, path, host=host, user=user, password=password, db=db, port=port))
 
-    def fetch_all(self, query, params=None):
-        with self.connection.cursor() as cursor:
+    @property
+    def backend(self):
+        return self.pool.backend
+
+    def _call(self, work, retry=False):
+        # В транзакции работаем на закреплённом соединении и не повторяем запросы.
+        # retry=True — только для чтения: запись могла дойти до сервера до обрыва,
+        # и повтор выполнил бы её дважды
+        connection = self.pool.pinned()
+        if connection is not None:
+            with connection.cursor() as cursor:
+                return work(cursor)
+
+        connection = self.pool.acquire()
+        broken = False
+        try:
+            with connection.cursor() as cursor:
+                return work(cursor)
+        except self.backend.errors as e:
+            # Сервер закрыл соединение (wait_timeout, рестарт) — чтение повторяем один раз на новом
+            if not self.backend.is_lost(e):
+                raise
+            broken = True
+            if not retry:
+                raise
+        finally:
+            self.pool.release(connection, broken)
+        return self._call(work)
+
+    def _run(self, handler, query, params, retry=False):
+        def work(cursor):
             cursor.execute(query, params or ())
-            return cursor.fetchall()
+            return handler(cursor)
+        return self._call(work, retry)
+
+    def fetch_all(self, query, params=None):
+        with stats.timed("fetch_all", query) as measured:
+            measured["result"] = self._run(lambda cursor: cursor.fetchall(), query, params, retry=True)
+        return measured["result"]
 
     def fetch_one(self, query, params=None):
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
+        with stats.timed("fetch_one", query) as measured:
+            measured["result"] = self._run(lambda cursor: cursor.fetchone(), query, params, retry=True)
+        return measured["result"]
 
     def execute(self, query, params=None):
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params or ())
+        with stats.timed("execute", query):
+            self._run(lambda cursor: None, query, params)
+        _notify_write(query, self.pool)
 
     def insert_and_get_id(self, query, params=None):
-        with self.connection.cursor() as cursor:
+        with stats.timed("insert_and_get_id", query):
+            last_id = self._run(lambda cursor: cursor.lastrowid, query, params)
+        _notify_write(query, self.pool)
+        return last_id
+
+    # === Транзакции и пакетная запись ===
+    def in_transaction(self):
+        return self.pool.pinned() is not None
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция на одном соединении; вложенные вызовы становятся точками сохранения."""
+        state = self.pool.local
+        if getattr(state, "connection", None) is not None:
+            state.depth += 1
+            savepoint = f"sp_{state.depth}"
+            self._run(lambda cursor: None, f"SAVEPOINT {savepoint}", None)
+            try:
+                yield self
+            except BaseException:
+                self._run(lambda cursor: None, f"ROLLBACK TO SAVEPOINT {savepoint}", None)
+                raise
+            else:
+                self._run(lambda cursor: None, f"RELEASE SAVEPOINT {savepoint}", None)
+            finally:
+                state.depth -= 1
+            return
+
+        connection = self.pool.acquire()
+        state.connection = connection
+        state.depth = 0
+        state.written = set()
+        broken = False
+        try:
+            connection.begin()
+            yield self
+        except BaseException:
+            try:
+                connection.rollback()
+            except self.backend.errors:
+                broken = True
+            raise
+        else:
+            connection.commit()
+            _notify_tables(state.written)
+        finally:
+            state.connection = None
+            state.written = None
+            self.pool.release(connection, broken)
+
+    def execute_many(self, query, seq_params):
+        """Один запрос для множества наборов параметров в одной транзакции.
+
+        Для INSERT ... VALUES pymysql склеивает строки в многострочные запросы
+        размером не больше max_allowed_packet.
+        """
+        seq_params = list(seq_params)
+        if not seq_params:
+            return 0
+
+        max_stmt = self._max_statement_length()
+
+        def work(cursor):
+            cursor.max_stmt_length = max_stmt
+            return cursor.executemany(query, seq_params)
+
+        with stats.timed("execute_many", query):
+            with self.transaction():
+                affected = self._call(work)
+                _notify_write(query, self.pool)
+        return affected
+
+    def insert_many(self, table, columns, rows, update_columns=None, batch_rows=BATCH_ROWS):
+        """Пакетная вставка многострочными INSERT-ами, разбитыми по max_allowed_packet.
+
+        update_columns — столбцы, обновляемые при конфликте ключа (upsert).
+        Возвращает количество затронутых строк.
+        """
+        column_list = ", ".join(f"`{c}`" for c in columns)
+        head = f"INSERT INTO `{table}` ({column_list}) VALUES "
+        tail = ""
+        if update_columns:
+            tail = self.backend.upsert_clause(update_columns)
+        row_template = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        max_stmt = self._max_statement_length()
+
+        def work(cursor):
+            affected = 0
+            chunk = []
+            size = len(head) + len(tail)
+            for row in rows:
+                literal = cursor.mogrify(row_template, tuple(row))
+                literal_size = len(literal.encode("utf-8")) + 1
+                if chunk and (len(chunk) >= batch_rows or size + literal_size > max_stmt):
+                    affected += cursor.execute(head + ",".join(chunk) + tail)
+                    chunk = []
+                    size = len(head) + len(tail)
+                chunk.append(literal)
+                size += literal_size
+            if chunk:
+                affected += cursor.execute(head + ",".join(chunk) + tail)
+            return affected
+
+        with stats.timed("insert_many", head):
+            with self.transaction():
+                affected = self._call(work)
+                _notify_write(head, self.pool)
+        return affected
+
+    def _max_statement_length(self):
+        if self.pool.max_packet is None:
+            self.pool.max_packet = self._call(self.backend.max_packet, retry=True)
+        return int(self.pool.max_packet * PACKET_FILL)
+
+    # === Потоковое чтение больших выборок ===
+    def iter_chunks(self, query, params=None, chunk_size=STREAM_CHUNK, as_tuples=False):
+        """Читает результат небуферизованным (server-side) курсором порциями по chunk_size строк.
+
+        as_tuples=True отдаёт строки кортежами в порядке столбцов SELECT, без словаря на строку.
+        Соединение занято до конца итерации, поэтому берётся отдельное, вне текущей транзакции.
+        """
+        source = stats.caller()
+        rows_total = size_total = 0
+        start = time.perf_counter()
+
+        connection = self.pool.acquire()
+        cursor = self.backend.stream_cursor(connection, as_tuples)
+        broken = False
+        try:
             cursor.execute(query, params or ())
-            return cursor.lastrowid
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                rows, size = stats.result_size(chunk)
+                rows_total += rows
+                size_total += size
+                yield chunk
+        except self.backend.errors + (GeneratorExit,):
+            # При досрочном выходе не дочитываем остаток результата, а закрываем соединение
+            broken = True
+            raise
+        finally:
+            if not broken:
+                cursor.close()
+            self.pool.release(connection, broken)
+            duration_ms = (time.perf_counter() - start) * 1000
+            stats.query_stats.record_counts("iter_rows", query, duration_ms, rows_total, size_total, source)
+
+    def iter_rows(self, query, params=None, chunk_size=STREAM_CHUNK, as_tuples=False):
+        for chunk in self.iter_chunks(query, params, chunk_size, as_tuples):
+            yield from chunk
+
+    # === Постраничная выборка по ключу (keyset / seek) ===
+    def fetch_page(self, query, keys, after=None, limit=PAGE_ROWS, params=None, descending=False):
+        """Страница строк после ключа after: WHERE (k1, k2) < (%s, %s) ORDER BY k1, k2 LIMIT n.
+
+        query — простой SELECT без GROUP BY, ORDER BY и LIMIT; WHERE в подзапросах
+        и производных таблицах не путается с его собственным. keys — выражения ключа сортировки,
+        вместе уникальные (например, ("s.shift_date", "s.id")), в результате они доступны
+        под именем после точки. В отличие от OFFSET, стоимость страницы не зависит от её
+        номера. Возвращает (строки, ключ последней строки или None, если страница последняя).
+        """
+        params = list(params or ())
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            after = tuple(after)
+            if len(keys) == 1:
+                seek = f"{keys[0]} {'<' if descending else '>'} %s"
+            else:
+                columns = ", ".join(keys)
+                placeholders = ", ".join(["%s"] * len(keys))
+                seek = f"({columns}) {'<' if descending else '>'} ({placeholders})"
+            where = _top_level_where(query)
+            if where is None:
+                query += " WHERE " + seek
+            else:
+                # Условие запроса — в скобках: его OR не должен поглотить условие страницы
+                query = f"{query[:where]} ({query[where:]}) AND {seek}"
+            params.extend(after)
+        query += " ORDER BY " + ", ".join(f"{key} {direction}" for key in keys) + " LIMIT %s"
+        params.append(limit)
+
+        rows = self.fetch_all(query, params)
+        if len(rows) < limit:
+            return rows, None
+        names = [key.rsplit(".", 1)[-1] for key in keys]
+        return rows, tuple(rows[-1][name] for name in names)
+
+    # === Асинхронный API: выполняется в фоновом потоке, возвращает Future ===
+    def submit(self, fn, *args, **kwargs):
+        source = stats.caller()
+
+        def run():
+            with stats.attributed(source):
+                return fn(*args, **kwargs)
+
+        return _executor.submit(run)
+
+    def fetch_all_async(self, query, params=None):
+        return self.submit(self.fetch_all, query, params)
+
+    def fetch_one_async(self, query, params=None):
+        return self.submit(self.fetch_one, query, params)
+
+    def execute_async(self, query, params=None):
+        return self.submit(self.execute, query, params)
+
+    def fetch_page_async(self, query, keys, after=None, limit=PAGE_ROWS, params=None, descending=False):
+        return self.submit(self.fetch_page, query, keys, after, limit, params, descending)
 
     def close(self):
-        self.connection.close()
+        # Соединения принадлежат общему пулу и закрываются при выходе из приложения
+        pass
+
+
+def close_all():
+    _executor.shutdown(wait=False, cancel_futures=True)
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,166 @@
+# database/events.py
+# Шина изменений: вкладки подписываются на таблицы и получают id изменённых строк.
+#
+# Источник событий — журнал row_changes (миграции 3 и 5). Запись из этого
+# процесса сразу запускает опрос журнала; изменения с других компьютеров
+# находит периодический опрос: сначала дешёвая проверка номера последней версии,
+# затем чтение новых записей и записей, закоммиченных позже следующих (ChangeReader).
+#
+#   COFFEE_POLL_INTERVAL=0   — не опрашивать, только свои изменения
+import os
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from database.cache import reference_cache
+from database.changes import ChangeReader, latest_version, purge_changes
+from database.db import add_write_listener
+from database.qt_async import QueryChannel
+
+# Период опроса журнала, секунд (0 — отключить)
+POLL_INTERVAL = float(os.environ.get("COFFEE_POLL_INTERVAL", "5"))
+# Как часто опрос заодно удаляет устаревшие записи журнала, секунд
+PURGE_INTERVAL = 3600
+
+
+class ChangeEvent:
+    """Изменение строк одной таблицы.
+
+    changes — {id строки: последняя операция I/U/D}; None, если изменённые
+    строки неизвестны (журнал недоступен) и таблицу нужно перечитать целиком.
+    """
+
+    def __init__(self, table, changes):
+        self.table = table
+        self.changes = changes
+
+    @property
+    def ids(self):
+        return None if self.changes is None else list(self.changes)
+
+    def with_op(self, *ops):
+        return [row_id for row_id, op in (self.changes or {}).items() if op in ops]
+
+    def __repr__(self):
+        return f"ChangeEvent({self.table!r}, {self.changes!r})"
+
+
+class _Subscription(QObject):
+    # Дочерний объект подписчика: уничтожается вместе с ним и отключается от шины
+    def __init__(self, owner, tables, callback):
+        super().__init__(owner)
+        self.tables = frozenset(tables)
+        self.callback = callback
+
+    def deliver(self, event):
+        if event.table in self.tables:
+            self.callback(event)
+
+
+class EventBus(QObject):
+    """Рассылка ChangeEvent подписчикам в GUI-потоке."""
+
+    changed = pyqtSignal(object)  # ChangeEvent
+    _written = pyqtSignal(str)  # запись из любого потока этого процесса
+
+    def __init__(self, db, interval=POLL_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.tables = set()  # таблицы, на которые есть подписка
+        self.written = set()  # таблицы, изменённые здесь после последнего опроса
+        self.again = False
+        self.purged_at = time.monotonic()  # при запуске журнал чистит main()
+        self.poll_query = QueryChannel(self)
+        # Точка отсчёта — до первой загрузки данных вкладками: повтор изменения безвреден, пропуск — нет.
+        # Читатель журнала меняется только в _fetch, а опросы идут по одному
+        try:
+            self.reader = ChangeReader(latest_version(db))
+        except db.backend.errors as e:
+            print(f"⚠️ Журнал изменений недоступен: {e}")
+            self.reader = None
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setSingleShot(True)
+        self.poll_timer.setInterval(0)  # несколько записей подряд — один опрос
+        self.poll_timer.timeout.connect(self.poll)
+
+        self.interval_timer = QTimer(self)
+        self.interval_timer.timeout.connect(self.poll)
+        if interval > 0:
+            self.interval_timer.start(int(interval * 1000))
+
+        self._written.connect(self._on_written)
+        add_write_listener(self._written.emit)
+
+    def subscribe(self, owner, tables, callback):
+        """callback(ChangeEvent) для изменений tables, пока жив виджет owner."""
+        subscription = _Subscription(owner, tables, callback)
+        self.tables.update(subscription.tables)
+        self.changed.connect(subscription.deliver)
+        return subscription
+
+    def publish(self, event):
+        # Справочники в кэше сбрасываются и при изменениях с других компьютеров
+        reference_cache(self.db).invalidate(event.table)
+        self.changed.emit(event)
+
+    def _on_written(self, table):
+        if table in self.tables:
+            self.written.add(table)
+            self.poll_timer.start()
+
+    def poll(self):
+        if self.poll_query.is_busy():
+            self.again = True
+            return
+        self.again = False
+        self.poll_query.run(
+            self.db.submit(self._fetch, sorted(self.tables)),
+            self._publish,
+            self._failed
+        )
+
+    def _fetch(self, tables):
+        # Выполняется в фоновом потоке
+        if time.monotonic() - self.purged_at > PURGE_INTERVAL:
+            self.purged_at = time.monotonic()
+            purge_changes(self.db)
+        if self.reader is None:
+            self.reader = ChangeReader(latest_version(self.db))
+            return {}
+        changes = self.reader.read(self.db, set(tables))
+        if changes is None:
+            # Клиент отстал дольше, чем хранится журнал: что изменилось, уже не узнать
+            return {table: None for table in tables}
+        return changes
+
+    def _publish(self, changes):
+        self.written.clear()
+        for table, rows in changes.items():
+            self.publish(ChangeEvent(table, rows))
+        if self.again:
+            self.poll()
+
+    def _failed(self, error):
+        print(f"⚠️ Не удалось прочитать журнал изменений: {error}")
+        # Свои изменения всё равно показываем: подписчики перечитают таблицы целиком
+        written, self.written = self.written, set()
+        for table in sorted(written):
+            self.publish(ChangeEvent(table, None))
+        if self.again:
+            self.poll()
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def event_bus(db) -> EventBus:
+    # Одна шина на пул соединений, как и кэш справочников
+    with _buses_lock:
+        bus = _buses.get(db.pool)
+        if bus is None:
+            bus = EventBus(db)
+            _buses[db.pool] = bus
+        return bus
@@ -0,0 +1,165 @@
+# database/history.py
+# История расчётов прибыли (product_profit_calculations, миграция 7).
+#
+# Запись — через буфер: record() только кладёт строку в память, в базу строки
+# уходят пачкой одним execute_many в фоновом потоке — по заполнении буфера,
+# по таймеру или при выходе из приложения.
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+# Строк в буфере, после которых запись начинается сразу
+FLUSH_ROWS = 50
+# Через сколько секунд после первой строки буфер записывается в любом случае
+FLUSH_SECONDS = 5
+# Не больше стольких строк ждут повтора после ошибки записи
+MAX_PENDING = 5000
+
+INSERT_QUERY = """
+    INSERT INTO product_profit_calculations
+    (product_id, selling_price, cost_price, other_expenses, quantity, bank_fee_rate, tax_rate,
+     calculated_profit, calculation_date)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+HISTORY_QUERY = """
+    SELECT id, calculation_date, selling_price, cost_price, other_expenses, quantity,
+           bank_fee_rate, tax_rate, calculated_profit
+    FROM product_profit_calculations
+    WHERE product_id = %s AND calculation_date >= %s AND calculation_date < %s
+    ORDER BY calculation_date, id
+"""
+
+
+class CalculationLog:
+    """Буфер записи истории расчётов. record() не обращается к базе и не блокирует GUI."""
+
+    def __init__(self, db, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.db = db
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._rows = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._writing = None  # Future текущей записи
+
+    def record(self, product_id, selling_price, cost_price, other_expenses, quantity,
+               bank_fee, nalog, profit, when=None):
+        """Ставки — доли (0.015), как в калькуляторе; в таблице хранятся проценты."""
+        row = (product_id, selling_price, cost_price, other_expenses, quantity,
+               Decimal(bank_fee) * 100, Decimal(nalog) * 100, profit,
+               when or datetime.now().replace(microsecond=0))
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_rows
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def flush(self, wait=False):
+        """Отправляет буфер в базу. wait=True — дождаться записи (перед чтением истории и при выходе)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            rows, self._rows = self._rows, []
+            previous = self._writing
+            future = self.db.submit(self._write, rows, previous) if rows else previous
+            self._writing = future
+        if wait and future is not None:
+            future.result()
+        return future
+
+    def _write(self, rows, previous):
+        # Пачки пишутся по очереди: следующая ждёт предыдущую, порядок строк сохраняется
+        if previous is not None:
+            try:
+                previous.result()
+            except Exception:
+                pass
+        try:
+            self.db.execute_many(INSERT_QUERY, rows)
+            return
+        except self.db.backend.errors as e:
+            if not self.db.backend.is_row_error(e):
+                self._requeue(rows, e)
+                raise
+        # Пачка отклонена из-за какой-то строки (товар удалён, значение не помещается):
+        # пишем по одной, такие строки отбрасываем, чтобы они не задерживали остальные
+        for index, row in enumerate(rows):
+            try:
+                self.db.execute(INSERT_QUERY, row)
+            except self.db.backend.errors as e:
+                if not self.db.backend.is_row_error(e):
+                    self._requeue(rows[index:], e)
+                    raise
+                print(f"⚠️ Расчёт по товару {row[0]} от {row[-1]} не записан в историю и отброшен: {e}")
+
+    def _requeue(self, rows, error):
+        print(f"⚠️ История расчётов не записана ({len(rows)} строк): {error}")
+        with self._lock:
+            # Повторим со следующей пачкой; самые старые строки отбрасываются первыми
+            self._rows = (rows + self._rows)[-MAX_PENDING:]
+
+
+def price_periods(rows):
+    """Сравнение прибыли по периодам цены: подряд идущие расчёты с одной ценой — один период.
+
+    rows — строки HISTORY_QUERY по времени. Возвращает словари: price, first, last,
+    count, avg_profit, avg_margin (% или None), profit_change (к предыдущему периоду или None).
+    """
+    periods = []
+    for row in rows:
+        price = row['selling_price']
+        if price is None:
+            continue  # записи до миграции 7: цена неизвестна
+        if not periods or periods[-1]['price'] != price:
+            periods.append({"price": price, "first": row['calculation_date'], "count": 0,
+                            "profit": Decimal(0), "revenue": Decimal(0)})
+        period = periods[-1]
+        period['last'] = row['calculation_date']
+        period['count'] += 1
+        period['profit'] += Decimal(row['calculated_profit'] or 0)
+        period['revenue'] += Decimal(price) * (row['quantity'] or 0)
+
+    previous = None
+    for period in periods:
+        profit = period.pop('profit')
+        revenue = period.pop('revenue')
+        period['avg_profit'] = (profit / period['count']).quantize(Decimal("0.01"))
+        period['avg_margin'] = profit / revenue * 100 if revenue > 0 else None
+        period['profit_change'] = period['avg_profit'] - previous if previous is not None else None
+        previous = period['avg_profit']
+    return periods
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def calculation_log(db) -> CalculationLog:
+    # Один буфер на пул соединений
+    with _logs_lock:
+        log = _logs.get(db.pool)
+        if log is None:
+            log = CalculationLog(db)
+            _logs[db.pool] = log
+        return log
+
+
+def flush_all():
+    """Записывает все буферы перед закрытием соединений."""
+    with _logs_lock:
+        logs = list(_logs.values())
+    for log in logs:
+        try:
+            log.flush(wait=True)
+        except Exception as e:
+            print(f"⚠️ {e}")
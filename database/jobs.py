@@ -0,0 +1,282 @@
+# database/jobs.py
+# Фоновые задачи: экспорт, импорт, отчёты.
+#
+# Задачи выполняются в своём пуле потоков, а не в пуле запросов, и не занимают
+# его надолго. Прогресс и результат приходят сигналами Qt в GUI-поток. Задачи
+# одного вида идут по очереди; повторный запуск с теми же параметрами
+# присоединяется к уже запущенной задаче. Результат задачи с tables хранится,
+# пока эти таблицы не изменятся (здесь или на другом компьютере).
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, Qt, QTimer, pyqtSignal
+
+from database.db import add_write_listener
+
+# Одновременно выполняемых задач (разных видов)
+JOB_WORKERS = 2
+# Сколько результатов задач держать в кэше
+RESULT_CACHE = 16
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(QObject):
+    """Фоновая задача. Функция задачи получает её первым аргументом и вызывает report()."""
+
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+    progress = pyqtSignal(int, int)  # выполнено, всего (0 — неизвестно)
+    finished = pyqtSignal(object)  # результат
+    failed = pyqtSignal(object)  # исключение
+    cancelled = pyqtSignal()
+    state_changed = pyqtSignal(str)
+
+    def __init__(self, kind, title, fn, args, key, tables, parent=None):
+        super().__init__(parent)
+        self.kind = kind
+        self.title = title
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.tables = tuple(tables or ())
+        self.state = self.QUEUED
+        self.cached = False  # результат взят из кэша
+        self._cancel = threading.Event()
+
+    def report(self, done, total=0):
+        """Прогресс из рабочего потока. Здесь же задача прерывается, если её отменили."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress.emit(done, total)
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.state == self.QUEUED:
+            self.parent()._drop(self)
+
+    def is_active(self):
+        return self.state in (self.QUEUED, self.RUNNING)
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
+
+
+class _Listener(QObject):
+    # Дочерний объект окна, запустившего задачу: закрыли окно — ответ никуда не приходит
+    def __init__(self, owner, job, on_result, on_error, on_progress):
+        super().__init__(owner)
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_progress = on_progress
+        job.finished.connect(self.deliver_result)
+        job.failed.connect(self.deliver_error)
+        job.cancelled.connect(self.deliver_cancel)
+        if on_progress is not None:
+            job.progress.connect(self.deliver_progress)
+
+    def deliver_result(self, result):
+        self.on_result(result)
+        self.deleteLater()
+
+    def deliver_error(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+        self.deleteLater()
+
+    def deliver_cancel(self):
+        if self.on_error is not None:
+            self.on_error(JobCancelled())
+        self.deleteLater()
+
+    def deliver_progress(self, done, total):
+        self.on_progress(done, total)
+
+
+class JobRunner(QObject):
+    """Очередь фоновых задач приложения."""
+
+    added = pyqtSignal(object)  # Job, для панели задач
+    _done = pyqtSignal(object, object, object)  # задача, результат, ошибка
+
+    def __init__(self, workers=JOB_WORKERS, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.running = {}  # вид -> выполняемая задача
+        self.queues = {}  # вид -> очередь задач
+        self.cache = OrderedDict()  # (вид, ключ) -> (результат, таблицы)
+        self._generations = {}  # таблица -> номер изменения
+        self._lock = threading.Lock()
+        self._subscribed = set()  # (пул, таблица) с подпиской на шину изменений
+        # Всегда через очередь событий: задача, завершившаяся ещё в start(), ответит после возврата из него
+        self._done.connect(self._finish, Qt.ConnectionType.QueuedConnection)
+        add_write_listener(self.invalidate)
+
+    def start(self, kind, title, fn, *args, key=None, tables=None, db=None,
+              owner=None, on_result=None, on_error=None, on_progress=None):
+        """Запускает fn(job, *args) в фоне и возвращает Job.
+
+        key — параметры задачи: задача того же вида с тем же key не запускается
+        повторно. tables — таблицы, от которых зависит результат: с ними результат
+        кэшируется по (kind, key), db нужна, чтобы узнавать и о чужих изменениях.
+        on_result, on_error (в том числе JobCancelled) и on_progress вызываются,
+        пока жив owner.
+        """
+        job = self._find(kind, key) if key is not None else None
+        if job is not None:
+            return self._attach(job, owner, on_result, on_error, on_progress)
+
+        job = self._attach(Job(kind, title, fn, args, key, tables, self), owner, on_result, on_error, on_progress)
+        self.added.emit(job)
+        cached = None
+        if tables and key is not None:
+            if db is not None:
+                self._watch(db, tables)
+            cached = self._cached(kind, key)
+        if cached is not None:
+            self._deliver_cached(job, cached)
+        else:
+            self.queues.setdefault(kind, deque()).append(job)
+            self._next(kind)
+        return job
+
+    def jobs(self):
+        active = list(self.running.values())
+        for queue in self.queues.values():
+            active.extend(queue)
+        return active
+
+    def invalidate(self, table):
+        # Вызывается из любого потока после записи в таблицу
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for cache_key in [k for k, (_, tables) in self.cache.items() if table in tables]:
+                del self.cache[cache_key]
+
+    def shutdown(self):
+        """Отменяет задачи и ждёт выполняемые: они прерываются на ближайшем report()."""
+        for queue in self.queues.values():
+            for job in list(queue):
+                job.cancel()
+        for job in list(self.running.values()):
+            job.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    # === Внутреннее ===
+
+    def _attach(self, job, owner, on_result, on_error, on_progress):
+        if on_result is not None or on_error is not None or on_progress is not None:
+            _Listener(owner or self, job, on_result or (lambda result: None), on_error, on_progress)
+        return job
+
+    def _find(self, kind, key):
+        for job in [self.running.get(kind), *self.queues.get(kind, ())]:
+            if job is not None and job.key == key and not job.is_cancelled():
+                return job
+        return None
+
+    def _cached(self, kind, key):
+        with self._lock:
+            entry = self.cache.get((kind, key))
+            if entry is None:
+                return None
+            result = entry[0]
+            # Файл отчёта могли удалить — тогда строим заново
+            path = getattr(result, "path", None)
+            if path is not None and not os.path.exists(path):
+                del self.cache[(kind, key)]
+                return None
+            self.cache.move_to_end((kind, key))
+            return entry
+
+    def _deliver_cached(self, job, entry):
+        job.cached = True
+        job.state = Job.RUNNING
+        # Ответ — после возврата из start(), как и у обычной задачи
+        QTimer.singleShot(0, lambda: self._finish(job, entry[0], None))
+
+    def _watch(self, db, tables):
+        from database.events import event_bus
+        pool_tables = [(db.pool, table) for table in tables if (db.pool, table) not in self._subscribed]
+        if not pool_tables:
+            return
+        self._subscribed.update(pool_tables)
+        event_bus(db).subscribe(self, [table for _, table in pool_tables],
+                                lambda event: self.invalidate(event.table))
+
+    def _next(self, kind):
+        if kind in self.running:
+            return
+        queue = self.queues.get(kind)
+        while queue:
+            job = queue.popleft()
+            if job.is_cancelled():
+                continue
+            self.running[kind] = job
+            with self._lock:
+                generations = {table: self._generations.get(table, 0) for table in job.tables}
+            job._set_state(Job.RUNNING)
+            future = self._executor.submit(job.fn, job, *job.args)
+            future.add_done_callback(lambda f: self._completed(job, generations, f))
+            return
+
+    def _completed(self, job, generations, future):
+        # Вызывается в рабочем потоке
+        error = future.exception() if not future.cancelled() else JobCancelled()
+        result = None if error else future.result()
+        if error is None and job.tables and job.key is not None:
+            with self._lock:
+                # Пока задача шла, таблицы изменились — результат уже устарел, не кэшируем
+                if all(self._generations.get(t, 0) == n for t, n in generations.items()):
+                    self.cache[(job.kind, job.key)] = (result, frozenset(job.tables))
+                    while len(self.cache) > RESULT_CACHE:
+                        self.cache.popitem(last=False)
+        try:
+            self._done.emit(job, result, error)
+        except RuntimeError:
+            pass  # приложение закрывается
+
+    def _finish(self, job, result, error):
+        if self.running.get(job.kind) is job:
+            del self.running[job.kind]
+        if isinstance(error, JobCancelled):
+            job._set_state(Job.CANCELLED)
+            job.cancelled.emit()
+        elif error is not None:
+            job._set_state(Job.FAILED)
+            job.failed.emit(error)
+        else:
+            job._set_state(Job.DONE)
+            job.finished.emit(result)
+        self._next(job.kind)
+
+    def _drop(self, job):
+        queue = self.queues.get(job.kind)
+        if queue and job in queue:
+            queue.remove(job)
+            job._set_state(Job.CANCELLED)
+            job.cancelled.emit()
+
+
+_runner = None
+
+
+def job_runner() -> JobRunner:
+    # Создаётся в GUI-потоке при первом обращении
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
+
+
+def shutdown_jobs():
+    if _runner is not None:
+        _runner.shutdown()
@@ -0,0 +1,134 @@
+# database/margins.py
+# Маржинальность всего меню одним векторным расчётом.
+#
+# Деньги — целые копейки (int64), ставки комиссии и налога — целые стотысячные
+# доли. Промежуточные суммы точные, округление до копеек — банковское, как у
+# Decimal по умолчанию, поэтому итоги совпадают с расчётом на Decimal.
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import numpy as np
+
+# Ставки в стотысячных: 1,5 % = 0.015 = 1500
+RATE_SCALE = 100_000
+
+MARGINS_QUERY = """
+    SELECT p.id, p.name, p.price, pc.cost_price, pc.other_expenses, pc.monthly_quantity
+    FROM products p
+    LEFT JOIN product_costs pc ON pc.product_id = p.id
+    ORDER BY p.id
+"""
+
+
+def to_kopecks(value):
+    if value is None:
+        return 0
+    return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_EVEN))
+
+
+def to_rate(fraction):
+    """Доля (0.015) в стотысячных. Более мелкие доли округляются."""
+    return int((Decimal(str(fraction)) * RATE_SCALE).to_integral_value(ROUND_HALF_EVEN))
+
+
+def format_kopecks(kopecks):
+    sign = "-" if kopecks < 0 else ""
+    rubles, rest = divmod(abs(int(kopecks)), 100)
+    return f"{sign}{rubles}.{rest:02d}"
+
+
+def round_div(values, divisor):
+    """Целочисленное деление с банковским округлением (половина — к чётному)."""
+    quotient, remainder = np.divmod(values, divisor)
+    twice = remainder * 2
+    up = (twice > divisor) | ((twice == divisor) & (quotient % 2 == 1))
+    return quotient + up
+
+
+def net_profit(price, cost, other, quantity, bank_fee_rate, nalog_rate):
+    """Только прибыль в копейках. Аргументы могут быть массивами любой совместимой формы:
+    сетки сценариев получаются broadcasting-ом осей.
+    """
+    quantity = np.asarray(quantity, dtype=np.int64)
+    revenue = np.asarray(price, dtype=np.int64) * quantity
+    variable_cost = (np.asarray(cost, dtype=np.int64) + np.asarray(other, dtype=np.int64)) * quantity
+    kept = RATE_SCALE - np.asarray(bank_fee_rate, dtype=np.int64) - np.asarray(nalog_rate, dtype=np.int64)
+    return round_div(revenue * kept - variable_cost * RATE_SCALE, RATE_SCALE)
+
+
+class Margins:
+    """Результат расчёта: массивы по товарам, суммы за месяц в копейках."""
+
+    def __init__(self, revenue, variable_cost, bank_fee, tax, net_profit, margin):
+        self.revenue = revenue
+        self.variable_cost = variable_cost
+        self.bank_fee = bank_fee
+        self.tax = tax
+        self.net_profit = net_profit
+        self.margin = margin  # процент от выручки; NaN, если выручки нет
+
+
+def compute(price, cost, other, quantity, bank_fee_rate, nalog_rate):
+    """Формулы калькулятора для массивов: цены и затраты в копейках, ставки в стотысячных.
+
+    выручка = цена × кол-во; переменные = (себестоимость + прочие) × кол-во;
+    прибыль = выручка − переменные − выручка × (комиссия + налог).
+    """
+    price = np.asarray(price, dtype=np.int64)
+    quantity = np.asarray(quantity, dtype=np.int64)
+    revenue = price * quantity
+    variable_cost = (np.asarray(cost, dtype=np.int64) + np.asarray(other, dtype=np.int64)) * quantity
+
+    # Точное значение прибыли в стотысячных копейки, округляется один раз
+    fee_exact = revenue * np.int64(bank_fee_rate)
+    tax_exact = revenue * np.int64(nalog_rate)
+    net_exact = (revenue - variable_cost) * RATE_SCALE - fee_exact - tax_exact
+
+    # Маржа в десятых долях процента с тем же округлением, что у Decimal при выводе {:.1f}
+    has_revenue = revenue > 0
+    divisor = np.where(has_revenue, revenue, 1) * RATE_SCALE
+    margin = np.where(has_revenue, round_div(net_exact * 1000, divisor) / 10, np.nan)
+    return Margins(
+        revenue=revenue,
+        variable_cost=variable_cost,
+        bank_fee=round_div(fee_exact, RATE_SCALE),
+        tax=round_div(tax_exact, RATE_SCALE),
+        net_profit=round_div(net_exact, RATE_SCALE),
+        margin=margin,
+    )
+
+
+class MarginTable:
+    """Каталог с плановыми затратами (product_costs) в массивах NumPy."""
+
+    def __init__(self, rows=()):
+        rows = list(rows)
+        count = len(rows)
+        self.ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=count)
+        self.names = [row['name'] for row in rows]
+        self.price = np.fromiter((to_kopecks(row['price']) for row in rows), dtype=np.int64, count=count)
+        self.cost = np.fromiter((to_kopecks(row['cost_price']) for row in rows), dtype=np.int64, count=count)
+        self.other = np.fromiter((to_kopecks(row['other_expenses']) for row in rows), dtype=np.int64, count=count)
+        self.quantity = np.fromiter((row['monthly_quantity'] or 0 for row in rows), dtype=np.int64, count=count)
+        # Товары, для которых ещё не вводили себестоимость
+        self.planned = np.fromiter((row['cost_price'] is not None for row in rows), dtype=bool, count=count)
+
+    @classmethod
+    def load(cls, db):
+        return cls(db.iter_rows(MARGINS_QUERY))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def compute(self, bank_fee, nalog) -> Margins:
+        """bank_fee и nalog — доли (Decimal или строка), как в fixed_costs."""
+        return compute(self.price, self.cost, self.other, self.quantity, to_rate(bank_fee), to_rate(nalog))
+
+
+def save_plan(db, product_id, cost_price, other_expenses, monthly_quantity):
+    """Запоминает введённые в калькуляторе затраты товара для расчёта по всему меню."""
+    db.insert_many(
+        "product_costs",
+        ("product_id", "cost_price", "other_expenses", "monthly_quantity"),
+        [(product_id, cost_price, other_expenses, monthly_quantity)],
+        update_columns=("cost_price", "other_expenses", "monthly_quantity")
+    )
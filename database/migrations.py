@@ -0,0 +1,450 @@
+# database/migrations.py
+# Версионные миграции схемы. Применённые версии хранятся в таблице schema_version.
+#
+#   python -m database.migrations            — применить недостающие миграции
+#   python -m database.migrations status     — показать текущую версию
+#   COFFEE_DB_BACKEND=sqlite python -m database.migrations
+import sys
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version, description, mysql, sqlite):
+        """mysql, sqlite — SQL-строки или шаги step(db) для проверок и условного DDL."""
+        self.version = version
+        self.description = description
+        self.statements = {"mysql": mysql, "sqlite": sqlite}
+
+
+# === Шаги миграций ===
+# DDL в MySQL фиксируется сразу и транзакцией не откатывается. Чтобы упавшую посередине
+# миграцию можно было просто запустить снова, каждый DDL-шаг MySQL повторяем: индексы,
+# столбцы и триггеры создаются после проверки по information_schema, таблицы — через
+# IF NOT EXISTS. UPDATE и INSERT … SELECT либо дают тот же результат при повторе, либо
+# идут после всех DDL миграции и откатываются вместе с её транзакцией.
+
+def mysql_index_exists(db, table, index):
+    return db.fetch_one(
+        "SELECT 1 AS found FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, index)
+    ) is not None
+
+
+def mysql_add_index(table, index, statement):
+    """Шаг: statement создаёт индекс index, если его ещё нет."""
+    def step(db):
+        if not mysql_index_exists(db, table, index):
+            db.execute(statement)
+    return step
+
+
+def mysql_column_exists(db, table, column):
+    return db.fetch_one(
+        "SELECT 1 AS found FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s LIMIT 1",
+        (table, column)
+    ) is not None
+
+
+def mysql_add_column(table, column, statement):
+    """Шаг: statement добавляет столбец column (и, возможно, что-то ещё), если его ещё нет."""
+    def step(db):
+        if not mysql_column_exists(db, table, column):
+            db.execute(statement)
+    return step
+
+
+def mysql_trigger_exists(db, trigger):
+    return db.fetch_one(
+        "SELECT 1 AS found FROM information_schema.TRIGGERS "
+        "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s LIMIT 1",
+        (trigger,)
+    ) is not None
+
+
+def mysql_add_trigger(trigger, statement):
+    """Шаг: statement создаёт триггер trigger, если его ещё нет."""
+    def step(db):
+        if not mysql_trigger_exists(db, trigger):
+            db.execute(statement)
+    return step
+
+
+def require_unique(table, columns, what):
+    """Шаг: перед уникальным индексом — понятная ошибка вместо «Duplicate entry», если в данных есть повторы."""
+    column_list = ", ".join(columns)
+
+    def step(db):
+        duplicates = db.fetch_all(
+            f"SELECT {column_list}, COUNT(*) AS copies FROM {table} "
+            f"GROUP BY {column_list} HAVING COUNT(*) > 1 ORDER BY {column_list} LIMIT 10"
+        )
+        if duplicates:
+            examples = "; ".join(
+                ", ".join(str(row[column]) for column in columns) + f" ({row['copies']} шт.)"
+                for row in duplicates
+            )
+            raise MigrationError(f"В таблице {table} повторяются {what}: {examples}. "
+                                 f"Удалите лишние строки и запустите миграцию снова.")
+    return step
+
+
+_CHANGE_OPS = (("ai", "INSERT", "I"), ("au", "UPDATE", "U"), ("ad", "DELETE", "D"))
+
+
+def change_log_triggers(dialect, table, key="id"):
+    """Триггеры, записывающие в row_changes каждое изменение строки таблицы (row_id — столбец key)."""
+    statements = []
+    for suffix, event, op in _CHANGE_OPS:
+        row = "OLD" if op == "D" else "NEW"
+        insert = f"INSERT INTO row_changes (table_name, row_id, op) VALUES ('{table}', {row}.{key}, '{op}')"
+        if dialect == "mysql":
+            statements.append(mysql_add_trigger(
+                f"{table}_changes_{suffix}",
+                f"CREATE TRIGGER `{table}_changes_{suffix}` AFTER {event} ON `{table}` FOR EACH ROW {insert}"
+            ))
+        else:
+            statements.append(f"CREATE TRIGGER {table}_changes_{suffix} AFTER {event} ON {table} BEGIN {insert}; END")
+    return statements
+
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "Индексы смен (сотрудник+дата, дата)",
+        mysql=[
+            require_unique("shifts", ("employee_id", "shift_date"), "смены сотрудника за день"),
+            mysql_add_index("shifts", "uq_shift_employee_date",
+                            "ALTER TABLE `shifts` ADD UNIQUE KEY `uq_shift_employee_date` (`employee_id`, `shift_date`)"),
+            mysql_add_index("shifts", "idx_shift_date",
+                            "ALTER TABLE `shifts` ADD KEY `idx_shift_date` (`shift_date`, `id`)"),
+        ],
+        sqlite=[
+            require_unique("shifts", ("employee_id", "shift_date"), "смены сотрудника за день"),
+            'CREATE UNIQUE INDEX "shifts_uq_shift_employee_date" ON "shifts" ("employee_id", "shift_date")',
+            'CREATE INDEX "shifts_idx_shift_date" ON "shifts" ("shift_date", "id")',
+        ],
+    ),
+    Migration(
+        2,
+        "SHA-1 фото товаров и сотрудников для выборок без BLOB",
+        mysql=[
+            mysql_add_column("products", "photo_hash",
+                             "ALTER TABLE `products` ADD `photo_hash` CHAR(40) NULL AFTER `photo`"),
+            "UPDATE `products` SET `photo_hash` = SHA1(`photo`) WHERE `photo` IS NOT NULL",
+            mysql_add_trigger("products_photo_hash_bi",
+                              "CREATE TRIGGER `products_photo_hash_bi` BEFORE INSERT ON `products` "
+                              "FOR EACH ROW SET NEW.`photo_hash` = SHA1(NEW.`photo`)"),
+            mysql_add_trigger("products_photo_hash_bu",
+                              "CREATE TRIGGER `products_photo_hash_bu` BEFORE UPDATE ON `products` "
+                              "FOR EACH ROW SET NEW.`photo_hash` = SHA1(NEW.`photo`)"),
+            mysql_add_column("employees", "photo_hash",
+                             "ALTER TABLE `employees` ADD `photo_hash` CHAR(40) NULL AFTER `photo_path`"),
+            "UPDATE `employees` SET `photo_hash` = SHA1(`photo_path`) WHERE `photo_path` IS NOT NULL",
+            mysql_add_trigger("employees_photo_hash_bi",
+                              "CREATE TRIGGER `employees_photo_hash_bi` BEFORE INSERT ON `employees` "
+                              "FOR EACH ROW SET NEW.`photo_hash` = SHA1(NEW.`photo_path`)"),
+            mysql_add_trigger("employees_photo_hash_bu",
+                              "CREATE TRIGGER `employees_photo_hash_bu` BEFORE UPDATE ON `employees` "
+                              "FOR EACH ROW SET NEW.`photo_hash` = SHA1(NEW.`photo_path`)"),
+        ],
+        sqlite=[
+            # sha1() регистрируется в SQLiteConnection
+            "ALTER TABLE products ADD COLUMN photo_hash CHAR(40)",
+            "UPDATE products SET photo_hash = sha1(photo) WHERE photo IS NOT NULL",
+            "CREATE TRIGGER products_photo_hash_ai AFTER INSERT ON products BEGIN "
+            "UPDATE products SET photo_hash = sha1(new.photo) WHERE id = new.id; END",
+            "CREATE TRIGGER products_photo_hash_au AFTER UPDATE OF photo ON products BEGIN "
+            "UPDATE products SET photo_hash = sha1(new.photo) WHERE id = new.id; END",
+            "ALTER TABLE employees ADD COLUMN photo_hash CHAR(40)",
+            "UPDATE employees SET photo_hash = sha1(photo_path) WHERE photo_path IS NOT NULL",
+            "CREATE TRIGGER employees_photo_hash_ai AFTER INSERT ON employees BEGIN "
+            "UPDATE employees SET photo_hash = sha1(new.photo_path) WHERE id = new.id; END",
+            "CREATE TRIGGER employees_photo_hash_au AFTER UPDATE OF photo_path ON employees BEGIN "
+            "UPDATE employees SET photo_hash = sha1(new.photo_path) WHERE id = new.id; END",
+        ],
+    ),
+    Migration(
+        3,
+        "Журнал изменений строк row_changes для инкрементального обновления каталога",
+        mysql=[
+            "CREATE TABLE IF NOT EXISTS `row_changes` ("
+            "`version` BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY, "
+            "`table_name` VARCHAR(64) NOT NULL, "
+            "`row_id` INT NOT NULL, "
+            "`op` CHAR(1) NOT NULL, "
+            "`changed_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "KEY `idx_table_version` (`table_name`, `version`)"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+            *change_log_triggers("mysql", "products"),
+            *change_log_triggers("mysql", "categories"),
+            *change_log_triggers("mysql", "units"),
+        ],
+        sqlite=[
+            "CREATE TABLE row_changes ("
+            "version INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "table_name VARCHAR(64) NOT NULL, "
+            "row_id INT NOT NULL, "
+            "op CHAR(1) NOT NULL, "
+            "changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)",
+            'CREATE INDEX "row_changes_idx_table_version" ON "row_changes" ("table_name", "version")',
+            *change_log_triggers("sqlite", "products"),
+            *change_log_triggers("sqlite", "categories"),
+            *change_log_triggers("sqlite", "units"),
+        ],
+    ),
+    Migration(
+        4,
+        "Уменьшенные копии фото товаров и сотрудников (photo_renditions)",
+        mysql=[
+            "CREATE TABLE IF NOT EXISTS `photo_renditions` ("
+            "`owner_table` VARCHAR(32) NOT NULL, "
+            "`owner_id` INT NOT NULL, "
+            "`rendition` VARCHAR(16) NOT NULL, "
+            "`mime` VARCHAR(32) NOT NULL, "
+            "`width` INT NOT NULL, "
+            "`height` INT NOT NULL, "
+            "`data` MEDIUMBLOB NOT NULL, "
+            "PRIMARY KEY (`owner_table`, `owner_id`, `rendition`)"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+            mysql_add_trigger("products_renditions_ad",
+                              "CREATE TRIGGER `products_renditions_ad` AFTER DELETE ON `products` FOR EACH ROW "
+                              "DELETE FROM `photo_renditions` WHERE `owner_table` = 'products' "
+                              "AND `owner_id` = OLD.id"),
+            mysql_add_trigger("employees_renditions_ad",
+                              "CREATE TRIGGER `employees_renditions_ad` AFTER DELETE ON `employees` FOR EACH ROW "
+                              "DELETE FROM `photo_renditions` WHERE `owner_table` = 'employees' "
+                              "AND `owner_id` = OLD.id"),
+        ],
+        sqlite=[
+            "CREATE TABLE photo_renditions ("
+            "owner_table VARCHAR(32) NOT NULL, "
+            "owner_id INT NOT NULL, "
+            "rendition VARCHAR(16) NOT NULL, "
+            "mime VARCHAR(32) NOT NULL, "
+            "width INT NOT NULL, "
+            "height INT NOT NULL, "
+            "data BLOB NOT NULL, "
+            "PRIMARY KEY (owner_table, owner_id, rendition))",
+            "CREATE TRIGGER products_renditions_ad AFTER DELETE ON products BEGIN "
+            "DELETE FROM photo_renditions WHERE owner_table = 'products' AND owner_id = old.id; END",
+            "CREATE TRIGGER employees_renditions_ad AFTER DELETE ON employees BEGIN "
+            "DELETE FROM photo_renditions WHERE owner_table = 'employees' AND owner_id = old.id; END",
+        ],
+    ),
+    Migration(
+        5,
+        "Журнал изменений сотрудников, смен, должностей и фиксированных расходов",
+        mysql=[
+            *change_log_triggers("mysql", "employees"),
+            *change_log_triggers("mysql", "shifts"),
+            *change_log_triggers("mysql", "positions"),
+            *change_log_triggers("mysql", "fixed_costs"),
+        ],
+        sqlite=[
+            *change_log_triggers("sqlite", "employees"),
+            *change_log_triggers("sqlite", "shifts"),
+            *change_log_triggers("sqlite", "positions"),
+            *change_log_triggers("sqlite", "fixed_costs"),
+        ],
+    ),
+    Migration(
+        6,
+        "Плановые затраты товаров (product_costs) для расчёта маржи по всему меню",
+        mysql=[
+            "CREATE TABLE IF NOT EXISTS `product_costs` ("
+            "`product_id` INT NOT NULL PRIMARY KEY, "
+            "`cost_price` DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "`other_expenses` DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "`monthly_quantity` INT NOT NULL DEFAULT 0, "
+            "`updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+            "CONSTRAINT `fk_product_costs_product` FOREIGN KEY (`product_id`) "
+            "REFERENCES `products` (`id`) ON DELETE CASCADE"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+            *change_log_triggers("mysql", "product_costs", key="product_id"),
+        ],
+        sqlite=[
+            "CREATE TABLE product_costs ("
+            "product_id INT NOT NULL PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE, "
+            "cost_price DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "other_expenses DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "monthly_quantity INT NOT NULL DEFAULT 0, "
+            "updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)",
+            *change_log_triggers("sqlite", "product_costs", key="product_id"),
+        ],
+    ),
+    Migration(
+        7,
+        "История расчётов прибыли: цена, количество, комиссия и индексы по товару и дате",
+        mysql=[
+            # Один ALTER TABLE применяется целиком или никак — достаточно проверить первый столбец
+            mysql_add_column("product_profit_calculations", "selling_price",
+                             "ALTER TABLE `product_profit_calculations` "
+                             "ADD `selling_price` DECIMAL(10,2) NULL AFTER `product_id`, "
+                             "ADD `quantity` INT NULL AFTER `other_expenses`, "
+                             "ADD `bank_fee_rate` DECIMAL(4,2) NULL AFTER `quantity`, "
+                             "ADD KEY `idx_profit_product_date` (`product_id`, `calculation_date`), "
+                             "ADD KEY `idx_profit_date` (`calculation_date`)"),
+        ],
+        sqlite=[
+            "ALTER TABLE product_profit_calculations ADD COLUMN selling_price DECIMAL(10,2)",
+            "ALTER TABLE product_profit_calculations ADD COLUMN quantity INT",
+            "ALTER TABLE product_profit_calculations ADD COLUMN bank_fee_rate DECIMAL(4,2)",
+            'CREATE INDEX "product_profit_calculations_idx_profit_product_date" '
+            'ON "product_profit_calculations" ("product_id", "calculation_date")',
+            'CREATE INDEX "product_profit_calculations_idx_profit_date" '
+            'ON "product_profit_calculations" ("calculation_date")',
+        ],
+    ),
+    Migration(
+        8,
+        "Итоги зарплаты по дням и месяцам (payroll_daily, payroll_monthly) для сводок за период",
+        mysql=[
+            "CREATE TABLE IF NOT EXISTS `payroll_daily` ("
+            "`employee_id` INT NOT NULL, "
+            "`day` DATE NOT NULL, "
+            "`shift_count` INT NOT NULL DEFAULT 0, "
+            "`hours` DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "`salary` DECIMAL(12,2) NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (`employee_id`, `day`), "
+            "KEY `idx_payroll_daily_day` (`day`), "
+            "CONSTRAINT `fk_payroll_daily_employee` FOREIGN KEY (`employee_id`) "
+            "REFERENCES `employees` (`id`) ON DELETE CASCADE"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+            "CREATE TABLE IF NOT EXISTS `payroll_monthly` ("
+            "`employee_id` INT NOT NULL, "
+            "`month` DATE NOT NULL, "
+            "`shift_count` INT NOT NULL DEFAULT 0, "
+            "`hours` DECIMAL(12,2) NOT NULL DEFAULT 0, "
+            "`salary` DECIMAL(14,2) NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (`employee_id`, `month`), "
+            "KEY `idx_payroll_monthly_month` (`month`), "
+            "CONSTRAINT `fk_payroll_monthly_employee` FOREIGN KEY (`employee_id`) "
+            "REFERENCES `employees` (`id`) ON DELETE CASCADE"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci",
+            "INSERT INTO `payroll_daily` (`employee_id`, `day`, `shift_count`, `hours`, `salary`) "
+            "SELECT `employee_id`, `shift_date`, COUNT(*), "
+            "SUM(ROUND(TIME_TO_SEC(TIMEDIFF(`shift_end`, `shift_start`)) / 3600, 2)), "
+            "COALESCE(SUM(`shift_salary`), 0) "
+            "FROM `shifts` GROUP BY `employee_id`, `shift_date`",
+            "INSERT INTO `payroll_monthly` (`employee_id`, `month`, `shift_count`, `hours`, `salary`) "
+            "SELECT `employee_id`, DATE_FORMAT(`day`, '%%Y-%%m-01') AS `month`, "
+            "SUM(`shift_count`), SUM(`hours`), SUM(`salary`) "
+            "FROM `payroll_daily` GROUP BY `employee_id`, `month`",
+        ],
+        sqlite=[
+            "CREATE TABLE payroll_daily ("
+            "employee_id INT NOT NULL REFERENCES employees (id) ON DELETE CASCADE, "
+            "day DATE NOT NULL, "
+            "shift_count INT NOT NULL DEFAULT 0, "
+            "hours DECIMAL(10,2) NOT NULL DEFAULT 0, "
+            "salary DECIMAL(12,2) NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (employee_id, day))",
+            'CREATE INDEX "payroll_daily_idx_payroll_daily_day" ON "payroll_daily" ("day")',
+            "CREATE TABLE payroll_monthly ("
+            "employee_id INT NOT NULL REFERENCES employees (id) ON DELETE CASCADE, "
+            "month DATE NOT NULL, "
+            "shift_count INT NOT NULL DEFAULT 0, "
+            "hours DECIMAL(12,2) NOT NULL DEFAULT 0, "
+            "salary DECIMAL(14,2) NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (employee_id, month))",
+            'CREATE INDEX "payroll_monthly_idx_payroll_monthly_month" ON "payroll_monthly" ("month")',
+            "INSERT INTO payroll_daily (employee_id, day, shift_count, hours, salary) "
+            "SELECT employee_id, shift_date, COUNT(*), "
+            "SUM(ROUND((strftime('%s', shift_end) - strftime('%s', shift_start)) / 3600.0, 2)), "
+            "COALESCE(SUM(shift_salary), 0) "
+            "FROM shifts GROUP BY employee_id, shift_date",
+            "INSERT INTO payroll_monthly (employee_id, month, shift_count, hours, salary) "
+            "SELECT employee_id, strftime('%Y-%m-01', day) AS month, "
+            "SUM(shift_count), SUM(hours), SUM(salary) "
+            "FROM payroll_daily GROUP BY employee_id, month",
+        ],
+    ),
+    Migration(
+        9,
+        "Ставки комиссии и налога в истории расчётов — с точностью калькулятора (0.001 %)",
+        # Калькулятор считает ставки в стотысячных долях (margins.RATE_SCALE) и допускает 100 % и выше
+        mysql=[
+            "ALTER TABLE `product_profit_calculations` "
+            "MODIFY `bank_fee_rate` DECIMAL(6,3) NULL, "
+            "MODIFY `tax_rate` DECIMAL(6,3) NOT NULL DEFAULT '6.000'",
+        ],
+        # У SQLite точность DECIMAL не ограничена
+        sqlite=[],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def ensure_version_table(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(db):
+    ensure_version_table(db)
+    row = db.fetch_one("SELECT MAX(version) AS version FROM schema_version")
+    return (row and row['version']) or 0
+
+
+def pending(db):
+    version = current_version(db)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def migrate(db, log=print):
+    """Применяет недостающие миграции по порядку. Возвращает итоговую версию схемы."""
+    version = current_version(db)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        log(f"[DB] Миграция {migration.version}: {migration.description}")
+        # DDL в MySQL фиксируется неявно; в SQLite миграция атомарна целиком
+        with db.transaction():
+            for statement in migration.statements[db.backend.name]:
+                if callable(statement):
+                    statement(db)
+                else:
+                    db.execute(statement)
+            db.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+        version = migration.version
+    return version
+
+
+def main(argv):
+    from database.db import Database
+
+    db = Database()
+    command = argv[1] if len(argv) > 1 else "up"
+    if command == "status":
+        version = current_version(db)
+        print(f"Версия схемы: {version} из {LATEST_VERSION}")
+        for migration in pending(db):
+            print(f"  ожидает: {migration.version} — {migration.description}")
+    elif command == "up":
+        try:
+            print(f"Версия схемы: {migrate(db)}")
+        except MigrationError as e:
+            print(f"Миграция не применена: {e}")
+            return 1
+    else:
+        print("Использование: python -m database.migrations [up|status]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,210 @@
+# database/payroll_report.py
+# Выгрузка смен и зарплаты за период (XLSX или CSV) потоком.
+#
+# Все смены периода читаются одним запросом, упорядоченным по сотруднику, часы
+# считает база. Итоги копятся по ходу чтения, строки сразу уходят в файл:
+# память не зависит от длины периода и числа сотрудников.
+import csv
+import os
+import re
+from datetime import time, timedelta
+from decimal import Decimal
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# Через сколько смен сообщать о прогрессе
+PROGRESS_ROWS = 1000
+
+SHEET_HEADER = ["Дата", "Начало", "Конец", "Часы", "Зарплата"]
+CSV_HEADER = ["Сотрудник"] + SHEET_HEADER
+SUMMARY_HEADER = ["Сотрудник", "Смен", "Часы", "Зарплата"]
+SUMMARY_TITLE = "Сводка"
+
+# Символы, недопустимые в названии листа Excel
+_SHEET_FORBIDDEN = re.compile(r"[\[\]:*?/\\]")
+
+
+def payroll_query(backend):
+    hours = backend.hours_between("s.shift_start", "s.shift_end")
+    return f"""
+        SELECT s.employee_id, e.first_name, e.last_name, s.shift_date, s.shift_start, s.shift_end,
+               {hours} AS hours, s.shift_salary
+        FROM shifts s
+        JOIN employees e ON e.id = s.employee_id
+        WHERE s.shift_date BETWEEN %s AND %s
+        ORDER BY s.employee_id, s.shift_date, s.shift_start
+    """
+
+
+class Totals:
+    def __init__(self):
+        self.shifts = 0
+        self.hours = Decimal(0)
+        self.salary = Decimal(0)
+
+    def add(self, hours, salary):
+        self.shifts += 1
+        self.hours += Decimal(str(hours or 0))
+        self.salary += Decimal(salary or 0)
+
+
+class PayrollReport(Totals):
+    """Итоги выгрузки по всем сотрудникам."""
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path
+        self.employees = 0
+
+    def merge(self, totals):
+        self.employees += 1
+        self.shifts += totals.shifts
+        self.hours += totals.hours
+        self.salary += totals.salary
+
+    def summary(self):
+        return (f"Сотрудников: {self.employees}, смен: {self.shifts}, "
+                f"часов: {self.hours:.2f}, начислено: {self.salary:.2f} ₽")
+
+
+def _as_time(value):
+    # TIME приходит как timedelta (pymysql и конвертер SQLite), старые строки SQLite — текстом
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds()) % 86400
+        return time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    if isinstance(value, str):
+        return time.fromisoformat(value)
+    return value
+
+
+def sheet_title(name, employee_id, used):
+    """Название листа: без запрещённых символов, до 31 знака; однофамильцам добавляется id."""
+    title = _SHEET_FORBIDDEN.sub(" ", name).strip()[:31] or f"Сотрудник {employee_id}"
+    if title in used:
+        suffix = f" ({employee_id})"
+        title = title[:31 - len(suffix)] + suffix
+    used.add(title)
+    return title
+
+
+# === Форматы ===
+
+class _XlsxWriter:
+    """Лист на сотрудника и лист «Сводка» первым; все листы write-only."""
+
+    def __init__(self, path):
+        self.path = path
+        self.wb = Workbook(write_only=True)
+        self.summary = self.wb.create_sheet(SUMMARY_TITLE)
+        self.summary.append(self.bold_row(self.summary, SUMMARY_HEADER))
+        self.used = {SUMMARY_TITLE}
+        self.ws = None
+        self.saved = False
+
+    @staticmethod
+    def bold_row(ws, values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+
+    def begin(self, employee_id, name):
+        self.ws = self.wb.create_sheet(sheet_title(name, employee_id, self.used))
+        self.ws.append(self.bold_row(self.ws, SHEET_HEADER))
+
+    def shift(self, name, values):
+        self.ws.append(values)
+
+    def end(self, name, totals):
+        self.ws.append([])
+        self.ws.append(self.bold_row(self.ws, ["Итого", "", "", totals.hours, totals.salary]))
+        self.summary.append([name, totals.shifts, totals.hours, totals.salary])
+
+    def finish(self, report):
+        self.summary.append([])
+        self.summary.append(self.bold_row(self.summary, ["Всего", report.shifts, report.hours, report.salary]))
+        self.wb.save(self.path)
+        self.saved = True
+
+    def close(self):
+        # Выгрузка прервана: дописываем и закрываем временные файлы листов, книгу не сохраняем
+        if not self.saved:
+            for ws in self.wb.worksheets:
+                if not ws.closed:
+                    ws.close()
+
+
+class _CsvWriter:
+    """Одна таблица: смены всех сотрудников подряд, после каждого — строка «Итого»."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file, delimiter=";")
+        self.writer.writerow(CSV_HEADER)
+
+    def begin(self, employee_id, name):
+        pass
+
+    def shift(self, name, values):
+        self.writer.writerow([name] + ["" if value is None else value for value in values])
+
+    def end(self, name, totals):
+        self.writer.writerow([name, "Итого", "", "", totals.hours, totals.salary])
+
+    def finish(self, report):
+        self.writer.writerow(["Всего", "", "", "", report.hours, report.salary])
+
+    def close(self):
+        self.file.close()
+
+
+# === Выгрузка ===
+
+def export_payroll(db, path, start_date, end_date, progress=None):
+    """Смены и зарплата всех сотрудников за период [start_date, end_date] в XLSX или CSV.
+
+    progress(выгружено смен) вызывается каждые PROGRESS_ROWS смен; исключение из него
+    (например, отмена задачи) прерывает выгрузку, недописанный файл удаляется.
+    Возвращает PayrollReport.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        writer = _CsvWriter(path)
+    else:
+        writer = _XlsxWriter(path)
+
+    report = PayrollReport(path)
+    completed = False
+    try:
+        employee_id = name = totals = None
+        rows = db.iter_rows(payroll_query(db.backend), (start_date, end_date), as_tuples=True)
+        for row in rows:
+            if row[0] != employee_id:
+                if totals is not None:
+                    writer.end(name, totals)
+                    report.merge(totals)
+                employee_id, name, totals = row[0], f"{row[1]} {row[2]}", Totals()
+                writer.begin(employee_id, name)
+
+            shift_date, shift_start, shift_end, hours, salary = row[3:]
+            writer.shift(name, [shift_date, _as_time(shift_start), _as_time(shift_end), hours, salary])
+            totals.add(hours, salary)
+            if progress and (report.shifts + totals.shifts) % PROGRESS_ROWS == 0:
+                progress(report.shifts + totals.shifts)
+
+        if totals is not None:
+            writer.end(name, totals)
+            report.merge(totals)
+        writer.finish(report)
+        if progress:
+            progress(report.shifts)
+        completed = True
+    finally:
+        writer.close()
+        if not completed and os.path.exists(path):
+            os.remove(path)
+    return report
@@ -0,0 +1,254 @@
+# database/payroll_rollup.py
+# Итоги зарплаты по сотрудникам за день и за месяц (миграция 8).
+#
+# Каждое сохранение, изменение или удаление смены прибавляет к итогам разницу
+# в той же транзакции. Сводка за период складывается из итогов целых месяцев и
+# отдельных дней по краям периода, а не из всех смен.
+#
+#   python -m database.payroll_rollup verify   — сверить итоги со сменами
+#   python -m database.payroll_rollup rebuild  — пересчитать итоги заново
+import os
+import sys
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+ROLLUP_TABLES = ("payroll_daily", "payroll_monthly")
+ROLLUP_COLUMNS = ("shift_count", "hours", "salary")
+# Сколько расхождений печатать при сверке
+REPORT_MISMATCHES = 20
+# Сверять итоги при запуске приложения (1 — да). Сверка читает все смены, поэтому
+# по умолчанию выключена и запускается командой verify
+VERIFY_AT_STARTUP = os.environ.get("COFFEE_VERIFY_PAYROLL", "0") == "1"
+
+SHIFT_QUERY = """
+    SELECT employee_id, shift_date, shift_start, shift_end, shift_salary
+    FROM shifts WHERE id = %s
+"""
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _seconds(value):
+    # TIME: timedelta (pymysql, конвертер SQLite) или строка HH:MM:SS
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    hours, minutes, seconds = (int(part) for part in str(value).split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def shift_hours(start, end):
+    """Часы смены с округлением до сотых — как hours_between() в SQL."""
+    hours = Decimal(_seconds(end) - _seconds(start)) / 3600
+    return hours.quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+
+def fetch_shift(db, shift_id):
+    """Смена перед изменением: её нужно вычесть из итогов.
+
+    В транзакции строка блокируется до её конца (FOR UPDATE), чтобы два клиента,
+    правящие одну смену, не вычли из итогов одно и то же старое значение дважды.
+    """
+    query = SHIFT_QUERY
+    if db.in_transaction():
+        query += db.backend.lock_rows_clause()
+    return db.fetch_one(query, (shift_id,))
+
+
+def apply_shift_change(db, old=None, new=None):
+    """Переносит изменение одной смены в итоги. Вызывать в транзакции записи смены.
+
+    old — смена до изменения (None при добавлении), new — после (None при удалении);
+    словари с employee_id, shift_date, shift_start, shift_end, shift_salary.
+    """
+    deltas = {}
+    for shift, sign in ((old, -1), (new, 1)):
+        if shift is None:
+            continue
+        key = (shift['employee_id'], _parse_date(shift['shift_date']))
+        count, hours, salary = deltas.get(key, (0, Decimal(0), Decimal(0)))
+        deltas[key] = (
+            count + sign,
+            hours + sign * shift_hours(shift['shift_start'], shift['shift_end']),
+            salary + sign * Decimal(str(shift['shift_salary'] or 0)),
+        )
+
+    for (employee_id, day), (count, hours, salary) in deltas.items():
+        if count == 0 and hours == 0 and salary == 0:
+            continue
+        for table, column, bucket in (("payroll_daily", "day", day),
+                                      ("payroll_monthly", "month", day.replace(day=1))):
+            db.execute(
+                f"INSERT INTO {table} (employee_id, {column}, shift_count, hours, salary) "
+                f"VALUES (%s, %s, %s, %s, %s)" + db.backend.upsert_add_clause(ROLLUP_COLUMNS),
+                (employee_id, bucket, count, hours, salary)
+            )
+            db.execute(
+                f"DELETE FROM {table} WHERE employee_id = %s AND {column} = %s AND shift_count <= 0",
+                (employee_id, bucket)
+            )
+
+
+# === Сводка за период ===
+
+def split_period(start, end):
+    """Период [start, end] как целые месяцы и отдельные дни по краям.
+
+    Возвращает (месяцы — (первое число, первое число) или None, [(с, по), ...] дней).
+    """
+    first_full = start if start.day == 1 else _next_month(start)
+    last_day = monthrange(end.year, end.month)[1]
+    last_full = end if end.day == last_day else end.replace(day=1) - timedelta(days=1)
+    if first_full > last_full:
+        return None, [(start, end)]
+    days = []
+    if start < first_full:
+        days.append((start, first_full - timedelta(days=1)))
+    if last_full < end:
+        days.append((last_full + timedelta(days=1), end))
+    return (first_full, last_full.replace(day=1)), days
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def payroll_summary(db, start_date, end_date):
+    """Начислено, часы и число смен по сотрудникам за период, по убыванию суммы."""
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    if start > end:
+        return []
+    months, days = split_period(start, end)
+    parts, params = [], []
+    if months is not None:
+        parts.append("SELECT employee_id, shift_count, hours, salary FROM payroll_monthly "
+                     "WHERE month BETWEEN %s AND %s")
+        params.extend(months)
+    for first, last in days:
+        parts.append("SELECT employee_id, shift_count, hours, salary FROM payroll_daily "
+                     "WHERE day BETWEEN %s AND %s")
+        params.extend((first, last))
+    return db.fetch_all(f"""
+        SELECT e.id, e.first_name, e.last_name, SUM(r.salary) AS total_salary,
+               SUM(r.hours) AS total_hours, SUM(r.shift_count) AS shift_count
+        FROM ({" UNION ALL ".join(parts)}) r
+        JOIN employees e ON e.id = r.employee_id
+        GROUP BY e.id, e.first_name, e.last_name
+        HAVING SUM(r.shift_count) > 0
+        ORDER BY total_salary DESC
+    """, params)
+
+
+# === Пересчёт и сверка ===
+
+def _daily_from_shifts(backend):
+    return f"""
+        SELECT employee_id, shift_date AS day, COUNT(*) AS shift_count,
+               SUM({backend.hours_between("shift_start", "shift_end")}) AS hours,
+               COALESCE(SUM(shift_salary), 0) AS salary
+        FROM shifts
+        GROUP BY employee_id, shift_date
+    """
+
+
+def _monthly_from_daily(backend):
+    month = backend.month_start("day")
+    return f"""
+        SELECT employee_id, {month} AS month, SUM(shift_count) AS shift_count,
+               SUM(hours) AS hours, SUM(salary) AS salary
+        FROM payroll_daily
+        GROUP BY employee_id, {month}
+    """
+
+
+def rebuild(db):
+    """Пересчитывает итоги по всем сменам. Возвращает (дней, месяцев)."""
+    with db.transaction():
+        db.execute("DELETE FROM payroll_monthly")
+        db.execute("DELETE FROM payroll_daily")
+        db.execute(
+            "INSERT INTO payroll_daily (employee_id, day, shift_count, hours, salary) "
+            + _daily_from_shifts(db.backend)
+        )
+        db.execute(
+            "INSERT INTO payroll_monthly (employee_id, month, shift_count, hours, salary) "
+            + _monthly_from_daily(db.backend)
+        )
+        days = db.fetch_one("SELECT COUNT(*) AS n FROM payroll_daily")['n']
+        months = db.fetch_one("SELECT COUNT(*) AS n FROM payroll_monthly")['n']
+    return days, months
+
+
+def _totals(rows, column):
+    cents = Decimal("0.01")
+    return {
+        (row['employee_id'], _parse_date(row[column])): (
+            int(row['shift_count']),
+            Decimal(str(row['hours'])).quantize(cents),
+            Decimal(str(row['salary'])).quantize(cents),
+        )
+        for row in rows
+    }
+
+
+def verify(db):
+    """Сверяет итоги со сменами. Возвращает расхождения: (таблица, сотрудник, день/месяц, ожидалось, записано)."""
+    mismatches = []
+    checks = (
+        ("payroll_daily", "day", _daily_from_shifts(db.backend)),
+        ("payroll_monthly", "month", _monthly_from_daily(db.backend)),
+    )
+    for table, column, expected_query in checks:
+        expected = _totals(db.iter_rows(expected_query), column)
+        actual = _totals(db.iter_rows(
+            f"SELECT employee_id, {column}, shift_count, hours, salary FROM {table}"
+        ), column)
+        for key in sorted(expected.keys() | actual.keys()):
+            if expected.get(key) != actual.get(key):
+                mismatches.append((table, key[0], key[1], expected.get(key), actual.get(key)))
+    return mismatches
+
+
+def report_mismatches(mismatches, log=print):
+    log(f"Итоги зарплаты расходятся со сменами: {len(mismatches)}")
+    for table, employee_id, period, expected, actual in mismatches[:REPORT_MISMATCHES]:
+        log(f"  {table}: сотрудник {employee_id}, {period}: ожидалось {expected}, записано {actual}")
+    log("Пересчитать: python -m database.payroll_rollup rebuild")
+
+
+def check_at_startup(db, log=print):
+    """Сверка при запуске (VERIFY_AT_STARTUP), в фоне. Смены, изменённые в обход приложения
+    (SQL, импорт, старые версии программы), в итоги не попадают — о расхождении пишем в лог."""
+    try:
+        mismatches = verify(db)
+    except db.backend.errors as e:
+        log(f"⚠️ Итоги зарплаты не сверены: {e}")
+        return
+    if mismatches:
+        report_mismatches(mismatches, lambda line: log(f"⚠️ {line}"))
+
+
+def main(argv):
+    from database.db import Database
+
+    db = Database()
+    command = argv[1] if len(argv) > 1 else "verify"
+    if command == "verify":
+        mismatches = verify(db)
+        if not mismatches:
+            print("Итоги зарплаты совпадают со сменами")
+            return 0
+        report_mismatches(mismatches)
+        return 1
+    if command == "rebuild":
+        days, months = rebuild(db)
+        print(f"Итоги пересчитаны: дней {days}, месяцев {months}")
+        return 0
+    print("Использование: python -m database.payroll_rollup [verify|rebuild]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,122 @@
+# database/product_index.py
+# Поисковый индекс каталога в памяти: триграммы названий и битовые маски категорий
+
+
+def normalize(text):
+    # Без учёта регистра; «ё» и «е» не различаем, как utf8mb4_unicode_ci
+    return " ".join((text or "").casefold().replace("ё", "е").split())
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class ProductSearchIndex:
+    """Подстрочный поиск по названию (аналог LIKE '%…%') и фильтр по категории.
+
+    Множества товаров хранятся битовыми масками (int): бит i — i-й товар каталога.
+    Для запроса из трёх и более символов кандидаты — пересечение масок его
+    триграмм, затем точная проверка подстроки. Короткие запросы ищутся по
+    униграммам и биграммам.
+    """
+
+    def __init__(self, products=()):
+        self.products = []
+        self.names = []
+        self.positions_by_id = {}
+        self.grams = {}
+        self.categories = {}
+        self.all_mask = 0
+        self.build(products)
+
+    def build(self, products):
+        self.products = []
+        self.names = []
+        self.positions_by_id = {}
+        self.grams = {}
+        self.categories = {}
+        self.all_mask = 0
+        for product in products:
+            self._append(product)
+
+    def __len__(self):
+        return len(self.positions_by_id)
+
+    def _add(self, position, product, name):
+        bit = 1 << position
+        for size in (1, 2, 3):
+            for gram in _grams(name, size):
+                self.grams[gram] = self.grams.get(gram, 0) | bit
+        category_id = product.get('category_id')
+        self.categories[category_id] = self.categories.get(category_id, 0) | bit
+        self.all_mask |= bit
+
+    def _discard(self, position):
+        bit = 1 << position
+        for size in (1, 2, 3):
+            for gram in _grams(self.names[position], size):
+                self.grams[gram] &= ~bit
+        category_id = self.products[position].get('category_id')
+        self.categories[category_id] &= ~bit
+        self.all_mask &= ~bit
+
+    def _append(self, product):
+        position = len(self.products)
+        name = normalize(product['name'])
+        self.products.append(product)
+        self.names.append(name)
+        self.positions_by_id[product['id']] = position
+        self._add(position, product, name)
+
+    def upsert(self, product):
+        """Добавляет или заменяет товар. Новые id больше старых, поэтому порядок каталога сохраняется."""
+        position = self.positions_by_id.get(product['id'])
+        if position is None:
+            self._append(product)
+            return
+        self._discard(position)
+        name = normalize(product['name'])
+        self.products[position] = product
+        self.names[position] = name
+        self._add(position, product, name)
+
+    def remove(self, product_id):
+        # Позиция остаётся пустой, чтобы не сдвигать биты остальных товаров
+        position = self.positions_by_id.pop(product_id, None)
+        if position is not None:
+            self._discard(position)
+            self.products[position] = None
+            self.names[position] = ""
+
+    def match(self, query="", category_id=None, within=None):
+        """Маска подходящих товаров. within — маска предыдущего результата для уточнения запроса."""
+        mask = self.all_mask if within is None else within
+        if category_id is not None:
+            mask &= self.categories.get(category_id, 0)
+
+        query = normalize(query)
+        if not query or not mask:
+            return mask
+
+        size = min(3, len(query))
+        for gram in _grams(query, size):
+            mask &= self.grams.get(gram, 0)
+            if not mask:
+                return 0
+
+        # Триграммы не гарантируют порядок — проверяем подстроку у кандидатов
+        if len(query) > 3:
+            for position in self.positions(mask):
+                if query not in self.names[position]:
+                    mask &= ~(1 << position)
+        return mask
+
+    @staticmethod
+    def positions(mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def products_for(self, mask):
+        return [self.products[position] for position in self.positions(mask)]
@@ -0,0 +1,341 @@
+# database/product_io.py
+# Массовый импорт и экспорт товаров (CSV, XLSX) с потоковым чтением и записью.
+import csv
+import os
+from decimal import Decimal, InvalidOperation
+
+from openpyxl import Workbook, load_workbook
+
+from database.blobs import save_renditions
+from database.cache import reference_cache
+from database.product_index import normalize
+
+# Строк файла в одной транзакции
+IMPORT_BATCH = 200
+# Сколько ошибок показывать в отчёте
+REPORT_ERRORS = 20
+# Через сколько строк выгрузки сообщать о прогрессе
+EXPORT_PROGRESS = 500
+
+# Столбец -> допустимые заголовки (сравниваются без учёта регистра)
+COLUMNS = {
+    "name": ("название", "наименование", "name"),
+    "category": ("категория", "category"),
+    "price": ("цена", "price"),
+    "weight_or_volume": ("вес/объём", "вес/объем", "вес", "объём", "объем", "weight_or_volume", "weight"),
+    "unit": ("единица", "ед. изм.", "ед.изм.", "unit"),
+    "description": ("описание", "description"),
+    "photo": ("фото", "photo"),
+}
+# Столбцы products, которые заполняет импорт (кроме названия и фото)
+PRODUCT_COLUMNS = ("category_id", "price", "weight_or_volume", "unit_id", "description")
+EXPORT_HEADER = ["Название", "Категория", "Цена", "Вес/Объём", "Единица", "Описание"]
+
+
+class ProductFileError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # (номер строки файла, сообщение)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def summary(self):
+        text = f"Добавлено: {self.inserted}, обновлено: {self.updated}, ошибок: {len(self.errors)}"
+        for line, message in self.errors[:REPORT_ERRORS]:
+            text += f"\nСтрока {line}: {message}"
+        if len(self.errors) > REPORT_ERRORS:
+            text += f"\n… и ещё {len(self.errors) - REPORT_ERRORS}"
+        return text
+
+
+# === Чтение ===
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _read_xlsx(path):
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def read_rows(path):
+    """Строки файла как словари по столбцам COLUMNS: (номер строки, словарь). Читает потоком."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        rows = _read_xlsx(path)
+    elif ext in (".csv", ".txt"):
+        rows = _read_csv(path)
+    else:
+        raise ProductFileError(f"Неподдерживаемый формат файла: {ext}")
+
+    header = next(rows, None)
+    if not header:
+        raise ProductFileError("Файл пуст")
+    aliases = {alias: column for column, names in COLUMNS.items() for alias in names}
+    positions = {}
+    for position, title in enumerate(header):
+        column = aliases.get(str(title or "").strip().lower())
+        if column and column not in positions:
+            positions[column] = position
+    if "name" not in positions:
+        raise ProductFileError("В файле нет столбца «Название»")
+
+    for line, row in enumerate(rows, start=2):
+        if not row or all(value in (None, "") for value in row):
+            continue
+        yield line, {column: row[position] if position < len(row) else None
+                     for column, position in positions.items()}
+
+
+# === Проверка ===
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _number(value, kind):
+    text = _text(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+    if not text:
+        return None
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"{kind}: «{value}» не число")
+    if number < 0:
+        raise ValueError(f"{kind} не может быть отрицательной")
+    return number
+
+
+def _by_name(table):
+    return {normalize(name): row_id for row_id, name in table.items()}
+
+
+class _Resolver:
+    def __init__(self, db):
+        cache = reference_cache(db)
+        self.categories = _by_name(cache.categories())
+        self.units = _by_name(cache.units())
+
+    def product(self, values):
+        """Проверенная строка товара или ValueError с описанием ошибки.
+
+        Поля берутся только из столбцов, которые есть в файле: отсутствующий столбец
+        не попадает в словарь и при обновлении товара не меняется.
+        """
+        name = _text(values.get("name"))
+        if not name:
+            raise ValueError("не указано название")
+        if len(name) > 100:
+            raise ValueError("название длиннее 100 символов")
+        product = {"name": name, "photo": _text(values.get("photo")) or None}
+
+        if "category" in values:
+            category = _text(values["category"])
+            product["category_id"] = self.categories.get(normalize(category))
+            if product["category_id"] is None:
+                raise ValueError(f"неизвестная категория «{category}»" if category else "не указана категория")
+
+        if "unit" in values:
+            unit = _text(values["unit"])
+            product["unit_id"] = None
+            if unit:
+                product["unit_id"] = self.units.get(normalize(unit))
+                if product["unit_id"] is None:
+                    raise ValueError(f"неизвестная единица измерения «{unit}»")
+
+        if "price" in values:
+            product["price"] = _number(values["price"], "Цена")
+        if "weight_or_volume" in values:
+            weight = _number(values["weight_or_volume"], "Вес/объём")
+            product["weight_or_volume"] = float(weight) if weight is not None else None
+        if "description" in values:
+            product["description"] = _text(values["description"]) or None
+        return product
+
+
+# === Импорт ===
+
+def import_products(db, path, load_photo=None, progress=None, batch_size=IMPORT_BATCH):
+    """Импорт товаров из CSV/XLSX. Товар с тем же названием (без учёта регистра) обновляется.
+
+    Обновляются только столбцы, которые есть в файле; для нового товара нужна категория.
+
+    load_photo(путь) -> копии фото для save_renditions; без него столбец «Фото» игнорируется.
+    Каждая пачка строк — отдельная транзакция. Если базу не устроила какая-то строка,
+    пачка пишется заново по одной строке, и в отчёт попадают только отклонённые.
+    progress(обработано строк) вызывается после каждой пачки.
+    """
+    report = ImportReport()
+    resolver = _Resolver(db)
+    existing = {normalize(row['name']): row['id'] for row in db.fetch_all("SELECT id, name FROM products")}
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    batch = {}  # название -> (номер строки, товар); повтор в пачке заменяет предыдущий
+    processed = 0
+    for line, values in read_rows(path):
+        processed += 1
+        try:
+            product = resolver.product(values)
+        except ValueError as e:
+            report.error(line, str(e))
+            continue
+        if "category_id" not in product and normalize(product['name']) not in existing:
+            report.error(line, "не указана категория")
+            continue
+        batch[normalize(product['name'])] = (line, product)
+        if len(batch) >= batch_size:
+            _import_batch(db, batch, existing, base_dir, load_photo, report)
+            batch = {}
+            if progress:
+                progress(processed)
+    if batch:
+        _import_batch(db, batch, existing, base_dir, load_photo, report)
+    if progress:
+        progress(processed)
+    return report
+
+
+def _import_batch(db, batch, existing, base_dir, load_photo, report):
+    # Фото готовим до транзакции: декодирование долгое, а блокировки держать незачем
+    photos = {}
+    if load_photo is not None:
+        for key, (line, product) in list(batch.items()):
+            if not product['photo']:
+                continue
+            photo_path = product['photo']
+            if not os.path.isabs(photo_path):
+                photo_path = os.path.join(base_dir, photo_path)
+            try:
+                photos[key] = load_photo(photo_path)
+            except Exception as e:
+                report.error(line, f"фото «{product['photo']}»: {e}")
+
+    try:
+        _write_batch(db, batch, existing, photos, report)
+        return
+    except db.backend.errors as e:
+        if not db.backend.is_row_error(e):
+            _batch_failed(batch, e, report)
+            return
+    # Пачку отклонила какая-то строка (значение не помещается, нарушен ключ):
+    # пишем по одной, чтобы отчёт назвал именно её, а остальные сохранились
+    items = list(batch.items())
+    for index, (key, (line, product)) in enumerate(items):
+        photo = {key: photos[key]} if key in photos else {}
+        try:
+            _write_batch(db, {key: (line, product)}, existing, photo, report)
+        except db.backend.errors as e:
+            if not db.backend.is_row_error(e):
+                _batch_failed(dict(items[index:]), e, report)
+                return
+            report.error(line, f"не сохранена: {e}")
+
+
+def _write_batch(db, batch, existing, photos, report):
+    updates = [(key, line, p) for key, (line, p) in batch.items() if key in existing]
+    inserts = [(key, line, p) for key, (line, p) in batch.items() if key not in existing]
+    # Набор полей у всех строк файла одинаковый — он задан заголовком
+    columns = [column for column in PRODUCT_COLUMNS if column in next(iter(batch.values()))[1]]
+    with db.transaction():
+        if updates and columns:
+            db.execute_many(
+                f"UPDATE products SET {', '.join(f'{column} = %s' for column in columns)} WHERE id = %s",
+                [[p[column] for column in columns] + [existing[key]] for key, line, p in updates]
+            )
+        inserted_ids = {}
+        if inserts:
+            db.insert_many(
+                "products", ["name"] + columns,
+                [[p['name']] + [p[column] for column in columns] for key, line, p in inserts]
+            )
+            names = [p['name'] for key, line, p in inserts]
+            placeholders = ", ".join(["%s"] * len(names))
+            rows = db.fetch_all(f"SELECT id, name FROM products WHERE name IN ({placeholders})", names)
+            inserted_ids = {normalize(row['name']): row['id'] for row in rows}
+
+        ids = dict(existing)
+        ids.update(inserted_ids)
+        for key, renditions in photos.items():
+            full = next(r for r in renditions if r[0] == "full")
+            db.execute("UPDATE products SET photo = %s WHERE id = %s", (full[4], ids[key]))
+            save_renditions(db, "products", ids[key], renditions)
+
+    existing.update(inserted_ids)
+    report.updated += len(updates)
+    report.inserted += len(inserts)
+
+
+def _batch_failed(batch, error, report):
+    first = min(line for line, product in batch.values())
+    last = max(line for line, product in batch.values())
+    report.error(first, f"строки {first}–{last} не сохранены: {error}")
+
+
+# === Экспорт ===
+
+EXPORT_QUERY = """
+    SELECT p.name, c.name AS category, p.price, p.weight_or_volume, u.name AS unit, p.description
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+    LEFT JOIN units u ON p.unit_id = u.id
+    ORDER BY p.id
+"""
+
+
+def export_products(db, path, progress=None):
+    """Выгрузка каталога в CSV или XLSX (write-only) потоком. Возвращает число строк.
+
+    progress(выгружено строк) вызывается каждые EXPORT_PROGRESS строк; если он
+    бросает исключение, выгрузка прерывается и недописанный файл удаляется.
+    """
+    try:
+        return _export_products(db, path, progress)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _export_products(db, path, progress):
+    ext = os.path.splitext(path)[1].lower()
+    rows = db.iter_rows(EXPORT_QUERY, as_tuples=True)
+    count = 0
+    if ext == ".csv":
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(EXPORT_HEADER)
+            for row in rows:
+                writer.writerow(["" if value is None else value for value in row])
+                count += 1
+                if progress and count % EXPORT_PROGRESS == 0:
+                    progress(count)
+        return count
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Товары")
+    ws.append(EXPORT_HEADER)
+    for row in rows:
+        ws.append(list(row))
+        count += 1
+        if progress and count % EXPORT_PROGRESS == 0:
+            progress(count)
+    wb.save(path)
+    return count
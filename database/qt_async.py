@@ -0,0 +1,99 @@
+# database/qt_async.py
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from database.db import STREAM_CHUNK
+
+
+class QueryChannel(QObject):
+    """Канал фоновых запросов для виджета.
+
+    Результат доставляется в GUI-поток через сигнал. Каждый новый запрос
+    вытесняет предыдущий: незапущенный отменяется, а результат уже
+    выполняющегося отбрасывается.
+    """
+
+    _done = pyqtSignal(int, object, object)  # поколение, результат, ошибка
+    _chunk = pyqtSignal(int, object)  # поколение, порция строк
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._generation = 0
+        self._future = None
+        self._callbacks = None
+        self._on_chunk = None
+        self._done.connect(self._deliver)
+        self._chunk.connect(self._deliver_chunk)
+
+    def run(self, future, on_result, on_error=None):
+        generation = self._begin(on_result, on_error)
+        return self._attach(generation, future)
+
+    def stream(self, db, query, params, on_chunk, on_done=None, on_error=None,
+               chunk_size=STREAM_CHUNK, as_tuples=False):
+        """Потоковое чтение: порции строк приходят в on_chunk по мере чтения, затем вызывается on_done."""
+        generation = self._begin(on_done or (lambda _: None), on_error)
+        self._on_chunk = on_chunk
+
+        def work():
+            for chunk in db.iter_chunks(query, params, chunk_size, as_tuples):
+                # Запрос вытеснен более новым — прекращаем чтение
+                if generation != self._generation:
+                    break
+                self._emit(self._chunk, generation, chunk)
+
+        return self._attach(generation, db.submit(work))
+
+    def cancel(self):
+        self._generation += 1
+        if self._future is not None:
+            self._future.cancel()
+        self._future = None
+        self._callbacks = None
+        self._on_chunk = None
+
+    def is_busy(self):
+        # Занят до доставки результата в GUI-поток, а не только до завершения задачи
+        return self._callbacks is not None
+
+    def _begin(self, on_result, on_error):
+        self.cancel()
+        self._callbacks = (on_result, on_error)
+        return self._generation
+
+    def _attach(self, generation, future):
+        self._future = future
+        future.add_done_callback(lambda f: self._finished(generation, f))
+        return future
+
+    def _emit(self, signal, *args):
+        try:
+            signal.emit(*args)
+        except RuntimeError:
+            # Виджет уже удалён
+            pass
+
+    def _finished(self, generation, future):
+        # Вызывается в фоновом потоке
+        if future.cancelled():
+            return
+        error = future.exception()
+        result = None if error else future.result()
+        self._emit(self._done, generation, result, error)
+
+    def _deliver_chunk(self, generation, chunk):
+        if generation == self._generation and self._on_chunk is not None:
+            self._on_chunk(chunk)
+
+    def _deliver(self, generation, result, error):
+        if generation != self._generation or self._callbacks is None:
+            return
+        on_result, on_error = self._callbacks
+        self._future = None
+        self._callbacks = None
+        self._on_chunk = None
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(error)
+        else:
+            on_result(result)
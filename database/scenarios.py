@@ -0,0 +1,146 @@
+# database/scenarios.py
+# Сценарии цен: прибыль за месяц на сетке значений цены, себестоимости, объёма,
+# комиссии и налога. Формулы — те же, что у калькулятора (database/margins.py).
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+
+from database.margins import net_profit, to_kopecks, to_rate, format_kopecks, RATE_SCALE
+
+# Предел размера сетки: 5 млн ячеек int64 — 40 МБ на результат
+MAX_CELLS = 5_000_000
+# Сколько последних сеток держать в памяти
+GRID_CACHE = 4
+
+# Параметр -> (подпись, единица). Порядок задаёт порядок осей сетки
+PARAMETERS = {
+    "price": ("Цена", "₽"),
+    "cost": ("Себестоимость", "₽"),
+    "quantity": ("Кол-во в месяц", "шт."),
+    "bank_fee": ("Комиссия", "%"),
+    "nalog": ("Налог", "%"),
+}
+MONEY = ("price", "cost")
+RATES = ("bank_fee", "nalog")
+
+
+class ScenarioError(Exception):
+    pass
+
+
+# Диапазон параметра: steps значений от start до stop (Decimal, в рублях, штуках или процентах).
+# steps = 1 — параметр фиксирован и равен start
+Axis = namedtuple("Axis", "name start stop steps")
+
+
+def _to_units(name, value):
+    # Внутренние единицы: копейки, штуки, стотысячные доли
+    if name in MONEY:
+        return to_kopecks(value)
+    if name in RATES:
+        return to_rate(Decimal(value) / 100)
+    return int(value)
+
+
+def axis_values(axis):
+    """Значения оси во внутренних единицах (int64)."""
+    start, stop = _to_units(axis.name, axis.start), _to_units(axis.name, axis.stop)
+    if axis.steps == 1:
+        return np.array([start], dtype=np.int64)
+    return np.rint(np.linspace(start, stop, axis.steps)).astype(np.int64)
+
+
+def format_value(name, units):
+    if name in MONEY:
+        return f"{format_kopecks(units)} ₽"
+    if name in RATES:
+        return f"{units * 100 / RATE_SCALE:g} %"
+    return f"{int(units)} шт."
+
+
+def break_even_price(cost, other, bank_fee, nalog):
+    """Минимальная цена без убытка, копейки. Затраты — в рублях, ставки — доли."""
+    kept = RATE_SCALE - to_rate(bank_fee) - to_rate(nalog)
+    if kept <= 0:
+        return None
+    variable_cost = to_kopecks(cost) + to_kopecks(other)
+    return -(-variable_cost * RATE_SCALE // kept)  # с округлением вверх
+
+
+class Grid:
+    """Прибыль (копейки) на всех сочетаниях значений осей; массив только для чтения."""
+
+    def __init__(self, axes, other, values, profit):
+        self.axes = {axis.name: axis for axis in axes}
+        self.other = other
+        self.values = values  # параметр -> значения оси во внутренних единицах
+        self.profit = profit
+
+    @property
+    def size(self):
+        return self.profit.size
+
+    def plane(self, x, y, fixed=None):
+        """Срез 2D формы (len(y), len(x)); остальные оси — по индексам fixed (по умолчанию 0)."""
+        fixed = fixed or {}
+        names = list(PARAMETERS)
+        index = tuple(slice(None) if name in (x, y) else fixed.get(name, 0) for name in names)
+        plane = self.profit[index]
+        # После среза оси остаются в порядке PARAMETERS
+        if names.index(x) < names.index(y):
+            plane = plane.T
+        return plane
+
+    @staticmethod
+    def break_even(plane):
+        """Точки линии безубыточности среза: (x, y) в дробных индексах ячеек.
+
+        Смена знака прибыли между соседними ячейками по горизонтали и по вертикали,
+        место нуля — линейной интерполяцией.
+        """
+        profitable = plane >= 0
+        values = plane.astype(np.float64)
+        rows, columns = np.nonzero(profitable[:, 1:] != profitable[:, :-1])
+        left, right = values[rows, columns], values[rows, columns + 1]
+        xs = [columns + left / (left - right)]
+        ys = [rows.astype(np.float64)]
+        rows, columns = np.nonzero(profitable[1:, :] != profitable[:-1, :])
+        lower, upper = values[rows, columns], values[rows + 1, columns]
+        xs.append(columns.astype(np.float64))
+        ys.append(rows + lower / (lower - upper))
+        return np.concatenate(xs), np.concatenate(ys)
+
+
+@lru_cache(maxsize=GRID_CACHE)
+def sweep(axes, other):
+    """Сетка прибыли для сценария. axes — кортеж Axis в порядке PARAMETERS, other — прочие расходы, ₽.
+
+    Результат кэшируется по параметрам: повторный расчёт того же сценария мгновенный.
+    """
+    if tuple(axis.name for axis in axes) != tuple(PARAMETERS):
+        raise ScenarioError("Оси сценария должны идти в порядке " + ", ".join(PARAMETERS))
+    cells = 1
+    for axis in axes:
+        if axis.steps < 1:
+            raise ScenarioError(f"{PARAMETERS[axis.name][0]}: число шагов должно быть не меньше 1")
+        cells *= axis.steps
+    if cells > MAX_CELLS:
+        raise ScenarioError(f"Слишком большая сетка: {cells:,} ячеек, допустимо {MAX_CELLS:,}".replace(",", " "))
+
+    values = {axis.name: axis_values(axis) for axis in axes}
+    # Каждая ось — по своему измерению, сетка получается broadcasting-ом без копий
+    dims = len(axes)
+    shaped = {}
+    for position, name in enumerate(PARAMETERS):
+        shape = [1] * dims
+        shape[position] = -1
+        shaped[name] = values[name].reshape(shape)
+
+    profit = net_profit(shaped["price"], shaped["cost"], to_kopecks(other), shaped["quantity"],
+                        shaped["bank_fee"], shaped["nalog"])
+    profit.setflags(write=False)
+    for array in values.values():
+        array.setflags(write=False)
+    return Grid(axes, other, values, profit)
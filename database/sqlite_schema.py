@@ -0,0 +1,209 @@
+# database/sqlite_schema.py
+# Загрузка дампа MySQL (coffee_shop.sql) во встроенную базу SQLite
+import re
+
+_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+_COLUMN_RE = re.compile(r"^\s*`(\w+)`\s+(.+?),?\s*$")
+_ALTER_RE = re.compile(r"^ALTER\s+TABLE\s+`(\w+)`\s+(.*)$", re.IGNORECASE | re.DOTALL)
+_COLS_RE = re.compile(r"\(([^)]*)\)")
+
+
+def split_statements(sql):
+    """Делит скрипт на отдельные запросы с учётом строк, комментариев и блоков DELIMITER."""
+    sql = re.sub(r"^DELIMITER\s+\$\$.*?^DELIMITER\s*;\s*$", "", sql, flags=re.MULTILINE | re.DOTALL)
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if quote:
+            current.append(ch)
+            if ch == "\\" and quote != "`":
+                current.append(sql[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+            current.append(ch)
+        elif sql.startswith("--", i) or ch == "#":
+            i = sql.find("\n", i)
+            if i == -1:
+                break
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i)
+            i = n if end == -1 else end + 2
+            continue
+        elif ch == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    tail = "".join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def convert_literals(statement):
+    """Строки с экранированием MySQL и шестнадцатеричные 0x... переводит в синтаксис SQLite."""
+    out = []
+    i = 0
+    n = len(statement)
+    while i < n:
+        ch = statement[i]
+        if ch == "'":
+            i += 1
+            value = []
+            while i < n:
+                c = statement[i]
+                if c == "\\":
+                    nxt = statement[i + 1]
+                    value.append(_ESCAPES.get(nxt, nxt))
+                    i += 2
+                    continue
+                if c == "'":
+                    if i + 1 < n and statement[i + 1] == "'":
+                        value.append("'")
+                        i += 2
+                        continue
+                    break
+                value.append(c)
+                i += 1
+            out.append("'" + "".join(value).replace("'", "''") + "'")
+            i += 1
+        elif statement.startswith("0x", i) and (i == 0 or not (statement[i - 1].isalnum() or statement[i - 1] == "_")):
+            j = i + 2
+            while j < n and statement[j] in "0123456789abcdefABCDEF":
+                j += 1
+            out.append("X'" + statement[i + 2:j] + "'")
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def _column_names(text):
+    return [c.strip().strip("`") for c in text.split(",")]
+
+
+def _clean_type(definition):
+    definition = re.sub(r"\s+COLLATE\s+\w+", "", definition, flags=re.IGNORECASE)
+    definition = re.sub(r"\s+CHARACTER\s+SET\s+\w+", "", definition, flags=re.IGNORECASE)
+    definition = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP(\(\d*\))?", "", definition, flags=re.IGNORECASE)
+    definition = re.sub(r"\s+(unsigned|AUTO_INCREMENT)\b", "", definition, flags=re.IGNORECASE)
+    # Сравнение строк без учёта регистра, как у utf8mb4_unicode_ci
+    if re.match(r"(var)?char|(tiny|medium|long)?text", definition, re.IGNORECASE):
+        type_name, _, rest = definition.partition(" ")
+        definition = f"{type_name} COLLATE NOCASE {rest}".strip()
+    return definition.strip()
+
+
+class _Table:
+    def __init__(self, name):
+        self.name = name
+        self.columns = []
+        self.primary_key = []
+        self.indexes = []  # (имя, столбцы, уникальный)
+        self.foreign_keys = []  # текст ограничения
+
+    def create_sql(self):
+        lines = []
+        single_pk = self.primary_key[0] if len(self.primary_key) == 1 else None
+        for name, definition in self.columns:
+            if name == single_pk and definition.lower().startswith(("int", "bigint", "smallint", "tinyint")):
+                lines.append(f'"{name}" INTEGER PRIMARY KEY AUTOINCREMENT')
+            else:
+                lines.append(f'"{name}" {definition}')
+        if len(self.primary_key) > 1:
+            lines.append("PRIMARY KEY (" + ", ".join(f'"{c}"' for c in self.primary_key) + ")")
+        lines.extend(self.foreign_keys)
+        return f'CREATE TABLE "{self.name}" (\n  ' + ",\n  ".join(lines) + "\n)"
+
+    def index_sql(self):
+        for name, columns, unique in self.indexes:
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cols = ", ".join(f'"{c}"' for c in columns)
+            yield f'CREATE {kind} "{self.name}_{name}" ON "{self.name}" ({cols})'
+
+
+def _parse_create(statement):
+    name = re.search(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`(\w+)`", statement, re.IGNORECASE).group(1)
+    table = _Table(name)
+    body = statement[statement.index("(") + 1:statement.rindex(")")]
+    for line in body.splitlines():
+        match = _COLUMN_RE.match(line)
+        if match:
+            table.columns.append((match.group(1), _clean_type(match.group(2))))
+            continue
+        line = line.strip().rstrip(",")
+        upper = line.upper()
+        if upper.startswith("PRIMARY KEY"):
+            table.primary_key = _column_names(_COLS_RE.search(line).group(1))
+        elif upper.startswith(("UNIQUE KEY", "KEY", "INDEX")):
+            index_name = re.search(r"`(\w+)`", line).group(1)
+            table.indexes.append((index_name, _column_names(_COLS_RE.search(line).group(1)), upper.startswith("UNIQUE")))
+    return table
+
+
+def _apply_alter(table, clauses):
+    # Предложения ALTER TABLE разделены запятыми на верхнем уровне
+    for clause in re.split(r",\s*\n\s*", clauses.strip()):
+        clause = clause.strip().rstrip(",")
+        upper = clause.upper()
+        if upper.startswith("ADD PRIMARY KEY"):
+            table.primary_key = _column_names(_COLS_RE.search(clause).group(1))
+        elif upper.startswith(("ADD UNIQUE KEY", "ADD KEY", "ADD INDEX")):
+            index_name = re.search(r"`(\w+)`", clause).group(1)
+            table.indexes.append((index_name, _column_names(_COLS_RE.search(clause).group(1)), "UNIQUE" in upper))
+        elif upper.startswith("ADD CONSTRAINT") and "FOREIGN KEY" in upper:
+            fk = clause[upper.index("FOREIGN KEY"):].replace("`", '"')
+            table.foreign_keys.append(fk)
+        # MODIFY ... AUTO_INCREMENT: в SQLite автоинкремент задан у первичного ключа
+
+
+def load_mysql_dump(connection, path):
+    """Создаёт в connection (sqlite3) схему и данные из дампа phpMyAdmin/mysqldump."""
+    with open(path, encoding="utf-8") as f:
+        statements = split_statements(f.read())
+
+    tables = {}
+    inserts = []
+    for statement in statements:
+        upper = statement[:20].upper()
+        if upper.startswith("CREATE TABLE"):
+            table = _parse_create(statement)
+            tables[table.name] = table
+        elif upper.startswith("INSERT"):
+            inserts.append(convert_literals(statement))
+        elif upper.startswith("ALTER TABLE"):
+            match = _ALTER_RE.match(statement)
+            if match and match.group(1) in tables:
+                _apply_alter(tables[match.group(1)], match.group(2))
+        # SET, START TRANSACTION, COMMIT и процедуры к SQLite не относятся
+
+    connection.execute("PRAGMA foreign_keys = OFF")
+    connection.execute("BEGIN")
+    try:
+        for table in tables.values():
+            connection.execute(table.create_sql())
+        for statement in inserts:
+            connection.execute(statement)
+        for table in tables.values():
+            for sql in table.index_sql():
+                connection.execute(sql)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.execute("PRAGMA foreign_keys = ON")
@@ -0,0 +1,229 @@
+# database/stats.py
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Порог медленного запроса, мс (переопределяется переменной окружения)
+SLOW_QUERY_MS = float(os.environ.get("COFFEE_SLOW_QUERY_MS", 200))
+SLOW_LOG_PATH = os.environ.get("COFFEE_SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+
+# Сколько последних замеров хранить на запрос для перцентилей
+WINDOW = 500
+
+_DB_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_MODULES = ("concurrent", "threading", "contextlib")
+
+_local = threading.local()
+
+
+def normalize(query):
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def caller():
+    """Первый кадр стека вне пакета database: модуль и функция, откуда пришёл запрос."""
+    override = getattr(_local, "caller", None)
+    if override:
+        return override
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        module = frame.f_globals.get("__name__", "")
+        if not filename.startswith(_DB_PACKAGE_DIR) and not module.startswith(_SKIP_MODULES):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+@contextmanager
+def attributed(name):
+    # Для фоновых запросов: автором считается код, поставивший запрос в очередь
+    previous = getattr(_local, "caller", None)
+    _local.caller = name
+    try:
+        yield
+    finally:
+        _local.caller = previous
+
+
+def result_size(result):
+    if result is None:
+        return 0, 0
+    rows = result if isinstance(result, (list, tuple)) else [result]
+    if rows and not isinstance(rows[0], (dict, list, tuple)):
+        return 0, 0
+
+    total = 0
+    for row in rows:
+        values = row.values() if isinstance(row, dict) else row
+        for value in values:
+            if isinstance(value, (bytes, bytearray, str)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return len(rows), total
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class QueryStat:
+    def __init__(self, query):
+        self.query = query
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.durations = deque(maxlen=WINDOW)
+        self.callers = Counter()
+
+    def add(self, duration_ms, rows, size, source):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += rows
+        self.bytes += size
+        self.durations.append(duration_ms)
+        self.callers[source] += 1
+
+    def summary(self):
+        values = sorted(self.durations)
+        return {
+            "query": self.query,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(percentile(values, 0.50), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+            "p99_ms": round(percentile(values, 0.99), 2),
+            "max_ms": round(self.max_ms, 2),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "callers": dict(self.callers.most_common(5)),
+        }
+
+
+class QueryStats:
+    """Статистика запросов в памяти и журнал медленных запросов."""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_path=SLOW_LOG_PATH):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def record(self, kind, query, duration_ms, result, source):
+        rows, size = result_size(result)
+        self.record_counts(kind, query, duration_ms, rows, size, source)
+
+    def record_counts(self, kind, query, duration_ms, rows, size, source):
+        key = normalize(query)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = QueryStat(key)
+            stat.add(duration_ms, rows, size, source)
+
+        if duration_ms >= self.slow_ms:
+            self._log_slow({
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "kind": kind,
+                "ms": round(duration_ms, 2),
+                "rows": rows,
+                "bytes": size,
+                "caller": source,
+                "query": key,
+            })
+
+    def _log_slow(self, entry):
+        if self._logger is None:
+            self._logger = logging.getLogger("coffee_shop.slow_queries")
+            self._logger.propagate = False
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                handler = logging.FileHandler(self.log_path, encoding="utf-8")
+            except OSError:
+                handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+            self._logger.setLevel(logging.INFO)
+        self._logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def top(self, limit=20, key="total_ms"):
+        with self._lock:
+            summaries = [stat.summary() for stat in self._stats.values()]
+        summaries.sort(key=lambda s: s[key], reverse=True)
+        return summaries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def dump(self, limit=20):
+        lines = []
+        for s in self.top(limit):
+            lines.append(
+                f"{s['total_ms']:>10.1f} мс всего | {s['count']:>5} раз | p50 {s['p50_ms']:.1f} "
+                f"p95 {s['p95_ms']:.1f} p99 {s['p99_ms']:.1f} | {s['rows']} строк, {s['bytes']} байт"
+            )
+            lines.append(f"    {s['query'][:160]}")
+            lines.append(f"    вызовы: {', '.join(f'{k} ×{v}' for k, v in s['callers'].items())}")
+        return "\n".join(lines)
+
+
+query_stats = QueryStats()
+
+
+@contextmanager
+def timed(kind, query):
+    """Засекает время запроса; в блок передаётся словарь, куда кладётся результат."""
+    source = caller()
+    holder = {"result": None}
+    start = time.perf_counter()
+    try:
+        yield holder
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        query_stats.record(kind, query, duration_ms, holder["result"], source)
+
+
+def summarize_log(path=SLOW_LOG_PATH, limit=20):
+    # Сводка по журналу медленных запросов: самые тяжёлые по суммарному времени
+    totals = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            item = totals.setdefault(entry["query"], {"count": 0, "ms": 0.0, "max": 0.0, "callers": Counter()})
+            item["count"] += 1
+            item["ms"] += entry["ms"]
+            item["max"] = max(item["max"], entry["ms"])
+            item["callers"][entry["caller"]] += 1
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1]["ms"], reverse=True)[:limit]
+    lines = []
+    for query, item in ranked:
+        lines.append(f"{item['ms']:>10.1f} мс | {item['count']:>5} раз | макс {item['max']:.1f} мс")
+        lines.append(f"    {query[:160]}")
+        lines.append(f"    вызовы: {', '.join(f'{k} ×{v}' for k, v in item['callers'].most_common(5))}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m database.stats [путь к журналу]
+    print(summarize_log(sys.argv[1] if len(sys.argv) > 1 else SLOW_LOG_PATH))
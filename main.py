@@ -1,14 +1,21 @@
 import sys
-from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget, QDialog, QLabel, QProgressBar, QVBoxLayout, QWidget
-from PyQt6.QtGui import QIcon
+from PyQt6.QtWidgets import QApplication, QMainWindow, QTabWidget, QDialog, QLabel, QProgressBar, QVBoxLayout, QWidget, QMessageBox
+from PyQt6.QtGui import QIcon, QShortcut, QKeySequence
 from PyQt6.QtCore import Qt, QTimer
 
 from auth import AuthDialog
+from database.db import Database, close_all
+from database.history import flush_all
+from database.jobs import job_runner, shutdown_jobs
+from database.changes import purge_changes
+from database.migrations import migrate
+from database.payroll_rollup import VERIFY_AT_STARTUP, check_at_startup
 
 from ui.tab_products import ProductTab
 from ui.tab_calculator import CalculatorTab
 from ui.tab_employees import EmployeeTab
 from ui.tab_settings import SettingsTab
+from ui.job_panel import JobPanel
 
 
 class MainWindow(QMainWindow):
@@ -23,8 +30,22 @@ class MainWindow(QMainWindow):
         tabs.addTab(CalculatorTab(), "💰 Калькулятор")
         tabs.addTab(EmployeeTab(), "👨‍💼 Сотрудники")
         tabs.addTab(SettingsTab(user_id=user_id), "⚙️ Настройки")  # <-- передаём user_id
-        self.setCentralWidget(tabs)
 
+        # Под вкладками — фоновые задачи (экспорт, импорт, отчёты) с прогрессом и отменой
+        central = QWidget()
+        central_layout = QVBoxLayout(central)
+        central_layout.setContentsMargins(0, 0, 0, 0)
+        central_layout.addWidget(tabs, 1)
+        central_layout.addWidget(JobPanel(job_runner()))
+        self.setCentralWidget(central)
+
+        # Диагностика запросов к БД
+        diagnostics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        diagnostics_shortcut.activated.connect(self.open_diagnostics)
+
+    def open_diagnostics(self):
+        from ui.dialogs.diagnostics_dialog import DiagnosticsDialog
+        DiagnosticsDialog(self).exec()
 
 
 class SplashScreen(QWidget):
@@ -52,6 +73,10 @@ class SplashScreen(QWidget):
 
 def main():
     app = QApplication(sys.argv)
+    # Фоновые задачи отменяются, буфер истории расчётов дописывается — до закрытия соединений
+    app.aboutToQuit.connect(shutdown_jobs)
+    app.aboutToQuit.connect(flush_all)
+    app.aboutToQuit.connect(close_all)
 
     try:
         with open("assets/style.css", "r", encoding="utf-8") as f:
@@ -59,6 +84,32 @@ def main():
     except FileNotFoundError:
         print("⚠️ Файл стилей не найден: assets/style.css")
 
+    # Обновление схемы БД до актуальной версии. Код вкладок рассчитывает на новую схему
+    # (photo_hash, row_changes, payroll_daily), поэтому со старой не запускаемся
+    try:
+        migrate(Database())
+    except Exception as e:
+        print(f"⚠️ Миграции схемы не применены: {e}")
+        QMessageBox.critical(None, "Ошибка базы данных",
+                             f"Не удалось обновить схему базы данных:\n{e}\n\n"
+                             f"Приложение будет закрыто. Исправьте причину и запустите его снова "
+                             f"или примените миграции командой: python -m database.migrations")
+        sys.exit(1)
+
+    # Журнал изменений: старые записи уже прочитаны всеми клиентами
+    try:
+        deleted = purge_changes(Database())
+        if deleted:
+            print(f"[DB] Из журнала изменений удалено устаревших записей: {deleted}")
+    except Exception as e:
+        print(f"⚠️ Журнал изменений не очищен: {e}")
+
+    # Итоги зарплаты ведёт только приложение; правки смен в обход него видны при сверке.
+    # Сверка читает все смены, поэтому при запуске — только если включена (COFFEE_VERIFY_PAYROLL=1)
+    if VERIFY_AT_STARTUP:
+        db = Database()
+        db.submit(check_at_startup, db)
+
     auth_dialog = AuthDialog()
     if auth_dialog.exec() != QDialog.DialogCode.Accepted:
         sys.exit(0)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db as db_module  # noqa: E402
+from database.db import Database  # noqa: E402
+from database.migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Новая база SQLite из дампа coffee_shop.sql со всеми миграциями."""
+    database = Database(backend="sqlite", path=str(tmp_path / "coffee_shop.db"))
+    migrate(database, log=lambda message: None)
+    yield database
+    with db_module._pools_lock:
+        db_module._pools.pop(database.backend.key(), None)
+    database.pool.close()
+
+
+@pytest.fixture
+def employee_ids(db):
+    return [row['id'] for row in db.fetch_all("SELECT id FROM employees ORDER BY id")]
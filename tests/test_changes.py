@@ -0,0 +1,56 @@
+from database.changes import ChangeReader, latest_version, purge_changes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def log_change(db, version, row_id, table="products", op="U"):
+    db.execute("INSERT INTO row_changes (version, table_name, row_id, op) VALUES (%s, %s, %s, %s)",
+               (version, table, row_id, op))
+
+
+def test_reader_picks_up_late_commits(db):
+    start = latest_version(db)
+    reader = ChangeReader(start)
+    # Транзакция с версией start + 1 ещё не закоммичена, а start + 2 уже видна
+    log_change(db, start + 2, 2)
+    assert reader.read(db) == {"products": {2: "U"}}
+    assert list(reader.gaps) == [start + 1]
+    log_change(db, start + 1, 1, op="D")
+    assert reader.read(db) == {"products": {1: "D"}}
+    assert reader.gaps == {}
+    assert reader.read(db) == {}
+
+
+def test_reader_filters_tables_and_forgets_old_gaps(db):
+    clock = Clock()
+    start = latest_version(db)
+    reader = ChangeReader(start, gap_timeout=60, clock=clock)
+    log_change(db, start + 2, 5, table="units")
+    log_change(db, start + 3, 7)
+    assert reader.read(db, {"products"}) == {"products": {7: "U"}}
+    assert list(reader.gaps) == [start + 1]
+    # Номер откатанной транзакции не появится: через gap_timeout его больше не ждём
+    clock.now = 61
+    assert reader.read(db, {"products"}) == {}
+    assert reader.gaps == {}
+
+
+def test_reader_reports_purged_changes(db):
+    log_change(db, latest_version(db) + 1, 1)
+    start = latest_version(db)
+    reader = ChangeReader(start)
+    for offset in range(1, 4):
+        log_change(db, start + offset, offset)
+    db.execute("UPDATE row_changes SET changed_at = '2000-01-01 00:00:00'")
+    assert purge_changes(db) > 0
+    # Записи start + 1, start + 2 удалены до того, как клиент их прочитал
+    assert reader.read(db) is None
+    assert reader.read(db) == {}
+    log_change(db, start + 4, 9)
+    assert reader.read(db) == {"products": {9: "U"}}
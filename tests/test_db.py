@@ -0,0 +1,97 @@
+import pytest
+
+
+def position_names(db, first_id=1000):
+    rows = db.fetch_all("SELECT id, name FROM positions WHERE id >= %s ORDER BY id", (first_id,))
+    return {row['id']: row['name'] for row in rows}
+
+
+def test_transaction_commits(db):
+    with db.transaction():
+        db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1000, "Бариста"))
+        assert db.in_transaction()
+    assert not db.in_transaction()
+    assert position_names(db) == {1000: "Бариста"}
+
+
+def test_transaction_rolls_back_on_error(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1000, "Бариста"))
+            raise RuntimeError
+    assert position_names(db) == {}
+
+
+def test_nested_transaction_is_savepoint(db):
+    with db.transaction():
+        db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1000, "Бариста"))
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1001, "Повар"))
+                raise RuntimeError
+        with db.transaction():
+            db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1002, "Кассир"))
+    assert position_names(db) == {1000: "Бариста", 1002: "Кассир"}
+
+
+def test_outer_rollback_discards_released_savepoint(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            with db.transaction():
+                db.execute("INSERT INTO positions (id, name) VALUES (%s, %s)", (1000, "Бариста"))
+            raise RuntimeError
+    assert position_names(db) == {}
+
+
+def test_insert_many_splits_by_row_count(db):
+    rows = [(1000 + i, f"Должность {i}") for i in range(25)]
+    affected = db.insert_many("positions", ("id", "name"), rows, batch_rows=4)
+    assert affected == 25
+    assert position_names(db) == dict(rows)
+
+
+def test_insert_many_splits_by_statement_length(db):
+    # Предел длины запроса в несколько строк: каждая пачка — отдельный INSERT
+    db.pool.max_packet = 300
+    rows = [(1000 + i, "Должность с длинным названием номер %d" % i) for i in range(40)]
+    assert db.insert_many("positions", ("id", "name"), rows) == 40
+    assert position_names(db) == dict(rows)
+
+
+def test_insert_many_upsert(db):
+    db.insert_many("positions", ("id", "name"), [(1000, "Бариста"), (1001, "Повар")])
+    db.insert_many("positions", ("id", "name"), [(1001, "Шеф-повар"), (1002, "Кассир")],
+                   update_columns=("name",))
+    assert position_names(db) == {1000: "Бариста", 1001: "Шеф-повар", 1002: "Кассир"}
+
+
+def test_insert_many_is_atomic(db):
+    rows = [(1000, "Бариста"), (1001, "Повар"), (1000, "Повтор ключа")]
+    with pytest.raises(db.backend.errors):
+        db.insert_many("positions", ("id", "name"), rows, batch_rows=1)
+    assert position_names(db) == {}
+
+
+def test_fetch_page_ignores_where_in_subquery(db):
+    db.insert_many("positions", ("id", "name"), [(1000 + i, f"Должность {i % 3}") for i in range(30)])
+    query = ("SELECT p.id FROM positions p "
+             "JOIN (SELECT id FROM positions WHERE id >= 1000) d ON d.id = p.id")
+    seen = []
+    rows, after = db.fetch_page(query, ("p.id",), limit=7)
+    while True:
+        seen.extend(row['id'] for row in rows)
+        if after is None:
+            break
+        rows, after = db.fetch_page(query, ("p.id",), after, limit=7)
+    assert seen == list(range(1000, 1030))
+
+
+def test_fetch_page_keeps_or_inside_filter(db):
+    db.insert_many("positions", ("id", "name"), [(1000 + i, f"Должность {i % 3}") for i in range(30)])
+    query = "SELECT p.id, p.name FROM positions p WHERE p.name = %s OR p.name = %s"
+    params = ("Должность 0", "Должность 1")
+    first, after = db.fetch_page(query, ("p.id",), limit=5, params=params)
+    rest, last = db.fetch_page(query, ("p.id",), after, limit=100, params=params)
+    ids = [row['id'] for row in first + rest]
+    assert last is None
+    assert ids == [1000 + i for i in range(30) if i % 3 != 2]
@@ -0,0 +1,64 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("COFFEE_POLL_INTERVAL", "0")
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from database.payroll_rollup import rebuild, verify  # noqa: E402
+from ui import manage_shifts_dialog  # noqa: E402
+from ui.manage_shifts_dialog import ManageShiftsDialog  # noqa: E402
+
+from test_payroll_rollup import add_shift, rollup_rows  # noqa: E402
+
+# Одно приложение на все тесты: шина изменений живёт дольше диалога
+app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def dialog(db, employee_ids, monkeypatch):
+    messages = []
+    for kind in ("information", "warning", "critical"):
+        monkeypatch.setattr(QtWidgets.QMessageBox, kind,
+                            lambda parent, title, text, kind=kind: messages.append((kind, text)))
+    dialog = ManageShiftsDialog(db=db, employees={employee_id: str(employee_id) for employee_id in employee_ids})
+    dialog.messages = messages
+    yield dialog
+    dialog.deleteLater()
+    app.processEvents()
+
+
+class FakeEditDialog:
+    data = None
+
+    def __init__(self, parent=None, shift_data=None, employees=None):
+        pass
+
+    def exec(self):
+        return True
+
+    def get_data(self):
+        return self.data
+
+
+def test_edit_to_duplicate_shift_shows_error(db, employee_ids, dialog, monkeypatch):
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    add_shift(db, employee_ids[0], date(2024, 3, 3))
+    shift_id = add_shift(db, employee_ids[1], date(2024, 3, 3))
+    rollups = rollup_rows(db)
+    monkeypatch.setattr(dialog, "get_selected_shift", lambda: {"id": shift_id})
+    monkeypatch.setattr(FakeEditDialog, "data", (employee_ids[0], "10:00:00", "18:00:00", 150.0))
+    monkeypatch.setattr(manage_shifts_dialog, "EditShiftDialog", FakeEditDialog)
+
+    # Второй сотрудник переносится на день, где у первого уже есть смена: уникальный ключ
+    dialog.edit_selected()
+
+    assert [kind for kind, text in dialog.messages] == ["warning"]
+    row = db.fetch_one("SELECT employee_id, shift_salary FROM shifts WHERE id = %s", (shift_id,))
+    assert (row['employee_id'], Decimal(str(row['shift_salary']))) == (employee_ids[1], Decimal("1200"))
+    assert rollup_rows(db) == rollups
+    assert verify(db) == []
@@ -0,0 +1,80 @@
+import random
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from database.margins import MarginTable, compute, format_kopecks, round_div, to_kopecks, to_rate  # noqa: E402
+
+CENTS = Decimal("0.01")
+
+
+def decimal_profit(price, cost, other, quantity, bank_fee, nalog):
+    # Расчёт калькулятора до перехода на копейки
+    revenue = price * quantity
+    total_cost = (cost + other) * quantity + revenue * (bank_fee + nalog)
+    net_profit = revenue - total_cost
+    margin = net_profit / revenue * 100 if revenue > 0 else None
+    return revenue, net_profit, margin
+
+
+def random_money(rng, high):
+    return Decimal(rng.randint(0, high * 100)) / 100
+
+
+def test_round_div_is_bankers_rounding():
+    values = np.array([5, 15, 25, -5, -15, 14, 16, 0], dtype=np.int64)
+    expected = [int((Decimal(int(v)) / 10).to_integral_value(ROUND_HALF_EVEN)) for v in values]
+    assert round_div(values, 10).tolist() == expected
+
+
+def test_compute_matches_decimal_path():
+    rng = random.Random(20240501)
+    rows = []
+    for _ in range(2000):
+        rows.append((
+            random_money(rng, 900),
+            random_money(rng, 600),
+            random_money(rng, 100),
+            rng.randint(0, 5000),
+            Decimal(rng.randint(0, 5000)) / 100_000,
+            Decimal(rng.randint(0, 20000)) / 100_000,
+        ))
+    for bank_fee, nalog in {(row[4], row[5]) for row in rows[:20]}:
+        margins = compute(
+            [to_kopecks(r[0]) for r in rows], [to_kopecks(r[1]) for r in rows],
+            [to_kopecks(r[2]) for r in rows], [r[3] for r in rows],
+            to_rate(bank_fee), to_rate(nalog),
+        )
+        for i, (price, cost, other, quantity, _, _) in enumerate(rows):
+            revenue, net_profit, margin = decimal_profit(price, cost, other, quantity, bank_fee, nalog)
+            assert format_kopecks(margins.revenue[i]) == f"{revenue:.2f}"
+            assert format_kopecks(margins.net_profit[i]) == f"{net_profit.quantize(CENTS, ROUND_HALF_EVEN):.2f}"
+            if margin is None:
+                assert np.isnan(margins.margin[i])
+            else:
+                # Decimal выводит «-0.0» для малых убытков; по значению это тот же 0.0
+                assert Decimal(f"{margins.margin[i]:.1f}") == Decimal(f"{margin:.1f}")
+
+
+def test_compute_without_revenue():
+    margins = compute([0, 1000], [500, 500], [0, 0], [10, 0], 1500, 6000)
+    assert np.isnan(margins.margin).all()
+    assert margins.net_profit.tolist() == [-5000, 0]
+
+
+def test_margin_table_treats_missing_plan_as_zero():
+    table = MarginTable([
+        {"id": 1, "name": "Латте", "price": Decimal("250.00"), "cost_price": Decimal("80.50"),
+         "other_expenses": Decimal("10.00"), "monthly_quantity": 300},
+        {"id": 2, "name": "Чай", "price": None, "cost_price": None,
+         "other_expenses": None, "monthly_quantity": None},
+    ])
+    margins = table.compute(Decimal("0.015"), "0.06")
+    assert table.planned.tolist() == [True, False]
+    revenue, net_profit, _ = decimal_profit(Decimal("250.00"), Decimal("80.50"), Decimal("10.00"), 300,
+                                            Decimal("0.015"), Decimal("0.06"))
+    assert format_kopecks(margins.revenue[0]) == f"{revenue:.2f}"
+    assert format_kopecks(margins.net_profit[0]) == f"{net_profit.quantize(CENTS, ROUND_HALF_EVEN):.2f}"
+    assert margins.revenue[1] == 0 and margins.net_profit[1] == 0
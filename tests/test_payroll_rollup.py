@@ -0,0 +1,189 @@
+import random
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from database.payroll_rollup import (
+    apply_shift_change, fetch_shift, payroll_summary, rebuild, shift_hours, split_period, verify,
+)
+
+RAW_SUMMARY = """
+    SELECT employee_id, COUNT(*) AS shift_count, SUM(shift_salary) AS salary
+    FROM shifts WHERE shift_date BETWEEN %s AND %s
+    GROUP BY employee_id
+"""
+
+
+@pytest.mark.parametrize("start, end, months, days", [
+    # Целые месяцы
+    (date(2024, 1, 1), date(2024, 3, 31), (date(2024, 1, 1), date(2024, 3, 1)), []),
+    # Февраль високосного и обычного года
+    (date(2024, 2, 1), date(2024, 2, 29), (date(2024, 2, 1), date(2024, 2, 1)), []),
+    (date(2023, 2, 1), date(2023, 2, 28), (date(2023, 2, 1), date(2023, 2, 1)), []),
+    (date(2024, 2, 1), date(2024, 2, 28), None, [(date(2024, 2, 1), date(2024, 2, 28))]),
+    # Хвосты с обеих сторон
+    (date(2024, 1, 15), date(2024, 4, 10), (date(2024, 2, 1), date(2024, 3, 1)),
+     [(date(2024, 1, 15), date(2024, 1, 31)), (date(2024, 4, 1), date(2024, 4, 10))]),
+    # Через Новый год
+    (date(2023, 12, 31), date(2024, 2, 1), (date(2024, 1, 1), date(2024, 1, 1)),
+     [(date(2023, 12, 31), date(2023, 12, 31)), (date(2024, 2, 1), date(2024, 2, 1))]),
+    # Внутри одного месяца и соседние месяцы без целого между ними
+    (date(2024, 5, 3), date(2024, 5, 3), None, [(date(2024, 5, 3), date(2024, 5, 3))]),
+    (date(2024, 5, 20), date(2024, 6, 10), None, [(date(2024, 5, 20), date(2024, 6, 10))]),
+    (date(2024, 5, 1), date(2024, 6, 10), (date(2024, 5, 1), date(2024, 5, 1)),
+     [(date(2024, 6, 1), date(2024, 6, 10))]),
+])
+def test_split_period(start, end, months, days):
+    assert split_period(start, end) == (months, days)
+
+
+def day_range(first, last):
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def test_split_period_covers_every_day_once():
+    rng = random.Random(7)
+    for _ in range(500):
+        start = date(2023, 1, 1) + timedelta(days=rng.randint(0, 700))
+        end = start + timedelta(days=rng.randint(0, 400))
+        months, days = split_period(start, end)
+        covered = [day for first, last in days for day in day_range(first, last)]
+        if months is not None:
+            month = months[0]
+            while month <= months[1]:
+                covered.extend(day_range(month, month.replace(day=monthrange(month.year, month.month)[1])))
+                month = (month + timedelta(days=32)).replace(day=1)
+        assert sorted(covered) == day_range(start, end)
+
+
+def test_shift_hours_rounds_like_sql():
+    assert shift_hours("09:00:00", "17:30:00") == Decimal("8.50")
+    assert shift_hours(timedelta(hours=8), timedelta(hours=12, minutes=20)) == Decimal("4.33")
+    assert shift_hours("08:00:00", "08:00:30") == Decimal("0.01")
+
+
+# === Итоги на SQLite ===
+
+def add_shift(db, employee_id, day, start="09:00:00", end="17:00:00", salary=Decimal("1200.00")):
+    with db.transaction():
+        shift_id = db.insert_and_get_id(
+            "INSERT INTO shifts (employee_id, shift_date, shift_start, shift_end, shift_salary) "
+            "VALUES (%s, %s, %s, %s, %s)", (employee_id, day, start, end, salary)
+        )
+        apply_shift_change(db, new=fetch_shift(db, shift_id))
+    return shift_id
+
+
+def update_shift(db, shift_id, employee_id, start, end, salary):
+    with db.transaction():
+        old = fetch_shift(db, shift_id)
+        db.execute("UPDATE shifts SET employee_id = %s, shift_start = %s, shift_end = %s, shift_salary = %s "
+                   "WHERE id = %s", (employee_id, start, end, salary, shift_id))
+        apply_shift_change(db, old, fetch_shift(db, shift_id))
+
+
+def delete_shift(db, shift_id):
+    with db.transaction():
+        old = fetch_shift(db, shift_id)
+        db.execute("DELETE FROM shifts WHERE id = %s", (shift_id,))
+        apply_shift_change(db, old)
+
+
+def rollup_rows(db):
+    rows = {}
+    for table, column in (("payroll_daily", "day"), ("payroll_monthly", "month")):
+        for row in db.fetch_all(f"SELECT employee_id, {column} AS bucket, shift_count, hours, salary FROM {table}"):
+            rows[(table, row['employee_id'], str(row['bucket']))] = (
+                row['shift_count'], Decimal(str(row['hours'])).quantize(Decimal("0.01")),
+                Decimal(str(row['salary'])).quantize(Decimal("0.01")),
+            )
+    return rows
+
+
+def test_incremental_changes_match_rebuild(db, employee_ids):
+    rng = random.Random(25)
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    shifts = {}
+    days = [date(2024, 1, 25) + timedelta(days=n) for n in range(20)]
+    for _ in range(60):
+        employee_id, day = rng.choice(employee_ids), rng.choice(days)
+        if (employee_id, day) not in shifts.values():
+            start = f"{rng.randint(6, 11):02d}:{rng.choice((0, 15, 20, 45)):02d}:00"
+            end = f"{rng.randint(13, 22):02d}:{rng.choice((0, 10, 30)):02d}:00"
+            shifts[add_shift(db, employee_id, day, start, end, Decimal(rng.randint(50000, 300000)) / 100)] = (
+                employee_id, day)
+    for shift_id in rng.sample(sorted(shifts), 15):
+        employee_id, day = shifts[shift_id]
+        other = rng.choice(employee_ids)
+        if (other, day) in shifts.values():
+            other = employee_id
+        update_shift(db, shift_id, other, "10:00:00", "18:45:00", Decimal("1575.50"))
+        shifts[shift_id] = (other, day)
+    for shift_id in rng.sample(sorted(shifts), 10):
+        delete_shift(db, shift_id)
+        del shifts[shift_id]
+
+    assert verify(db) == []
+    incremental = rollup_rows(db)
+    rebuild(db)
+    assert rollup_rows(db) == incremental
+
+
+def test_deleting_last_shift_removes_buckets(db, employee_ids):
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    shift_id = add_shift(db, employee_ids[0], date(2024, 3, 3))
+    assert len(rollup_rows(db)) == 2
+    delete_shift(db, shift_id)
+    assert rollup_rows(db) == {}
+
+
+def test_failed_write_leaves_rollups_untouched(db, employee_ids):
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    shift_id = add_shift(db, employee_ids[0], date(2024, 3, 3))
+    before = rollup_rows(db)
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            old = fetch_shift(db, shift_id)
+            db.execute("DELETE FROM shifts WHERE id = %s", (shift_id,))
+            apply_shift_change(db, old)
+            raise RuntimeError
+    assert rollup_rows(db) == before
+    assert verify(db) == []
+
+
+def test_verify_reports_drift(db, employee_ids):
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    add_shift(db, employee_ids[0], date(2024, 3, 3))
+    # Правка в обход приложения
+    db.execute("UPDATE shifts SET shift_salary = shift_salary + 1")
+    assert [mismatch[0] for mismatch in verify(db)] == ["payroll_daily"]
+    rebuild(db)
+    assert verify(db) == []
+
+
+def test_summary_matches_raw_aggregate(db, employee_ids):
+    rng = random.Random(3)
+    db.execute("DELETE FROM shifts")
+    rebuild(db)
+    for employee_id in employee_ids:
+        day = date(2023, 11, 1)
+        while day < date(2024, 5, 1):
+            if rng.random() < 0.4:
+                add_shift(db, employee_id, day, salary=Decimal(rng.randint(80000, 200000)) / 100)
+            day += timedelta(days=1)
+
+    for _ in range(40):
+        start = date(2023, 10, 15) + timedelta(days=rng.randint(0, 200))
+        end = start + timedelta(days=rng.randint(0, 120))
+        expected = {row['employee_id']: (row['shift_count'], Decimal(str(row['salary'])).quantize(Decimal("0.01")))
+                    for row in db.fetch_all(RAW_SUMMARY, (start, end))}
+        actual = {row['id']: (row['shift_count'], Decimal(str(row['total_salary'])).quantize(Decimal("0.01")))
+                  for row in payroll_summary(db, start.isoformat(), end.isoformat())}
+        assert actual == expected, (start, end)
+    assert payroll_summary(db, "2024-02-10", "2024-02-01") == []
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from database.product_io import import_products
+
+
+def write_csv(tmp_path, *lines):
+    path = tmp_path / "products.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def product(db, name):
+    return db.fetch_one("SELECT category_id, price, weight_or_volume, unit_id, description "
+                        "FROM products WHERE name = %s", (name,))
+
+
+def add_product(db, name):
+    db.execute("INSERT INTO products (name, category_id, price, weight_or_volume, unit_id, description) "
+               "VALUES (%s, 4, 100, 250, 1, %s)", (name, "Старое описание"))
+
+
+def test_import_updates_only_columns_in_file(db, tmp_path):
+    add_product(db, "Круассан тестовый")
+    report = import_products(db, write_csv(tmp_path, "Название;Цена", "круассан тестовый;125,50"))
+    assert (report.updated, report.inserted, report.errors) == (1, 0, [])
+    row = product(db, "Круассан тестовый")
+    assert Decimal(str(row['price'])) == Decimal("125.50")
+    assert (row['category_id'], row['weight_or_volume'], row['unit_id'], row['description']) == (
+        4, 250, 1, "Старое описание")
+
+
+def test_import_requires_category_for_new_products(db, tmp_path):
+    add_product(db, "Круассан тестовый")
+    report = import_products(db, write_csv(tmp_path, "Название;Описание",
+                                           "Круассан тестовый;Новое описание", "Эклер тестовый;Заварной"))
+    assert (report.updated, report.inserted) == (1, 0)
+    assert report.errors == [(3, "не указана категория")]
+    assert product(db, "Круассан тестовый")['description'] == "Новое описание"
+    assert product(db, "Эклер тестовый") is None
+
+
+def test_import_names_rejected_rows(db, tmp_path):
+    db.execute("CREATE TRIGGER reject_product BEFORE INSERT ON products WHEN NEW.name = 'Брак' "
+               "BEGIN SELECT RAISE(ABORT, 'отклонено'); END")
+    report = import_products(db, write_csv(tmp_path, "Название;Категория;Цена",
+                                           "Эклер тестовый;Пирожные;90", "Брак;Пирожные;10",
+                                           "Булка тестовая;Хлеб;40"))
+    assert report.inserted == 2
+    assert [line for line, message in report.errors] == [3]
+    assert "отклонено" in report.errors[0][1]
+    assert product(db, "Эклер тестовый")['category_id'] == 5
+    assert product(db, "Булка тестовая")['category_id'] == 6
+    assert product(db, "Брак") is None
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from database.margins import net_profit, to_kopecks, to_rate  # noqa: E402
+from database.scenarios import (  # noqa: E402
+    MAX_CELLS, PARAMETERS, Axis, ScenarioError, axis_values, break_even_price, sweep,
+)
+
+
+def axes(price=("100", "300", 5), cost=("50", "50", 1), quantity=("100", "500", 3),
+         bank_fee=("1.5", "1.5", 1), nalog=("6", "6", 1)):
+    given = dict(price=price, cost=cost, quantity=quantity, bank_fee=bank_fee, nalog=nalog)
+    return tuple(Axis(name, Decimal(given[name][0]), Decimal(given[name][1]), given[name][2])
+                 for name in PARAMETERS)
+
+
+def test_axis_values_include_both_ends():
+    assert axis_values(Axis("price", Decimal("100"), Decimal("300"), 5)).tolist() == [
+        10000, 15000, 20000, 25000, 30000]
+    assert axis_values(Axis("bank_fee", Decimal("1.5"), Decimal("9"), 1)).tolist() == [1500]
+    assert axis_values(Axis("quantity", Decimal("0"), Decimal("10"), 3)).tolist() == [0, 5, 10]
+
+
+def test_sweep_matches_single_calculation():
+    grid = sweep(axes(), Decimal("5"))
+    assert grid.profit.shape == (5, 1, 3, 1, 1)
+    for i, price in enumerate(grid.values["price"]):
+        for k, quantity in enumerate(grid.values["quantity"]):
+            expected = net_profit(price, to_kopecks("50"), to_kopecks("5"), quantity,
+                                  to_rate(Decimal("0.015")), to_rate(Decimal("0.06")))
+            assert grid.profit[i, 0, k, 0, 0] == expected
+
+
+def test_plane_is_rows_by_columns():
+    grid = sweep(axes(), Decimal("0"))
+    plane = grid.plane("price", "quantity")
+    assert plane.shape == (3, 5)
+    assert plane[2, 4] == grid.profit[4, 0, 2, 0, 0]
+
+
+def test_break_even_price_is_the_lowest_profitable_price():
+    price = break_even_price(Decimal("123.45"), Decimal("6.78"), Decimal("0.015"), Decimal("0.06"))
+    rates = (to_rate(Decimal("0.015")), to_rate(Decimal("0.06")))
+    assert net_profit(price, 12345, 678, 1, *rates) >= 0
+    assert net_profit(price - 1, 12345, 678, 1, *rates) < 0
+    assert break_even_price(Decimal("10"), Decimal("0"), Decimal("0.5"), Decimal("0.5")) is None
+
+
+def test_break_even_line_crosses_zero():
+    grid = sweep(axes(price=("0", "200", 201), cost=("100", "100", 1), quantity=("10", "10", 1)), Decimal("0"))
+    xs, ys = grid.break_even(grid.plane("price", "quantity"))
+    assert len(xs) == 1
+    # Прибыль равна нулю при цене ≈ 108.11 ₽, шаг оси — 1 ₽
+    assert xs[0] == pytest.approx(float(break_even_price(Decimal("100"), Decimal("0"),
+                                                         Decimal("0.015"), Decimal("0.06"))) / 100, abs=0.01)
+
+
+def test_sweep_rejects_bad_axes():
+    with pytest.raises(ScenarioError):
+        sweep(tuple(reversed(axes())), Decimal("0"))
+    with pytest.raises(ScenarioError):
+        sweep(axes(price=("100", "300", 0)), Decimal("0"))
+    steps = int(MAX_CELLS ** 0.5) + 1
+    with pytest.raises(ScenarioError):
+        sweep(axes(price=("1", "300", steps), quantity=("1", "500", steps)), Decimal("0"))
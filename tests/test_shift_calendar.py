@@ -0,0 +1,33 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("PyQt6.QtWidgets")
+
+from ui.shift_calendar import add_months, month_bounds  # noqa: E402
+
+
+@pytest.mark.parametrize("year, month, delta, expected", [
+    (2024, 5, 1, (2024, 6)),
+    (2024, 12, 1, (2025, 1)),
+    (2024, 1, -1, (2023, 12)),
+    (2024, 3, -14, (2023, 1)),
+    (2024, 3, 0, (2024, 3)),
+])
+def test_add_months(year, month, delta, expected):
+    assert add_months(year, month, delta) == expected
+
+
+def test_month_bounds():
+    assert month_bounds(2024, 2) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert month_bounds(2023, 2) == (date(2023, 2, 1), date(2023, 2, 28))
+    assert month_bounds(2023, 12) == (date(2023, 12, 1), date(2023, 12, 31))
+
+
+def test_month_window_covers_neighbours_without_gaps():
+    # Окно вкладки «Сотрудники»: видимый месяц и соседние — один непрерывный диапазон дат
+    window = [add_months(2024, 1, delta) for delta in (-1, 0, 1)]
+    bounds = [month_bounds(*month) for month in window]
+    assert bounds[0][0] == date(2023, 12, 1) and bounds[-1][1] == date(2024, 2, 29)
+    for (_, last), (first, _) in zip(bounds, bounds[1:]):
+        assert (first - last).days == 1
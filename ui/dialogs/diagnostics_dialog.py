@@ -0,0 +1,59 @@
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton,
+    QAbstractItemView, QApplication, QLabel
+)
+from database.stats import query_stats
+
+
+class DiagnosticsDialog(QDialog):
+    COLUMNS = [
+        ("Всего, мс", "total_ms"), ("Вызовов", "count"), ("p50", "p50_ms"), ("p95", "p95_ms"),
+        ("p99", "p99_ms"), ("Макс", "max_ms"), ("Строк", "rows"), ("Байт", "bytes"),
+        ("Откуда", "callers"), ("Запрос", "query"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Диагностика запросов")
+        self.resize(1200, 500)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"Медленные запросы (≥ {query_stats.slow_ms:.0f} мс) пишутся в {query_stats.log_path}"))
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _ in self.COLUMNS])
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+
+        refresh_btn = QPushButton("🔄 Обновить")
+        refresh_btn.clicked.connect(self.load_stats)
+        copy_btn = QPushButton("📋 Скопировать отчёт")
+        copy_btn.clicked.connect(lambda: QApplication.clipboard().setText(query_stats.dump(50)))
+        reset_btn = QPushButton("Сбросить")
+        reset_btn.clicked.connect(self.reset_stats)
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.accept)
+
+        btn_layout = QHBoxLayout()
+        for btn in (refresh_btn, copy_btn, reset_btn, close_btn):
+            btn_layout.addWidget(btn)
+        layout.addLayout(btn_layout)
+
+        self.load_stats()
+
+    def load_stats(self):
+        rows = query_stats.top(50)
+        self.table.setRowCount(len(rows))
+        for row, stat in enumerate(rows):
+            for col, (_, key) in enumerate(self.COLUMNS):
+                value = stat[key]
+                if key == "callers":
+                    value = ", ".join(f"{name} ×{count}" for name, count in value.items())
+                self.table.setItem(row, col, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+
+    def reset_stats(self):
+        query_stats.reset()
+        self.load_stats()
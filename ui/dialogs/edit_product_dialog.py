@@ -2,8 +2,13 @@ from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QComboBox, QHBoxLayout,
     QMessageBox, QFileDialog
 )
-from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt
+from database.blobs import BlobColumn, RenditionSource, save_renditions
+from database.cache import reference_cache
+from database.qt_async import QueryChannel
+from ui import image_ingest
+from ui.product_catalog import PHOTO_WIDTH, PHOTO_HEIGHT
+from ui.thumbnails import thumbnail_cache, photo_key
 
 
 class EditProductDialog(QDialog):
@@ -13,7 +18,12 @@ class EditProductDialog(QDialog):
         self.product_id = product_id
         self.setWindowTitle("Редактировать товар" if product_id else "Добавить товар")
         self.setMinimumWidth(400)
-        self.photo_data = None
+        self.photo_data = None  # полноразмерная копия нового фото; старое из базы не загружаем
+        self.renditions = None
+        self.photo_key = None
+        self.ingest_query = QueryChannel(self)
+        self.thumbnails = thumbnail_cache(PHOTO_WIDTH, PHOTO_HEIGHT)
+        self.thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
 
         self.init_ui()
         if self.product_id:
@@ -70,18 +80,19 @@ class EditProductDialog(QDialog):
         btn_layout.addWidget(save_btn)
     def load_categories(self):
         self.category_input.clear()
-        categories = self.db.fetch_all("SELECT id, name FROM categories")
-        for cat in categories:
-            self.category_input.addItem(cat['name'], cat['id'])
+        for cat_id, name in reference_cache(self.db).categories().items():
+            self.category_input.addItem(name, cat_id)
 
     def load_units(self):
         self.unit_input.clear()
-        units = self.db.fetch_all("SELECT id, name FROM units")
-        for unit in units:
-            self.unit_input.addItem(unit['name'], unit['id'])
+        for unit_id, name in reference_cache(self.db).units().items():
+            self.unit_input.addItem(name, unit_id)
 
     def load_product(self):
-        product = self.db.fetch_one("SELECT * FROM products WHERE id = %s", (self.product_id,))
+        product = self.db.fetch_one("""
+            SELECT name, category_id, price, weight_or_volume, unit_id, description, photo_hash
+            FROM products WHERE id = %s
+        """, (self.product_id,))
         if product:
             self.name_input.setText(product['name'])
             self.price_input.setText(str(product['price']))
@@ -89,11 +100,9 @@ class EditProductDialog(QDialog):
             self.description_input.setPlainText(product['description'] or "")
 
             # Фото
-            if product['photo']:
-                pixmap = QPixmap()
-                pixmap.loadFromData(product['photo'])
-                self.photo_label.setPixmap(pixmap.scaledToWidth(150))
-                self.photo_data = product['photo']
+            if product['photo_hash']:
+                self.photo_key = product['photo_hash']
+                self.show_photo()
 
             # Установим значения в combobox
             index = self.category_input.findData(product['category_id'])
@@ -107,11 +116,43 @@ class EditProductDialog(QDialog):
     def load_photo(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Выберите фото", "", "Images (*.png *.jpg *.jpeg *.bmp)")
         if file_path:
-            with open(file_path, 'rb') as file:
-                self.photo_data = file.read()
-            pixmap = QPixmap()
-            pixmap.loadFromData(self.photo_data)
-            self.photo_label.setPixmap(pixmap.scaledToWidth(150))
+            # Уменьшение и пережатие — в фоне, исходный файл в базу не попадает
+            self.photo_label.setText("Обработка фото…")
+            self.ingest_query.run(
+                image_ingest.submit(image_ingest.ingest_file, file_path),
+                self.photo_ingested,
+                lambda e: self.photo_label.setText(f"Не удалось обработать фото: {e}")
+            )
+
+    def photo_ingested(self, renditions):
+        self.renditions = renditions
+        self.photo_data = image_ingest.rendition(renditions, "full")[4]
+        self.photo_key = photo_key(self.photo_data)
+        self.show_photo()
+
+    def thumbnail(self):
+        if self.renditions is not None:
+            return self.thumbnails.get(self.photo_key, image_ingest.rendition(self.renditions, "thumb")[4])
+        source = RenditionSource(self.db, "products", "thumb", fallback=BlobColumn(self.db, "products", "photo"))
+        return self.thumbnails.get(self.photo_key, source=source, row_id=self.product_id)
+
+    def show_photo(self):
+        # Миниатюра общая с карточкой каталога; до готовности — надпись
+        pixmap = self.thumbnail()
+        if pixmap is not None:
+            self.photo_label.setPixmap(pixmap)
+        else:
+            self.photo_label.setText("Загрузка фото…")
+
+    def on_thumbnail_ready(self, key):
+        if key != self.photo_key:
+            return
+        if self.thumbnails.failed(key):
+            self.photo_label.setText("Не удалось прочитать фото")
+            return
+        pixmap = self.thumbnail()
+        if pixmap is not None:
+            self.photo_label.setPixmap(pixmap)
 
     def save_product(self):
         name = self.name_input.text().strip()
@@ -133,17 +174,27 @@ class EditProductDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Заполните все обязательные поля")
             return
 
-        if self.product_id:
-            self.db.execute("""
-                UPDATE products SET name=%s, category_id=%s, price=%s, 
-                weight_or_volume=%s, unit_id=%s, description=%s, photo=%s 
-                WHERE id=%s
-            """, (name, category_id, price, weight, unit_id, description, self.photo_data, self.product_id))
-        else:
-            self.db.execute("""
-                INSERT INTO products (name, category_id, price, weight_or_volume, unit_id, description, photo)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (name, category_id, price, weight, unit_id, description, self.photo_data))
+        if self.ingest_query.is_busy():
+            QMessageBox.warning(self, "Ошибка", "Фото ещё обрабатывается, подождите")
+            return
+
+        with self.db.transaction():
+            if self.product_id:
+                self.db.execute("""
+                    UPDATE products SET name=%s, category_id=%s, price=%s, 
+                    weight_or_volume=%s, unit_id=%s, description=%s 
+                    WHERE id=%s
+                """, (name, category_id, price, weight, unit_id, description, self.product_id))
+                # Фото перезаписываем, только если выбрано новое
+                if self.photo_data is not None:
+                    self.db.execute("UPDATE products SET photo=%s WHERE id=%s", (self.photo_data, self.product_id))
+            else:
+                self.product_id = self.db.insert_and_get_id("""
+                    INSERT INTO products (name, category_id, price, weight_or_volume, unit_id, description, photo)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, (name, category_id, price, weight, unit_id, description, self.photo_data))
+            if self.renditions is not None:
+                save_renditions(self.db, "products", self.product_id, self.renditions)
 
         self.accept()
 
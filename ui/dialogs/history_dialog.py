@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QDateEdit, QPushButton,
+    QTableWidget, QTableWidgetItem, QAbstractItemView, QMessageBox
+)
+from PyQt6.QtCore import QDate
+
+from database.history import HISTORY_QUERY, calculation_log, price_periods
+from database.qt_async import QueryChannel
+
+# Период истории по умолчанию, дней
+DEFAULT_DAYS = 90
+
+
+def _money(value):
+    return "—" if value is None else f"{value:.2f}"
+
+
+class HistoryDialog(QDialog):
+    """История расчётов товара за период и сравнение прибыли между ценами."""
+
+    HISTORY_COLUMNS = ["Дата", "Цена", "Себестоимость", "Прочие", "Кол-во", "Комиссия, %", "Налог, %", "Прибыль"]
+    PERIOD_COLUMNS = ["Цена", "С", "По", "Расчётов", "Средняя прибыль", "Маржа, %", "Изменение прибыли"]
+
+    def __init__(self, db, products, product_id=None, parent=None):
+        """products — список (id, подпись) для выбора товара."""
+        super().__init__(parent)
+        self.setWindowTitle("История расчётов")
+        self.resize(1000, 650)
+        self.db = db
+        self.history_query = QueryChannel(self)
+
+        layout = QVBoxLayout(self)
+        filters = QHBoxLayout()
+        self.product_select = QComboBox()
+        for item_id, text in products:
+            self.product_select.addItem(text, item_id)
+        if product_id is not None:
+            self.product_select.setCurrentIndex(max(self.product_select.findData(product_id), 0))
+
+        today = QDate.currentDate()
+        self.date_from = QDateEdit(today.addDays(-DEFAULT_DAYS))
+        self.date_to = QDateEdit(today)
+        for edit in (self.date_from, self.date_to):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("dd.MM.yyyy")
+            edit.dateChanged.connect(self.load)
+        self.product_select.currentIndexChanged.connect(self.load)
+
+        filters.addWidget(QLabel("Товар:"))
+        filters.addWidget(self.product_select, 1)
+        filters.addWidget(QLabel("с"))
+        filters.addWidget(self.date_from)
+        filters.addWidget(QLabel("по"))
+        filters.addWidget(self.date_to)
+        layout.addLayout(filters)
+
+        layout.addWidget(QLabel("Расчёты:"))
+        self.history_table = self.make_table(self.HISTORY_COLUMNS)
+        layout.addWidget(self.history_table, 3)
+
+        layout.addWidget(QLabel("Прибыль по ценам (подряд идущие расчёты с одной ценой):"))
+        self.periods_table = self.make_table(self.PERIOD_COLUMNS)
+        layout.addWidget(self.periods_table, 2)
+
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+
+        self.load()
+
+    @staticmethod
+    def make_table(columns):
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.verticalHeader().setVisible(False)
+        return table
+
+    def load(self):
+        product_id = self.product_select.currentData()
+        if product_id is None:
+            return
+        start = self.date_from.date().toPyDate()
+        end = self.date_to.date().toPyDate() + timedelta(days=1)
+        self.history_query.run(
+            self.db.submit(self.fetch, product_id, start, end),
+            self.show_history,
+            lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить историю:\n{e}")
+        )
+
+    def fetch(self, product_id, start, end):
+        # Выполняется в фоновом потоке. Сначала дописываем буфер, чтобы видеть и последние расчёты
+        try:
+            calculation_log(self.db).flush(wait=True)
+        except self.db.backend.errors:
+            pass  # ошибка записи уже выведена, строки ждут повтора; показываем записанное
+        rows = self.db.fetch_all(HISTORY_QUERY, (product_id, start, end))
+        return rows, price_periods(rows)
+
+    def show_history(self, result):
+        rows, periods = result
+        self.fill(self.history_table, [
+            (
+                row['calculation_date'].strftime("%d.%m.%Y %H:%M") if row['calculation_date'] else "",
+                _money(row['selling_price']),
+                _money(row['cost_price']),
+                _money(row['other_expenses']),
+                "—" if row['quantity'] is None else str(row['quantity']),
+                "—" if row['bank_fee_rate'] is None else f"{row['bank_fee_rate']:g}",
+                f"{row['tax_rate']:g}",
+                _money(row['calculated_profit']),
+            )
+            for row in reversed(rows)  # новые сверху
+        ])
+        self.fill(self.periods_table, [
+            (
+                _money(period['price']),
+                period['first'].strftime("%d.%m.%Y"),
+                period['last'].strftime("%d.%m.%Y"),
+                str(period['count']),
+                _money(period['avg_profit']),
+                "—" if period['avg_margin'] is None else f"{period['avg_margin']:.1f}",
+                "—" if period['profit_change'] is None else f"{period['profit_change']:+.2f}",
+            )
+            for period in periods
+        ])
+
+    @staticmethod
+    def fill(table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value))
+        table.resizeColumnsToContents()
@@ -0,0 +1,185 @@
+import math
+
+import numpy as np
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableView, QPushButton, QLabel, QMessageBox, QAbstractItemView
+)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QColor
+
+from database.events import event_bus
+from database.margins import MarginTable, format_kopecks
+from database.qt_async import QueryChannel
+
+LOW_MARGIN = 20  # %, как у шкалы калькулятора
+MEDIUM_MARGIN = 40
+
+
+class MarginModel(QAbstractTableModel):
+    """Маржа всех товаров. Сортировка — перестановкой индексов NumPy, без копирования строк."""
+
+    # Заголовок и имя массива MarginTable или Margins; None — название товара
+    COLUMNS = [
+        ("Товар", None),
+        ("Цена", "price"),
+        ("Себестоимость", "cost"),
+        ("Прочие", "other"),
+        ("Кол-во/мес", "quantity"),
+        ("Выручка", "revenue"),
+        ("Комиссия", "bank_fee"),
+        ("Налог", "tax"),
+        ("Прибыль", "net_profit"),
+        ("Маржа, %", "margin"),
+    ]
+    KOPECKS = {"price", "cost", "other", "revenue", "bank_fee", "tax", "net_profit"}
+    TABLE_ARRAYS = {"price", "cost", "other", "quantity"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = MarginTable()
+        self.margins = self.table.compute(0, 0)
+        self.order = np.arange(0)
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+
+    def set_data(self, table, margins):
+        self.beginResetModel()
+        self.table = table
+        self.margins = margins
+        self.order = np.arange(len(table))
+        self.endResetModel()
+        self.sort(self.sort_column, self.sort_order)
+
+    def values(self, key):
+        if key in self.TABLE_ARRAYS:
+            return getattr(self.table, key)
+        return getattr(self.margins, key)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = int(self.order[index.row()])
+        key = self.COLUMNS[index.column()][1]
+        planned = bool(self.table.planned[row])
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if key is None:
+                return self.table.names[row]
+            if key != "price" and not planned:
+                return "—"
+            value = self.values(key)[row]
+            if key in self.KOPECKS:
+                return format_kopecks(value)
+            if key == "margin":
+                return "—" if math.isnan(value) else f"{value:.1f}"
+            return str(int(value))
+        if role == Qt.ItemDataRole.TextAlignmentRole and key is not None:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.ForegroundRole and key == "margin" and planned:
+            value = self.margins.margin[row]
+            if math.isnan(value):
+                return None
+            if value < LOW_MARGIN:
+                return QColor("red")
+            if value < MEDIUM_MARGIN:
+                return QColor("darkorange")
+            return QColor("green")
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        key = self.COLUMNS[column][1]
+        if key is None:
+            folded = [name.casefold() for name in self.table.names]
+            positions = sorted(range(len(folded)), key=folded.__getitem__)
+            self.order = np.array(positions, dtype=np.int64)
+        else:
+            values = self.values(key).astype(np.float64)
+            # Товары без плана и без выручки — в конце при любом направлении
+            if key == "price":
+                missing = np.zeros(len(values), dtype=bool)
+            else:
+                missing = ~self.table.planned | np.isnan(values)
+            values = np.where(missing, np.inf, values if order == Qt.SortOrder.AscendingOrder else -values)
+            self.order = np.argsort(values, kind="stable")
+        if key is None and order == Qt.SortOrder.DescendingOrder:
+            self.order = self.order[::-1].copy()
+        self.layoutChanged.emit()
+
+
+class MarginsDialog(QDialog):
+    """Маржа по всему меню при текущих комиссии и налоге калькулятора."""
+
+    def __init__(self, db, bank_fee, nalog, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Маржа по всему меню")
+        self.resize(1100, 600)
+        self.db = db
+        self.bank_fee = bank_fee
+        self.nalog = nalog
+        self.load_query = QueryChannel(self)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            f"Банковская комиссия {bank_fee * 100:g} %, налог {nalog * 100:g} %. "
+            "Себестоимость, прочие расходы и количество — последние введённые в калькуляторе."
+        ))
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+
+        self.model = MarginModel(self)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.view.verticalHeader().setVisible(False)
+        self.view.sortByColumn(8, Qt.SortOrder.DescendingOrder)  # по прибыли
+        layout.addWidget(self.view)
+
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.accept)
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+        # Цены и планы меняются на других вкладках — каталог перечитывается одним запросом
+        event_bus(db).subscribe(self, ("products", "product_costs"), lambda event: self.load())
+        self.load()
+
+    def load(self):
+        self.load_query.run(
+            self.db.submit(self.fetch),
+            self.show_margins,
+            lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось рассчитать маржу:\n{e}")
+        )
+
+    def fetch(self):
+        # Выполняется в фоновом потоке: чтение каталога и весь расчёт
+        table = MarginTable.load(self.db)
+        return table, table.compute(self.bank_fee, self.nalog)
+
+    def show_margins(self, result):
+        table, margins = result
+        self.model.set_data(table, margins)
+        self.view.resizeColumnsToContents()
+        planned = table.planned
+        self.total_label.setText(
+            f"Товаров с планом: {int(planned.sum())} из {len(table)}. "
+            f"Выручка за месяц: {format_kopecks(margins.revenue[planned].sum())} ₽, "
+            f"прибыль: {format_kopecks(margins.net_profit[planned].sum())} ₽"
+        )
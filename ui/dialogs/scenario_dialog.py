@@ -0,0 +1,285 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton, QComboBox,
+    QDoubleSpinBox, QSpinBox, QSlider, QWidget, QToolTip
+)
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QImage, QPainter, QPen, QColor, QPolygonF
+
+from database.margins import format_kopecks
+from database.qt_async import QueryChannel
+from database.scenarios import PARAMETERS, Axis, Grid, ScenarioError, sweep, format_value, break_even_price
+
+# Шагов по оси по умолчанию для цены и себестоимости
+DEFAULT_STEPS = 61
+# Диапазон по умолчанию — ±50 % от текущего значения
+DEFAULT_SPREAD = Decimal("0.5")
+AXIS_MARGIN = 40  # место под подписи осей, px
+
+# Сетки считаются не в GUI-потоке; NumPy на больших массивах отпускает GIL
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scenario")
+
+
+def profit_colors(plane):
+    """RGB-изображение прибыли: убыток — красный, ноль — белый, прибыль — зелёный."""
+    scale = float(np.abs(plane).max()) or 1.0
+    t = plane / scale
+    fade = (255 * (1 - np.abs(t))).astype(np.uint8)
+    rgb = np.empty(plane.shape + (3,), dtype=np.uint8)
+    rgb[..., 0] = np.where(t < 0, 255, fade)
+    rgb[..., 1] = np.where(t < 0, fade, 255)
+    rgb[..., 2] = fade
+    # Строка 0 — снизу, как на графике
+    return np.ascontiguousarray(rgb[::-1])
+
+
+class HeatmapWidget(QWidget):
+    """Тепловая карта прибыли по двум осям с линией безубыточности."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(400, 300)
+        self.setMouseTracking(True)
+        self.plane = None
+        self.image = None
+        self.x = self.y = None  # (параметр, значения)
+        self.break_even = None
+
+    def set_plane(self, plane, x, y):
+        self.plane = plane
+        self.x, self.y = x, y
+        rgb = profit_colors(plane)
+        height, width = plane.shape
+        # QImage не копирует буфер: держим ссылку на массив вместе с изображением
+        self._rgb = rgb
+        self.image = QImage(rgb.data, width, height, 3 * width, QImage.Format.Format_RGB888)
+        self.break_even = Grid.break_even(plane)
+        self.update()
+
+    def plot_rect(self):
+        return QRectF(AXIS_MARGIN, 8, self.width() - AXIS_MARGIN - 8, self.height() - AXIS_MARGIN - 8)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().window())
+        if self.image is None:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "Нажмите «Рассчитать»")
+            return
+        rect = self.plot_rect()
+        painter.drawImage(rect, self.image)
+
+        height, width = self.plane.shape
+        xs, ys = self.break_even
+        if len(xs):
+            # Линия безубыточности — точками нулей прибыли; индекс i -> центр i-й ячейки
+            pen = QPen(QColor("black"))
+            pen.setWidth(3)
+            painter.setPen(pen)
+            painter.drawPoints(QPolygonF([
+                QPointF(rect.left() + (x + 0.5) * rect.width() / width,
+                        rect.bottom() - (y + 0.5) * rect.height() / height)
+                for x, y in zip(xs, ys)
+            ]))
+
+        painter.setPen(self.palette().windowText().color())
+        x_name, x_values = self.x
+        y_name, y_values = self.y
+        painter.drawText(QRectF(rect.left(), rect.bottom() + 4, rect.width(), 16),
+                         Qt.AlignmentFlag.AlignLeft, format_value(x_name, x_values[0]))
+        painter.drawText(QRectF(rect.left(), rect.bottom() + 4, rect.width(), 16),
+                         Qt.AlignmentFlag.AlignRight, format_value(x_name, x_values[-1]))
+        painter.drawText(QRectF(rect.left(), rect.bottom() + 20, rect.width(), 16),
+                         Qt.AlignmentFlag.AlignHCenter, PARAMETERS[x_name][0])
+        painter.save()
+        painter.translate(12, rect.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-rect.height() / 2, -8, rect.height(), 16), Qt.AlignmentFlag.AlignLeft,
+                         format_value(y_name, y_values[0]))
+        painter.drawText(QRectF(-rect.height() / 2, -8, rect.height(), 16), Qt.AlignmentFlag.AlignHCenter,
+                         PARAMETERS[y_name][0])
+        painter.drawText(QRectF(-rect.height() / 2, -8, rect.height(), 16), Qt.AlignmentFlag.AlignRight,
+                         format_value(y_name, y_values[-1]))
+        painter.restore()
+
+    def mouseMoveEvent(self, event):
+        if self.plane is None:
+            return
+        rect = self.plot_rect()
+        pos = event.position()
+        if not rect.contains(pos):
+            QToolTip.hideText()
+            return
+        height, width = self.plane.shape
+        column = min(int((pos.x() - rect.left()) * width / rect.width()), width - 1)
+        row = min(int((rect.bottom() - pos.y()) * height / rect.height()), height - 1)
+        x_name, x_values = self.x
+        y_name, y_values = self.y
+        QToolTip.showText(
+            event.globalPosition().toPoint(),
+            f"{PARAMETERS[x_name][0]}: {format_value(x_name, x_values[column])}\n"
+            f"{PARAMETERS[y_name][0]}: {format_value(y_name, y_values[row])}\n"
+            f"Прибыль: {format_kopecks(self.plane[row, column])} ₽",
+            self
+        )
+
+
+class ScenarioDialog(QDialog):
+    """Прибыль на сетке сценариев: два параметра — оси карты, остальные — ползунки."""
+
+    def __init__(self, values, parent=None):
+        """values — текущие значения калькулятора: price, cost, other, quantity (Decimal/int),
+        bank_fee, nalog (доли)."""
+        super().__init__(parent)
+        self.setWindowTitle("Сценарии цены и затрат")
+        self.resize(1100, 750)
+        self.grid = None
+        self.sweep_query = QueryChannel(self)
+
+        layout = QVBoxLayout(self)
+        ranges = QGridLayout()
+        for column, title in enumerate(("", "от", "до", "шагов")):
+            ranges.addWidget(QLabel(title), 0, column)
+
+        start = {
+            "price": values["price"], "cost": values["cost"], "quantity": values["quantity"],
+            "bank_fee": values["bank_fee"] * 100, "nalog": values["nalog"] * 100,
+        }
+        self.inputs = {}
+        for row, (name, (title, unit)) in enumerate(PARAMETERS.items(), start=1):
+            low, high = QDoubleSpinBox(), QDoubleSpinBox()
+            for spin in (low, high):
+                spin.setRange(0, 1_000_000)
+                spin.setDecimals(0 if name == "quantity" else 2)
+                spin.setSuffix(f" {unit}")
+            steps = QSpinBox()
+            steps.setRange(1, 5000)
+            value = Decimal(start[name])
+            swept = name in ("price", "cost")
+            low.setValue(float(value * (1 - DEFAULT_SPREAD)) if swept else float(value))
+            high.setValue(float(value * (1 + DEFAULT_SPREAD)) if swept else float(value))
+            steps.setValue(DEFAULT_STEPS if swept else 1)
+            ranges.addWidget(QLabel(title), row, 0)
+            ranges.addWidget(low, row, 1)
+            ranges.addWidget(high, row, 2)
+            ranges.addWidget(steps, row, 3)
+            self.inputs[name] = (low, high, steps)
+
+        self.other_input = QDoubleSpinBox()
+        self.other_input.setRange(0, 1_000_000)
+        self.other_input.setSuffix(" ₽")
+        self.other_input.setValue(float(values["other"]))
+        other_row = len(PARAMETERS) + 1
+        ranges.addWidget(QLabel("Прочие расходы"), other_row, 0)
+        ranges.addWidget(self.other_input, other_row, 1)
+        layout.addLayout(ranges)
+
+        axes_layout = QHBoxLayout()
+        self.x_axis = QComboBox()
+        self.y_axis = QComboBox()
+        for name, (title, _) in PARAMETERS.items():
+            self.x_axis.addItem(title, name)
+            self.y_axis.addItem(title, name)
+        self.x_axis.setCurrentIndex(0)
+        self.y_axis.setCurrentIndex(1)
+        self.x_axis.currentIndexChanged.connect(self.show_plane)
+        self.y_axis.currentIndexChanged.connect(self.show_plane)
+        axes_layout.addWidget(QLabel("По горизонтали:"))
+        axes_layout.addWidget(self.x_axis)
+        axes_layout.addWidget(QLabel("По вертикали:"))
+        axes_layout.addWidget(self.y_axis)
+        self.calculate_btn = QPushButton("Рассчитать")
+        self.calculate_btn.clicked.connect(self.calculate)
+        axes_layout.addWidget(self.calculate_btn)
+        layout.addLayout(axes_layout)
+
+        # Ползунки для параметров, которые не выбраны осями карты
+        self.sliders = {}
+        sliders_layout = QGridLayout()
+        for row, (name, (title, _)) in enumerate(PARAMETERS.items()):
+            slider = QSlider(Qt.Orientation.Horizontal)
+            slider.valueChanged.connect(self.show_plane)
+            label = QLabel()
+            sliders_layout.addWidget(slider, row, 0)
+            sliders_layout.addWidget(label, row, 1)
+            self.sliders[name] = (slider, label)
+        layout.addLayout(sliders_layout)
+
+        be_price = break_even_price(values["cost"], values["other"], values["bank_fee"], values["nalog"])
+        self.break_even_label = QLabel(
+            "Безубыточная цена при текущих затратах: "
+            + (f"{format_kopecks(be_price)} ₽" if be_price is not None else "нет (комиссия и налог ≥ 100 %)")
+        )
+        layout.addWidget(self.break_even_label)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.heatmap = HeatmapWidget()
+        layout.addWidget(self.heatmap, 1)
+        self.update_sliders()
+
+    def axes(self):
+        axes = []
+        for name, (low, high, steps) in self.inputs.items():
+            decimals = low.decimals()
+            axes.append(Axis(name, Decimal(f"{low.value():.{decimals}f}"), Decimal(f"{high.value():.{decimals}f}"),
+                             steps.value()))
+        return tuple(axes)
+
+    def calculate(self):
+        axes = self.axes()
+        other = Decimal(f"{self.other_input.value():.2f}")
+        started = time.perf_counter()
+        cached = sweep.cache_info().hits
+
+        def work():
+            grid = sweep(axes, other)
+            return grid, time.perf_counter() - started, sweep.cache_info().hits > cached
+
+        self.calculate_btn.setEnabled(False)
+        self.status_label.setText("Расчёт…")
+        self.sweep_query.run(_executor.submit(work), self.show_grid, self.show_error)
+
+    def show_error(self, error):
+        self.calculate_btn.setEnabled(True)
+        self.status_label.setText(str(error) if isinstance(error, ScenarioError) else f"Ошибка расчёта: {error}")
+
+    def show_grid(self, result):
+        self.grid, seconds, from_cache = result
+        self.calculate_btn.setEnabled(True)
+        source = "из кэша" if from_cache else f"{seconds * 1000:.0f} мс"
+        self.status_label.setText(f"Ячеек: {self.grid.size:,} ({source})".replace(",", " "))
+        self.update_sliders()
+        self.show_plane()
+
+    def update_sliders(self):
+        x, y = self.x_axis.currentData(), self.y_axis.currentData()
+        for name, (slider, label) in self.sliders.items():
+            values = self.grid.values[name] if self.grid is not None else None
+            visible = values is not None and len(values) > 1 and name not in (x, y)
+            slider.setVisible(visible)
+            label.setVisible(visible)
+            if values is not None:
+                slider.blockSignals(True)
+                slider.setRange(0, len(values) - 1)
+                slider.blockSignals(False)
+
+    def show_plane(self):
+        if self.grid is None:
+            return
+        x, y = self.x_axis.currentData(), self.y_axis.currentData()
+        if x == y:
+            self.status_label.setText("Выберите разные параметры для осей")
+            return
+        self.update_sliders()
+        fixed = {}
+        for name, (slider, label) in self.sliders.items():
+            if name in (x, y):
+                continue
+            fixed[name] = slider.value()
+            label.setText(f"{PARAMETERS[name][0]}: {format_value(name, self.grid.values[name][slider.value()])}")
+        plane = self.grid.plane(x, y, fixed)
+        self.heatmap.set_plane(plane, (x, self.grid.values[x]), (y, self.grid.values[y]))
@@ -0,0 +1,87 @@
+# ui/image_ingest.py
+# Приём фото: декодирование с учётом ориентации EXIF, уменьшение до нескольких
+# размеров и пережатие в JPEG/WebP. Метаданные при перекодировании не сохраняются.
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtGui import QImage, QImageReader, QImageWriter, QPainter, QColor
+from PyQt6.QtCore import Qt, QBuffer, QByteArray, QIODevice
+
+# Название копии -> (наибольшая сторона, качество)
+RENDITIONS = {
+    "thumb": (160, 80),
+    "card": (480, 82),
+    "full": (1600, 85),
+}
+
+# Декодирование больших фото — не в потоке GUI и не в потоках запросов к базе
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image")
+
+
+class IngestError(Exception):
+    pass
+
+
+def output_format():
+    # WebP заметно компактнее, но плагин Qt для него есть не везде
+    if b"webp" in QImageWriter.supportedImageFormats():
+        return "WEBP", "image/webp"
+    return "JPEG", "image/jpeg"
+
+
+def _read(device):
+    reader = QImageReader(device)
+    reader.setAutoTransform(True)  # поворот по EXIF до того, как метаданные будут отброшены
+    image = reader.read()
+    if image.isNull():
+        raise IngestError(f"Не удалось прочитать изображение: {reader.errorString()}")
+    return image
+
+
+def _flatten(image):
+    # В JPEG нет прозрачности: подкладываем белый фон
+    result = QImage(image.size(), QImage.Format.Format_RGB32)
+    result.fill(QColor("white"))
+    painter = QPainter(result)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return result
+
+
+def _encode(image, fmt, quality):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(buffer, fmt, quality):
+        raise IngestError(f"Не удалось сохранить изображение в {fmt}")
+    return data.data()
+
+
+def make_renditions(image):
+    """Копии фото всех размеров: список (название, MIME, ширина, высота, байты)."""
+    fmt, mime = output_format()
+    if fmt == "JPEG" and image.hasAlphaChannel():
+        image = _flatten(image)
+    renditions = []
+    for name, (side, quality) in RENDITIONS.items():
+        scaled = image
+        if max(image.width(), image.height()) > side:
+            scaled = image.scaled(side, side, Qt.AspectRatioMode.KeepAspectRatio,
+                                  Qt.TransformationMode.SmoothTransformation)
+        renditions.append((name, mime, scaled.width(), scaled.height(), _encode(scaled, fmt, quality)))
+    return renditions
+
+
+def ingest_file(path):
+    return make_renditions(_read(path))
+
+
+def submit(fn, *args):
+    """Запуск приёма фото в фоне; Future можно передать в QueryChannel.run."""
+    return _executor.submit(fn, *args)
+
+
+def rendition(renditions, name):
+    for item in renditions:
+        if item[0] == name:
+            return item
+    return None
@@ -0,0 +1,85 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton
+from PyQt6.QtCore import QTimer
+
+from database.jobs import Job
+
+# Через сколько миллисекунд убирать завершённую задачу с панели
+KEEP_FINISHED_MS = 5000
+
+STATE_TEXT = {
+    Job.QUEUED: "в очереди",
+    Job.DONE: "готово",
+    Job.FAILED: "ошибка",
+    Job.CANCELLED: "отменено",
+}
+
+
+class JobRow(QWidget):
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.title_label = QLabel(job.title)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(250)
+        self.progress_bar.setRange(0, 0)  # пока объём неизвестен — бегущая полоса
+        self.progress_bar.setTextVisible(False)
+        self.state_label = QLabel()
+        self.cancel_button = QPushButton("Отменить")
+        self.cancel_button.clicked.connect(job.cancel)
+        layout.addWidget(self.title_label, 1)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.state_label)
+        layout.addWidget(self.cancel_button)
+
+        job.progress.connect(self.show_progress)
+        job.state_changed.connect(self.show_state)
+        self.show_state(job.state)
+
+    def show_progress(self, done, total):
+        if total > 0:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(min(done, total))
+            self.progress_bar.setTextVisible(True)
+            self.progress_bar.setFormat(f"{done} из {total}")
+        else:
+            self.progress_bar.setFormat(str(done))
+            self.progress_bar.setTextVisible(True)
+
+    def show_state(self, state):
+        text = STATE_TEXT.get(state, "")
+        if state == Job.DONE and self.job.cached:
+            text = "готово (из кэша)"
+        self.state_label.setText(text)
+        if self.job.is_active():
+            return
+        self.cancel_button.hide()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1 if state == Job.DONE else 0)
+        self.progress_bar.setTextVisible(False)
+        QTimer.singleShot(KEEP_FINISHED_MS, self.deleteLater)
+
+
+class JobPanel(QWidget):
+    """Список фоновых задач под вкладками. Скрыт, пока задач нет."""
+
+    def __init__(self, runner, parent=None):
+        super().__init__(parent)
+        self.rows_layout = QVBoxLayout(self)
+        self.rows_layout.setContentsMargins(6, 2, 6, 2)
+        self.hide()
+        for job in runner.jobs():
+            self.add_job(job)
+        runner.added.connect(self.add_job)
+
+    def add_job(self, job):
+        row = JobRow(job, self)
+        row.destroyed.connect(self.update_visibility)
+        self.rows_layout.addWidget(row)
+        self.show()
+
+    def update_visibility(self):
+        # Строка удаляется отложенно: считаем оставшиеся после её удаления
+        QTimer.singleShot(0, lambda: self.setVisible(self.rows_layout.count() > 0))
@@ -1,12 +1,26 @@
 from PyQt6.QtWidgets import (
-    QDialog, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QPushButton,
+    QDialog, QVBoxLayout, QLabel, QTableView, QPushButton, QDateEdit,
     QHBoxLayout, QMessageBox, QAbstractItemView, QComboBox, QFormLayout, QDialogButtonBox,
     QTimeEdit, QDoubleSpinBox
 )
-from PyQt6.QtCore import QTime
+from PyQt6.QtCore import Qt, QTime, QDate, QAbstractTableModel, QModelIndex, pyqtSignal
+from database.db import PAGE_ROWS
+from database.events import event_bus
+from database.payroll_rollup import apply_shift_change, fetch_shift
+from database.qt_async import QueryChannel
 from datetime import timedelta, time
 
 
+SHIFTS_QUERY = """
+    SELECT e.first_name, e.last_name, s.shift_date, s.shift_start, s.shift_end,
+           s.shift_salary, s.id, s.employee_id
+    FROM shifts s
+    JOIN employees e ON s.employee_id = e.id
+"""
+# Нижняя граница выбора дат; она же означает «без ограничения»
+NO_DATE = QDate(2000, 1, 1)
+
+
 def to_qtime(value):
     if isinstance(value, QTime):
         return value
@@ -75,21 +89,312 @@ class EditShiftDialog(QDialog):
         )
 
 
+class ShiftTableModel(QAbstractTableModel):
+    """Смены страницами по ключу сортировки. Фильтр и сортировка выполняются в базе.
+
+    Следующая страница загружается заранее и отдаётся представлению в fetchMore().
+    Изменённые смены перечитываются по одной и меняются на месте, без перезагрузки.
+    """
+
+    # Заголовок и ключ сортировки (выражения, вместе уникальные); None — столбец не сортируется
+    COLUMNS = [
+        ("Сотрудник", ("e.last_name", "e.first_name", "s.id")),
+        ("Дата", ("s.shift_date", "s.id")),
+        ("Начало", ("s.shift_start", "s.id")),
+        ("Конец", ("s.shift_end", "s.id")),
+        ("Зарплата", None),  # может быть NULL — по такому ключу страницы не строятся
+        ("ID", ("s.id",)),
+    ]
+    DATE_COLUMN = 1
+
+    failed = pyqtSignal(object)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.rows = []
+        self.ids = set()
+        self.employee_id = None
+        self.date_from = None
+        self.date_to = None
+        self.sort_column = self.DATE_COLUMN
+        self.descending = True
+        self.next_key = None  # ключ последней полученной смены (показанной или ожидающей)
+        self.exhausted = True
+        self.prefetched = None
+        self.wanted = False  # представление просило строки, пока страница ещё загружалась
+        self.changed_ids = set()
+        self.page_query = QueryChannel(self)
+        self.changes_query = QueryChannel(self)
+
+    # === Запросы ===
+
+    def conditions(self):
+        conditions, params = [], []
+        if self.employee_id is not None:
+            conditions.append("s.employee_id = %s")
+            params.append(self.employee_id)
+        if self.date_from is not None:
+            conditions.append("s.shift_date >= %s")
+            params.append(self.date_from)
+        if self.date_to is not None:
+            conditions.append("s.shift_date <= %s")
+            params.append(self.date_to)
+        return conditions, params
+
+    def query(self, extra=None, extra_params=()):
+        conditions, params = self.conditions()
+        if extra:
+            conditions.append(extra)
+            params.extend(extra_params)
+        query = SHIFTS_QUERY
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query, params
+
+    def keys(self):
+        return self.COLUMNS[self.sort_column][1]
+
+    def key_of(self, row):
+        return tuple(row[key.rsplit(".", 1)[-1]] for key in self.keys())
+
+    # === Загрузка ===
+
+    def set_filter(self, employee_id=None, date_from=None, date_to=None):
+        self.employee_id = employee_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.reload()
+
+    def reload(self):
+        self.beginResetModel()
+        self.rows = []
+        self.ids = set()
+        self.next_key = None
+        self.exhausted = False
+        self.prefetched = None
+        self.wanted = False
+        self.endResetModel()
+        self.request_page(self.show_page)
+
+    def request_page(self, on_page):
+        query, params = self.query()
+        self.page_query.run(
+            self.db.fetch_page_async(query, self.keys(), self.next_key, PAGE_ROWS, params, self.descending),
+            on_page,
+            self.failed.emit
+        )
+
+    def show_page(self, page):
+        rows, self.next_key = page
+        self.exhausted = self.next_key is None
+        self.append_rows(rows)
+        if not self.exhausted:
+            self.request_page(self.store_page)
+        self.refresh_changed()
+
+    def store_page(self, page):
+        self.prefetched, self.next_key = page
+        self.exhausted = self.next_key is None
+        if self.wanted:
+            self.wanted = False
+            self.fetchMore()
+        self.refresh_changed()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self.prefetched is not None or not self.exhausted)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self.prefetched is None:
+            # Страница ещё в пути — покажем её сразу по получении
+            self.wanted = True
+            return
+        rows, self.prefetched = self.prefetched, None
+        self.append_rows(rows)
+        if not self.exhausted:
+            self.request_page(self.store_page)
+
+    def append_rows(self, rows):
+        # Смена, уже вставленная по изменению, второй раз со страницей не добавляется
+        rows = [row for row in rows if row['id'] not in self.ids]
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.ids.update(row['id'] for row in rows)
+        self.endInsertRows()
+
+    # === Сортировка ===
+
+    def is_sortable(self, column):
+        return self.COLUMNS[column][1] is not None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if not self.is_sortable(column):
+            return
+        self.sort_column = column
+        self.descending = order == Qt.SortOrder.DescendingOrder
+        self.reload()
+
+    # === Изменения отдельных смен ===
+
+    def refresh_rows(self, ids):
+        """Перечитывает смены по id: изменённые меняются на месте, удалённые убираются."""
+        self.changed_ids.update(ids)
+        self.refresh_changed()
+
+    def refresh_changed(self):
+        # Пока идёт загрузка страницы, изменения ждут её: иначе смена может попасть в таблицу дважды
+        if not self.changed_ids or self.changes_query.is_busy() or self.page_query.is_busy():
+            return
+        ids = sorted(self.changed_ids)
+        self.changed_ids.clear()
+        placeholders = ", ".join(["%s"] * len(ids))
+        query, params = self.query(f"s.id IN ({placeholders})", ids)
+        self.changes_query.run(
+            self.db.fetch_all_async(query, params),
+            lambda rows: self.apply_changes(ids, rows),
+            self.failed.emit
+        )
+
+    def apply_changes(self, ids, rows):
+        found = {row['id']: row for row in rows}
+        stale_prefetch = False
+        for shift_id in ids:
+            row = found.get(shift_id)
+            position = self.position(shift_id)
+            if position is not None and row is not None and self.key_of(row) == self.key_of(self.rows[position]):
+                self.rows[position] = row
+                self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.COLUMNS) - 1))
+                continue
+            if position is not None:
+                self.remove_at(position)
+            if row is not None and not self.insert_sorted(row):
+                stale_prefetch = True  # её место — в ещё не показанных страницах
+            elif row is None and position is None:
+                stale_prefetch = stale_prefetch or any(r['id'] == shift_id for r in self.prefetched or ())
+
+        if stale_prefetch and self.prefetched is not None:
+            # Заранее загруженная страница могла устареть: запросим её заново после показанных строк
+            self.prefetched = None
+            self.next_key = self.key_of(self.rows[-1]) if self.rows else None
+            self.exhausted = False
+            self.request_page(self.store_page)
+        self.refresh_changed()
+
+    def position(self, shift_id):
+        if shift_id not in self.ids:
+            return None
+        for position, row in enumerate(self.rows):
+            if row['id'] == shift_id:
+                return position
+        return None
+
+    def remove_at(self, position):
+        self.beginRemoveRows(QModelIndex(), position, position)
+        row = self.rows.pop(position)
+        self.ids.discard(row['id'])
+        self.endRemoveRows()
+
+    def insert_sorted(self, row):
+        """Вставляет смену на её место среди показанных. False — её место дальше показанных строк."""
+        key = self.key_of(row)
+        position = len(self.rows)
+        for index, other in enumerate(self.rows):
+            other_key = self.key_of(other)
+            if (key > other_key) if self.descending else (key < other_key):
+                position = index
+                break
+        loaded_all = self.exhausted and self.prefetched is None
+        if position == len(self.rows) and not loaded_all:
+            return False
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(position, row)
+        self.ids.add(row['id'])
+        self.endInsertRows()
+        return True
+
+    def shift_at(self, row):
+        return self.rows[row]
+
+    # === Представление ===
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        shift = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return f"{shift['first_name']} {shift['last_name']}"
+            if column == 1:
+                return str(shift['shift_date'])
+            if column == 2:
+                return str(shift['shift_start'])
+            if column == 3:
+                return str(shift['shift_end'])
+            if column == 4:
+                return "—" if shift['shift_salary'] is None else f"{shift['shift_salary']:.2f}"
+            return str(shift['id'])
+        if role == Qt.ItemDataRole.TextAlignmentRole and column in (4, 5):
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+
 class ManageShiftsDialog(QDialog):
     def __init__(self, parent=None, db=None, employees=None):
         super().__init__(parent)
         self.setWindowTitle("Управление сменами")
+        self.resize(800, 600)
         self.db = db
         self.employees = employees
 
-        self.layout = QVBoxLayout()
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["Сотрудник", "Дата", "Начало", "Конец", "Зарплата", "ID"])
+        self.model = ShiftTableModel(db, self)
+        self.model.failed.connect(
+            lambda e: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить смены:\n{e}")
+        )
+
+        filters = QHBoxLayout()
+        self.employee_filter = QComboBox()
+        self.employee_filter.addItem("Все сотрудники", None)
+        for emp_id, name in employees.items():
+            self.employee_filter.addItem(name, emp_id)
+        self.date_from = self.make_date_edit()
+        self.date_to = self.make_date_edit()
+        self.employee_filter.currentIndexChanged.connect(self.apply_filter)
+        filters.addWidget(QLabel("Сотрудник:"))
+        filters.addWidget(self.employee_filter, 1)
+        filters.addWidget(QLabel("с"))
+        filters.addWidget(self.date_from)
+        filters.addWidget(QLabel("по"))
+        filters.addWidget(self.date_to)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-
-        self.load_data()
+        self.table.verticalHeader().setVisible(False)
+        # Сортировка — запросом к базе; по зарплате не сортируем, индикатор возвращается назад
+        header = self.table.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(ShiftTableModel.DATE_COLUMN, Qt.SortOrder.DescendingOrder)
+        header.sortIndicatorChanged.connect(self.sort_changed)
 
         self.edit_button = QPushButton("Изменить")
         self.delete_button = QPushButton("Удалить")
@@ -104,48 +409,71 @@ class ManageShiftsDialog(QDialog):
         button_layout.addWidget(self.delete_button)
         button_layout.addWidget(self.close_button)
 
-        self.layout.addWidget(QLabel("Все смены:"))
-        self.layout.addWidget(self.table)
-        self.layout.addLayout(button_layout)
-        self.setLayout(self.layout)
-
-    def load_data(self):
-        self.table.setRowCount(0)
-        shifts = self.db.fetch_all("""
-            SELECT s.id, s.shift_date, s.shift_start, s.shift_end, s.shift_salary, s.employee_id,
-                   e.first_name, e.last_name
-            FROM shifts s
-            JOIN employees e ON s.employee_id = e.id
-            ORDER BY s.shift_date DESC
-        """)
-
-        for shift in shifts:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            emp_name = f"{shift['first_name']} {shift['last_name']}"
-            self.table.setItem(row, 0, QTableWidgetItem(emp_name))
-            self.table.setItem(row, 1, QTableWidgetItem(str(shift['shift_date'])))
-            self.table.setItem(row, 2, QTableWidgetItem(str(shift['shift_start'])))
-            self.table.setItem(row, 3, QTableWidgetItem(str(shift['shift_end'])))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{shift['shift_salary']:.2f}"))
-            self.table.setItem(row, 5, QTableWidgetItem(str(shift['id'])))
-
-    def get_selected_shift_id(self):
-        selected = self.table.currentRow()
-        if selected == -1:
-            return None
-        return int(self.table.item(selected, 5).text())
+        layout = QVBoxLayout(self)
+        layout.addLayout(filters)
+        layout.addWidget(QLabel("Смены:"))
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+
+        # Смены, изменённые в другом месте, обновляются в таблице по одной
+        bus = event_bus(self.db)
+        bus.subscribe(self, ("shifts",), self.on_shifts_changed)
+        bus.subscribe(self, ("employees",), lambda event: self.model.reload())
+
+        self.model.reload()
+
+    def make_date_edit(self):
+        edit = QDateEdit()
+        edit.setCalendarPopup(True)
+        edit.setDisplayFormat("dd.MM.yyyy")
+        edit.setMinimumDate(NO_DATE)
+        edit.setSpecialValueText("—")  # минимальная дата — без ограничения
+        edit.setDate(NO_DATE)
+        edit.dateChanged.connect(self.apply_filter)
+        return edit
+
+    @staticmethod
+    def date_value(edit):
+        date = edit.date()
+        return None if date == NO_DATE else date.toString("yyyy-MM-dd")
+
+    def apply_filter(self):
+        self.model.set_filter(
+            self.employee_filter.currentData(),
+            self.date_value(self.date_from),
+            self.date_value(self.date_to)
+        )
 
-    def edit_selected(self):
-        shift_id = self.get_selected_shift_id()
-        if not shift_id:
-            QMessageBox.warning(self, "Ошибка", "Выберите смену для редактирования.")
+    def sort_changed(self, column, order):
+        if self.model.is_sortable(column):
+            self.model.sort(column, order)
             return
+        header = self.table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(
+            self.model.sort_column,
+            Qt.SortOrder.DescendingOrder if self.model.descending else Qt.SortOrder.AscendingOrder
+        )
+        header.blockSignals(False)
+
+    def on_shifts_changed(self, event):
+        if event.changes is None:
+            self.model.reload()
+        else:
+            self.model.refresh_rows(event.ids)
 
-        shift = self.db.fetch_one("SELECT * FROM shifts WHERE id = %s", (shift_id,))
+    def get_selected_shift(self):
+        index = self.table.currentIndex()
+        if not index.isValid():
+            return None
+        return self.model.shift_at(index.row())
+
+    def edit_selected(self):
+        shift = self.get_selected_shift()
         if not shift:
-            QMessageBox.critical(self, "Ошибка", "Смена не найдена.")
+            QMessageBox.warning(self, "Ошибка", "Выберите смену для редактирования.")
             return
+        shift_id = shift['id']
 
         dialog = EditShiftDialog(self, shift_data=shift, employees=self.employees)
         if dialog.exec():
@@ -160,23 +488,48 @@ class ManageShiftsDialog(QDialog):
             hours = start.secsTo(end) / 3600
             salary = round(hourly_rate * hours, 2)
 
-            self.db.execute("""
-                UPDATE shifts SET employee_id=%s, shift_start=%s, shift_end=%s, shift_salary=%s
-                WHERE id=%s
-            """, (employee_id, start_time, end_time, salary, shift_id))
+            try:
+                with self.db.transaction():
+                    old = fetch_shift(self.db, shift_id)
+                    self.db.execute("""
+                        UPDATE shifts SET employee_id=%s, shift_start=%s, shift_end=%s, shift_salary=%s
+                        WHERE id=%s
+                    """, (employee_id, start_time, end_time, salary, shift_id))
+                    apply_shift_change(self.db, old, fetch_shift(self.db, shift_id))
+            except Exception as e:
+                self.show_save_error(e)
+                return
 
             QMessageBox.information(self, "Обновлено", "Смена обновлена.")
-            self.load_data()
+            self.model.refresh_rows([shift_id])
+
+    def show_save_error(self, error):
+        # Исключение из слота Qt завершило бы приложение: транзакция уже откатана, сообщаем
+        if isinstance(error, self.db.backend.errors) and self.db.backend.is_row_error(error):
+            QMessageBox.warning(self, "Ошибка", f"Этот сотрудник уже работает в этот день "
+                                                f"или данные смены некорректны.\n{error}")
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при обработке смены:\n{error}")
 
     def delete_selected(self):
-        shift_id = self.get_selected_shift_id()
-        if not shift_id:
+        shift = self.get_selected_shift()
+        if not shift:
             QMessageBox.warning(self, "Ошибка", "Выберите смену для удаления.")
             return
+        shift_id = shift['id']
 
         reply = QMessageBox.question(self, "Удаление", "Удалить выбранную смену?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            self.db.execute("DELETE FROM shifts WHERE id = %s", (shift_id,))
+            try:
+                with self.db.transaction():
+                    old = fetch_shift(self.db, shift_id)
+                    self.db.execute("DELETE FROM shifts WHERE id = %s", (shift_id,))
+                    apply_shift_change(self.db, old)
+            except Exception as e:
+                self.show_save_error(e)
+                return
             QMessageBox.information(self, "Удалено", "Смена удалена.")
-            self.load_data()
+            position = self.model.position(shift_id)
+            if position is not None:
+                self.model.remove_at(position)
@@ -0,0 +1,255 @@
+from PyQt6.QtWidgets import QStyledItemDelegate, QListView, QStyle, QAbstractItemView
+from PyQt6.QtGui import QColor, QPainter, QFont, QPen
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect, QRectF, QEvent, pyqtSignal
+from ui.thumbnails import thumbnail_cache
+
+# Роль с полной записью товара
+ProductRole = Qt.ItemDataRole.UserRole
+
+CARD_WIDTH = 220
+CARD_HEIGHT = 340
+PHOTO_WIDTH = 150
+PHOTO_HEIGHT = 150
+PADDING = 10
+BUTTON_HEIGHT = 30
+
+# Флаги выравнивания и переноса разных типов перечислений объединяем как int
+WRAP_LEFT = Qt.AlignmentFlag.AlignLeft.value | Qt.TextFlag.TextWordWrap.value
+
+# Цвета из assets/style.css
+CARD_BG = QColor("#FFFFFF")
+CARD_BORDER = QColor("#B8A9A1")
+CARD_SELECTED = QColor("#EBD3A5")
+PLACEHOLDER_BG = QColor("#F3EDE9")
+TEXT_COLOR = QColor("#3C2C23")
+BUTTON_BG = QColor("#C08A5D")
+BUTTON_HOVER = QColor("#814D36")
+
+
+class ProductListModel(QAbstractListModel):
+    # Вид докрутил до конца загруженного: пора показать следующую страницу
+    more_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.products = []
+        self.has_more = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.products)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.products):
+            return None
+        product = self.products[index.row()]
+        if role == ProductRole:
+            return product
+        if role == Qt.ItemDataRole.DisplayRole:
+            return product['name']
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return product.get('description') or None
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid() and self.has_more:
+            self.more_requested.emit()
+
+    def set_products(self, products):
+        self.beginResetModel()
+        self.products = list(products)
+        self.endResetModel()
+
+    def merge(self, products):
+        """Применяет новый список построчно: вставки, удаления и изменения без сброса модели.
+
+        Оба списка упорядочены по id; изменённой считается строка с другим объектом записи.
+        """
+        new = list(products)
+        row = 0
+        j = 0
+        while row < len(self.products) or j < len(new):
+            old = self.products[row] if row < len(self.products) else None
+            product = new[j] if j < len(new) else None
+            if product is None or (old is not None and old['id'] < product['id']):
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.products[row]
+                self.endRemoveRows()
+            elif old is None or product['id'] < old['id']:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.products.insert(row, product)
+                self.endInsertRows()
+                row += 1
+                j += 1
+            else:
+                if old is not product:
+                    self.products[row] = product
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index)
+                row += 1
+                j += 1
+
+
+class ProductCardDelegate(QStyledItemDelegate):
+    """Рисует карточку товара вместо набора виджетов; рисуются только видимые карточки."""
+
+    edit_requested = pyqtSignal(int)
+
+    def __init__(self, photo_source, parent=None):
+        super().__init__(parent)
+        self.photo_source = photo_source  # миниатюры фото товаров по id
+        self.thumbnails = thumbnail_cache(PHOTO_WIDTH, PHOTO_HEIGHT)
+        self._hover_button = None
+
+    def sizeHint(self, option, index):
+        return QSize(CARD_WIDTH, CARD_HEIGHT)
+
+    def button_rect(self, rect):
+        return QRect(rect.left() + PADDING, rect.bottom() - PADDING - BUTTON_HEIGHT,
+                     rect.width() - 2 * PADDING, BUTTON_HEIGHT)
+
+    def photo(self, product):
+        """Миниатюра из кэша или None, пока она готовится в фоне. False — фото нет или оно не читается."""
+        key = product.get('photo_hash')
+        if not key or self.thumbnails.failed(key):
+            return False
+        # Байты фото подгружаются только для отрисованных (видимых) карточек
+        return self.thumbnails.get(key, source=self.photo_source, row_id=product['id'])
+
+    def paint(self, painter, option, index):
+        product = index.data(ProductRole)
+        if product is None:
+            return
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = option.rect.adjusted(2, 2, -2, -2)
+
+        # Фон карточки
+        selected = option.state & QStyle.StateFlag.State_Selected
+        painter.setPen(QPen(CARD_BORDER, 1))
+        painter.setBrush(CARD_SELECTED if selected else CARD_BG)
+        painter.drawRoundedRect(QRectF(rect), 8, 8)
+
+        # Фото
+        photo_rect = QRect(rect.left() + (rect.width() - PHOTO_WIDTH) // 2, rect.top() + PADDING,
+                           PHOTO_WIDTH, PHOTO_HEIGHT)
+        painter.setPen(TEXT_COLOR)
+        pixmap = self.photo(product)
+        if pixmap:
+            x = photo_rect.left() + (PHOTO_WIDTH - pixmap.width()) // 2
+            y = photo_rect.top() + (PHOTO_HEIGHT - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        elif pixmap is None:
+            # Заглушка, пока миниатюра декодируется
+            painter.setBrush(PLACEHOLDER_BG)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.drawRoundedRect(QRectF(photo_rect), 6, 6)
+            painter.setPen(TEXT_COLOR)
+            painter.drawText(photo_rect, Qt.AlignmentFlag.AlignCenter, "Загрузка…")
+        else:
+            painter.drawText(photo_rect, Qt.AlignmentFlag.AlignCenter, "Нет фото")
+
+        # Информация
+        text_rect = QRect(rect.left() + PADDING, photo_rect.bottom() + PADDING,
+                          rect.width() - 2 * PADDING, 0)
+        base_font = QFont(option.font)
+
+        def draw_line(text, font, lines=1):
+            painter.setFont(font)
+            height = painter.fontMetrics().lineSpacing() * lines
+            line_rect = QRect(text_rect.left(), text_rect.top(), text_rect.width(), height)
+            if lines == 1:
+                text = painter.fontMetrics().elidedText(text, Qt.TextElideMode.ElideRight, line_rect.width())
+            painter.drawText(line_rect, WRAP_LEFT, text)
+            text_rect.moveTop(text_rect.top() + height + 2)
+
+        bold = QFont(base_font)
+        bold.setBold(True)
+        draw_line(product['name'], bold, lines=2)
+        draw_line(f"Категория: {product['category_name']}", base_font)
+        draw_line(f"Цена: {product['price']} ₽", base_font)
+
+        if product['weight_or_volume'] and product['unit_name']:
+            draw_line(f"Объём/Вес: {product['weight_or_volume']} {product['unit_name']}", base_font)
+
+        if product['description']:
+            italic = QFont(base_font)
+            italic.setItalic(True)
+            draw_line(product['description'], italic)
+
+        # Кнопка редактирования
+        button = self.button_rect(rect)
+        hovered = self._hover_button == index.row()
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(BUTTON_HOVER if hovered else BUTTON_BG)
+        painter.drawRoundedRect(QRectF(button), 6, 6)
+        painter.setPen(QColor("white"))
+        painter.setFont(base_font)
+        painter.drawText(button, Qt.AlignmentFlag.AlignCenter, "✏️ Редактировать")
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        if event.type() == QEvent.Type.MouseMove:
+            over = self.button_rect(rect).contains(event.position().toPoint())
+            hover = index.row() if over else None
+            if hover != self._hover_button:
+                self._hover_button = hover
+                if option.widget is not None:
+                    option.widget.viewport().update()
+        elif event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            if self.button_rect(rect).contains(event.position().toPoint()):
+                product = index.data(ProductRole)
+                if product is not None:
+                    self.edit_requested.emit(product['id'])
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ProductCatalogView(QListView):
+    """Сетка карточек товаров на модели/делегате."""
+
+    edit_requested = pyqtSignal(int)
+    more_requested = pyqtSignal()
+
+    def __init__(self, photo_source, parent=None):
+        super().__init__(parent)
+        self.catalog_model = ProductListModel(self)
+        self.delegate = ProductCardDelegate(photo_source, self)
+
+        self.setModel(self.catalog_model)
+        self.setItemDelegate(self.delegate)
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setSpacing(10)
+        self.setMouseTracking(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+
+        self.delegate.edit_requested.connect(self.edit_requested)
+        self.catalog_model.more_requested.connect(self.more_requested)
+        self.delegate.thumbnails.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.doubleClicked.connect(self._on_double_click)
+
+    def set_products(self, products):
+        self.catalog_model.set_products(products)
+
+    def merge_products(self, products):
+        self.catalog_model.merge(products)
+
+    def set_has_more(self, has_more):
+        self.catalog_model.has_more = has_more
+
+    def _on_thumbnail_ready(self, key):
+        self.viewport().update()
+
+    def _on_double_click(self, index):
+        product = index.data(ProductRole)
+        if product is not None:
+            self.edit_requested.emit(product['id'])
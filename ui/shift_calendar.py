@@ -0,0 +1,45 @@
+from calendar import monthrange
+from datetime import date
+
+from PyQt6.QtWidgets import QCalendarWidget
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor
+
+WORKED_COLOR = QColor(76, 175, 80, 70)
+HOURS_COLOR = QColor(27, 94, 32)
+
+
+def add_months(year, month, delta):
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+class ShiftCalendar(QCalendarWidget):
+    """Календарь, в котором отработанные дни закрашены и подписаны часами смены."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.days = {}  # date -> часы
+
+    def set_days(self, days):
+        self.days = days
+        self.updateCells()
+
+    def paintCell(self, painter, rect, qdate):
+        super().paintCell(painter, rect, qdate)
+        hours = self.days.get(qdate.toPyDate())
+        if hours is None:
+            return
+        painter.save()
+        painter.fillRect(rect.adjusted(1, 1, -1, -1), WORKED_COLOR)
+        font = painter.font()
+        font.setPointSizeF(max(font.pointSizeF() * 0.7, 6))
+        painter.setFont(font)
+        painter.setPen(HOURS_COLOR)
+        painter.drawText(rect.adjusted(2, 1, -3, -1),
+                         Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom, f"{float(hours):g} ч")
+        painter.restore()
@@ -5,6 +5,13 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt
 from decimal import Decimal
 from database.db import Database
+from database.events import event_bus
+from database.history import calculation_log
+from database.margins import compute, save_plan, to_kopecks, to_rate, format_kopecks
+from database.qt_async import QueryChannel
+from ui.dialogs.history_dialog import HistoryDialog
+from ui.dialogs.margins_dialog import MarginsDialog
+from ui.dialogs.scenario_dialog import ScenarioDialog
 
 # Импортируем для доступа к фиксированным расходам
 from ui.tab_settings import SettingsTab  # корректный путь
@@ -13,6 +20,12 @@ class CalculatorTab(QWidget):
     def __init__(self):
         super().__init__()
         self.db = Database()
+        self.products = {}  # id -> цена
+        self.changed_ids = set()  # изменённые товары, ещё не перечитанные из базы
+        self.products_query = QueryChannel(self)
+        self.fixed_costs_query = QueryChannel(self)
+        self.plan_query = QueryChannel(self)
+        self.save_plan_query = QueryChannel(self)
         self.init_ui()
 
     def init_ui(self):
@@ -21,6 +34,7 @@ class CalculatorTab(QWidget):
         # Левая часть
         left_layout = QVBoxLayout()
         self.product_select = QComboBox()
+        self.product_select.currentIndexChanged.connect(self.load_plan)
         self.load_products()
 
         self.cost_input = QLineEdit()
@@ -37,8 +51,14 @@ class CalculatorTab(QWidget):
         change_price_btn = QPushButton("Изменить цену")
         change_price_btn.clicked.connect(self.change_price)
 
-        refresh_products_btn = QPushButton("Обновить список товаров")
-        refresh_products_btn.clicked.connect(self.load_products)
+        margins_btn = QPushButton("📊 Маржа всего меню")
+        margins_btn.clicked.connect(self.open_margins)
+
+        scenarios_btn = QPushButton("🧮 Сценарии")
+        scenarios_btn.clicked.connect(self.open_scenarios)
+
+        history_btn = QPushButton("📜 История расчётов")
+        history_btn.clicked.connect(self.open_history)
 
         left_layout.addWidget(QLabel("Выберите товар"))
         left_layout.addWidget(self.product_select)
@@ -53,7 +73,9 @@ class CalculatorTab(QWidget):
         left_layout.addWidget(self.result_label)
         left_layout.addWidget(self.profit_bar)
         left_layout.addWidget(change_price_btn)
-        left_layout.addWidget(refresh_products_btn)
+        left_layout.addWidget(margins_btn)
+        left_layout.addWidget(scenarios_btn)
+        left_layout.addWidget(history_btn)
 
         # Фиксированные расходы
         self.bank_fee_input = QLineEdit()
@@ -107,11 +129,70 @@ class CalculatorTab(QWidget):
         self.load_fixed_costs()
         self.apply_styles()
 
+        # Цены, названия товаров и налоги обновляются сами после правок на любой вкладке
+        bus = event_bus(self.db)
+        bus.subscribe(self, ("products",), self.on_products_changed)
+        bus.subscribe(self, ("fixed_costs",), lambda event: self.load_fixed_costs())
+
     def load_products(self):
+        self.products_query.run(
+            self.db.fetch_all_async("SELECT id, name, price FROM products"),
+            self.show_products,
+            self.show_load_error
+        )
+
+    def show_load_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных:\n{error}")
+
+    def show_products(self, products):
         self.product_select.clear()
-        products = self.db.fetch_all("SELECT id, name, price FROM products")
-        self.products = {f"{p['name']} ({p['price']} ₽)": (p['id'], p['price']) for p in products}
-        self.product_select.addItems(self.products.keys())
+        self.products = {}
+        for product in products:
+            self.product_select.addItem(self.product_text(product), product['id'])
+            self.products[product['id']] = product['price']
+        self.refresh_changed()
+
+    @staticmethod
+    def product_text(product):
+        return f"{product['name']} ({product['price']} ₽)"
+
+    def on_products_changed(self, event):
+        if event.changes is None:
+            self.load_products()
+            return
+        self.changed_ids.update(event.ids)
+        self.refresh_changed()
+
+    def refresh_changed(self):
+        # Во время загрузки списка изменения ждут её окончания
+        if not self.changed_ids or self.products_query.is_busy():
+            return
+        ids = sorted(self.changed_ids)
+        self.changed_ids.clear()
+        placeholders = ", ".join(["%s"] * len(ids))
+        self.products_query.run(
+            self.db.fetch_all_async(f"SELECT id, name, price FROM products WHERE id IN ({placeholders})", ids),
+            lambda rows: self.apply_changes(ids, rows),
+            self.show_load_error
+        )
+
+    def apply_changes(self, ids, rows):
+        # Меняются только затронутые строки списка: выбранный товар не сбрасывается
+        found = {row['id']: row for row in rows}
+        for product_id in ids:
+            index = self.product_select.findData(product_id)
+            product = found.get(product_id)
+            if product is None:
+                if index >= 0:
+                    self.product_select.removeItem(index)
+                self.products.pop(product_id, None)
+            elif index >= 0:
+                self.product_select.setItemText(index, self.product_text(product))
+                self.products[product_id] = product['price']
+            else:
+                self.product_select.addItem(self.product_text(product), product_id)
+                self.products[product_id] = product['price']
+        self.refresh_changed()
 
     def apply_styles(self):
         try:
@@ -121,7 +202,13 @@ class CalculatorTab(QWidget):
             print("⚠️ Файл стилей не найден")
 
     def load_fixed_costs(self):
-        fixed = self.db.fetch_one("SELECT * FROM fixed_costs WHERE id = 1")
+        self.fixed_costs_query.run(
+            self.db.fetch_one_async("SELECT * FROM fixed_costs WHERE id = 1"),
+            self.show_fixed_costs,
+            self.show_load_error
+        )
+
+    def show_fixed_costs(self, fixed):
         if fixed:
             self.bank_fee_input.setText(str(fixed["bank_fee"] * 100))
             self.nalog_input.setText(str(fixed["nalog"] * 100))
@@ -146,11 +233,35 @@ class CalculatorTab(QWidget):
         except ValueError:
             QMessageBox.warning(self, "Ошибка", "Введите корректные значения.")
 
+    def load_plan(self):
+        # Последние введённые для товара затраты подставляются в поля
+        product_id = self.product_select.currentData()
+        if product_id is None:
+            return
+        self.plan_query.run(
+            self.db.fetch_one_async(
+                "SELECT cost_price, other_expenses, monthly_quantity FROM product_costs WHERE product_id = %s",
+                (product_id,)
+            ),
+            self.show_plan,
+            lambda e: print(f"⚠️ Не удалось загрузить затраты товара: {e}")
+        )
+
+    def show_plan(self, plan):
+        if plan:
+            self.cost_input.setText(str(plan['cost_price']))
+            self.other_expenses_input.setText(str(plan['other_expenses']))
+            self.monthly_output_input.setText(str(plan['monthly_quantity']))
+
+    def read_rates(self):
+        bank_fee = Decimal(self.bank_fee_input.text().replace(',', '.')) / 100
+        nalog = Decimal(self.nalog_input.text().replace(',', '.')) / 100
+        return bank_fee, nalog
+
     def calculate_profit(self):
         try:
-            current_item = self.product_select.currentText()
-            product_id, _ = self.products.get(current_item, (None, None))
-            if not product_id:
+            product_id = self.product_select.currentData()
+            if product_id not in self.products:
                 QMessageBox.warning(self, "Ошибка", "Выберите продукт.")
                 return
 
@@ -162,35 +273,72 @@ class CalculatorTab(QWidget):
                 QMessageBox.warning(self, "Ошибка", "Количество должно быть больше нуля.")
                 return
 
-            product = self.db.fetch_one("SELECT price FROM products WHERE id = %s", (product_id,))
-            if not product:
-                QMessageBox.critical(self, "Ошибка", "Продукт не найден.")
-                return
-
-            price = Decimal(product["price"])
+            bank_fee, nalog = self.read_rates()
 
-            bank_fee = Decimal(self.bank_fee_input.text().replace(',', '.')) / 100
-            nalog = Decimal(self.nalog_input.text().replace(',', '.')) / 100
-
-            revenue = price * quantity
-            total_variable_cost = (cost_price + other_expenses) * quantity
-            total_fixed_cost = revenue * (bank_fee + nalog)
-            total_cost = total_variable_cost + total_fixed_cost
-
-            net_profit = revenue - total_cost
-            profit_percent = (net_profit / revenue) * 100 if revenue > 0 else 0
-
-            self.result_label.setText(
-                f"Цена: {price:.2f} ₽ | Себестоимость + расходы: {(cost_price + other_expenses):.2f} ₽\n"
-                f"Выручка: {revenue:.2f} ₽\n"
-                f"Итоговая прибыль: {net_profit:.2f} ₽ ({profit_percent:.1f}%)"
-            )
-            self.update_progress_bar(profit_percent)
-
-        except ValueError:
+        except (ValueError, ArithmeticError):
             QMessageBox.warning(self, "Ошибка", "Введите корректные числовые значения.")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", str(e))
+            return
+
+        # Цена — из списка товаров, который обновляется через шину изменений; формулы те же,
+        # что у расчёта по всему меню
+        price = self.products[product_id]
+        if price is None:
+            QMessageBox.warning(self, "Ошибка", "У продукта не указана цена.")
+            return
+        margins = compute([to_kopecks(price)], [to_kopecks(cost_price)], [to_kopecks(other_expenses)],
+                          [quantity], to_rate(bank_fee), to_rate(nalog))
+        profit_percent = 0 if margins.revenue[0] <= 0 else float(margins.margin[0])
+        self.result_label.setText(
+            f"Цена: {price:.2f} ₽ | Себестоимость + расходы: {(cost_price + other_expenses):.2f} ₽\n"
+            f"Выручка: {format_kopecks(margins.revenue[0])} ₽\n"
+            f"Итоговая прибыль: {format_kopecks(margins.net_profit[0])} ₽ ({profit_percent:.1f}%)"
+        )
+        self.update_progress_bar(profit_percent)
+
+        # В историю — через буфер: запись в базу пачками в фоне
+        calculation_log(self.db).record(
+            product_id, price, cost_price, other_expenses, quantity, bank_fee, nalog,
+            Decimal(int(margins.net_profit[0])) / 100
+        )
+
+        # Введённые затраты запоминаются для таблицы маржи по всему меню
+        self.save_plan_query.run(
+            self.db.submit(save_plan, self.db, product_id, cost_price, other_expenses, quantity),
+            lambda _: None,
+            lambda e: print(f"⚠️ Не удалось сохранить затраты товара: {e}")
+        )
+
+    def open_margins(self):
+        try:
+            bank_fee, nalog = self.read_rates()
+        except (ValueError, ArithmeticError):
+            QMessageBox.warning(self, "Ошибка", "Введите корректные комиссию и налог.")
+            return
+        MarginsDialog(self.db, bank_fee, nalog, self).exec()
+
+    def open_scenarios(self):
+        # Начальные значения — из полей калькулятора; незаполненные поля считаются нулём
+        def number(field):
+            try:
+                return Decimal(field.text().replace(',', '.'))
+            except ArithmeticError:
+                return Decimal(0)
+
+        product_id = self.product_select.currentData()
+        values = {
+            "price": Decimal(self.products.get(product_id) or 0),
+            "cost": number(self.cost_input),
+            "other": number(self.other_expenses_input),
+            "quantity": int(number(self.monthly_output_input)),
+            "bank_fee": number(self.bank_fee_input) / 100,
+            "nalog": number(self.nalog_input) / 100,
+        }
+        ScenarioDialog(values, self).exec()
+
+    def open_history(self):
+        products = [(self.product_select.itemData(i), self.product_select.itemText(i))
+                    for i in range(self.product_select.count())]
+        HistoryDialog(self.db, products, self.product_select.currentData(), self).exec()
 
     def update_progress_bar(self, percent):
         self.profit_bar.setValue(int(percent))
@@ -205,16 +353,13 @@ class CalculatorTab(QWidget):
             self.profit_bar.setFormat("Высокая прибыль (%p%)")
 
     def change_price(self):
-        current_item = self.product_select.currentText()
-        product_id, _ = self.products.get(current_item, (None, None))
-
-        if not product_id:
+        product_id = self.product_select.currentData()
+        if product_id not in self.products:
             QMessageBox.warning(self, "Ошибка", "Выберите продукт.")
             return
 
-        dialog = ChangePriceDialog(product_id, self.db)
-        dialog.exec()
-        self.load_products()
+        # Новая цена придёт через шину изменений
+        ChangePriceDialog(product_id, self.db).exec()
 
 
 class ChangePriceDialog(QDialog):
@@ -1,15 +1,28 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QComboBox, QCalendarWidget, QTextBrowser,
     QMessageBox, QDialog, QFormLayout, QDialogButtonBox, QTimeEdit,
-    QDoubleSpinBox, QPushButton, QLineEdit
+    QDoubleSpinBox, QPushButton, QLineEdit, QFileDialog
 )
-from PyQt6.QtCore import QDate, QTime
+from PyQt6.QtCore import QDate, QTime, QUrl
+from PyQt6.QtGui import QDesktopServices
 from database.db import Database
-from datetime import timedelta, time, datetime
-import tempfile, os, subprocess
-from openpyxl import Workbook
-from openpyxl.styles import Font
-import platform
+from database.cache import reference_cache
+from database.events import event_bus
+from database.jobs import job_runner, JobCancelled
+from database.payroll_report import export_payroll
+from database.payroll_rollup import ROLLUP_TABLES, apply_shift_change, fetch_shift, payroll_summary
+from database.qt_async import QueryChannel
+from ui.shift_calendar import ShiftCalendar, add_months, month_bounds
+from collections import OrderedDict
+from datetime import timedelta, time
+import os, shutil, tempfile
+
+# Готовые файлы сводок; повторный экспорт того же периода копирует файл отсюда
+REPORT_DIR = os.path.join(tempfile.gettempdir(), "coffee_shop_reports")
+# От этих таблиц зависят сводка и выгрузка смен
+PAYROLL_TABLES = ("shifts", "employees")
+# Сколько месяцев смен (сотрудник × месяц) держать в памяти вкладки
+MONTH_CACHE = 36
 
 
 def to_qtime(value):
@@ -70,9 +83,8 @@ class AddEmployeeDialog(QDialog):
 
     def load_positions(self):
         self.position_combo.clear()
-        positions = self.db.fetch_all("SELECT id, name FROM positions")
-        for pos in positions:
-            self.position_combo.addItem(pos['name'], pos['id'])
+        for pos_id, name in reference_cache(self.db).positions().items():
+            self.position_combo.addItem(name, pos_id)
 
     def validate_and_accept(self):
         # Простая валидация
@@ -162,13 +174,19 @@ class EditShiftDialog(QDialog):
         return start.secsTo(end) / 3600
 
 
+def build_payroll_file(job, db, start_date, end_date, ext):
+    # Выполняется в фоновой задаче
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"Сводка_{start_date}_{end_date}{ext}")
+    return export_payroll(db, path, start_date, end_date, progress=job.report)
+
+
 class SummaryDialog(QDialog):
     def __init__(self, parent=None, db=None, employees=None):
         super().__init__(parent)
         self.setWindowTitle("Сводка по сменам")
         self.db = db
         self.employees = employees
-        self.summary_data = []
 
         self.start_date_edit = QCalendarWidget()
         self.end_date_edit = QCalendarWidget()
@@ -193,20 +211,22 @@ class SummaryDialog(QDialog):
         layout.addWidget(self.close_button)
         self.setLayout(layout)
 
+    def period(self):
+        return (self.start_date_edit.selectedDate().toString("yyyy-MM-dd"),
+                self.end_date_edit.selectedDate().toString("yyyy-MM-dd"))
+
     def show_summary(self):
-        start_date = self.start_date_edit.selectedDate().toString("yyyy-MM-dd")
-        end_date = self.end_date_edit.selectedDate().toString("yyyy-MM-dd")
-
-        result = self.db.fetch_all("""
-            SELECT e.first_name, e.last_name, SUM(s.shift_salary) as total_salary, COUNT(*) as shift_count
-            FROM shifts s
-            JOIN employees e ON s.employee_id = e.id
-            WHERE s.shift_date BETWEEN %s AND %s
-            GROUP BY e.id, e.first_name, e.last_name
-            ORDER BY total_salary DESC
-        """, (start_date, end_date))
-
-        self.summary_data = result
+        start_date, end_date = self.period()
+        # Повторный запрос того же периода отвечается из кэша, пока смены не менялись
+        job_runner().start(
+            "payroll_summary", f"Сводка по сменам {start_date} — {end_date}",
+            lambda job: payroll_summary(self.db, start_date, end_date),
+            key=(start_date, end_date), tables=PAYROLL_TABLES + ROLLUP_TABLES, db=self.db, owner=self,
+            on_result=lambda result: self.show_summary_result(result, start_date, end_date),
+            on_error=lambda e: self.show_error("Не удалось сформировать сводку", e)
+        )
+
+    def show_summary_result(self, result, start_date, end_date):
         self.result_browser.clear()
         self.result_browser.append(f"Сводка с {start_date} по {end_date}:\n")
 
@@ -217,85 +237,57 @@ class SummaryDialog(QDialog):
         for row in result:
             full_name = f"{row['first_name']} {row['last_name']}"
             self.result_browser.append(
-                f"👤 {full_name} — 💰 {row['total_salary']:.2f} ₽ ({row['shift_count']} смен)"
+                f"👤 {full_name} — 💰 {row['total_salary']:.2f} ₽ "
+                f"({row['shift_count']} смен, {row['total_hours']:.2f} ч)"
             )
 
     def export_to_excel(self):
-        start_date = self.start_date_edit.selectedDate().toString("yyyy-MM-dd")
-        end_date = self.end_date_edit.selectedDate().toString("yyyy-MM-dd")
+        start_date, end_date = self.period()
 
-        if not self.summary_data:
-            QMessageBox.warning(self, "Нет данных", "Сначала сформируйте сводку.")
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт смен", f"Сводка_{start_date}_{end_date}.xlsx", "Excel (*.xlsx);;CSV (*.csv)"
+        )
+        if not path:
             return
+        ext = ".csv" if path.lower().endswith(".csv") else ".xlsx"
+        self.export_button.setEnabled(False)
+        job_runner().start(
+            "payroll_export", f"Экспорт смен {start_date} — {end_date}",
+            build_payroll_file, self.db, start_date, end_date, ext,
+            key=(start_date, end_date, ext), tables=PAYROLL_TABLES, db=self.db, owner=self,
+            on_result=lambda report: self.export_finished(report, path),
+            on_error=lambda e: self.show_error("Ошибка при экспорте", e)
+        )
 
+    def export_finished(self, report, path):
+        self.export_button.setEnabled(True)
         try:
-            wb = Workbook()
-            wb.remove(wb.active)
-
-            for row in self.summary_data:
-                emp_name = f"{row['first_name']} {row['last_name']}"
-                ws = wb.create_sheet(title=emp_name[:31])
-
-                ws.append(["Дата", "Начало", "Конец", "Часы", "Зарплата"])
-                ws.row_dimensions[1].font = Font(bold=True)
-
-                shifts = self.db.fetch_all("""
-                    SELECT shift_date, shift_start, shift_end, shift_salary
-                    FROM shifts
-                    WHERE employee_id = (
-                        SELECT id FROM employees WHERE first_name = %s AND last_name = %s
-                    ) AND shift_date BETWEEN %s AND %s
-                    ORDER BY shift_date
-                """, (row['first_name'], row['last_name'], start_date, end_date))
-
-                total_salary = 0
-                total_hours = 0
-
-                for shift in shifts:
-                    start = to_qtime(shift['shift_start'])
-                    end = to_qtime(shift['shift_end'])
-                    hours = round(start.secsTo(end) / 3600, 2)
-                    salary = float(shift['shift_salary'])
-
-                    total_salary += salary
-                    total_hours += hours
-
-                    ws.append([
-                        shift['shift_date'],
-                        shift['shift_start'],
-                        shift['shift_end'],
-                        hours,
-                        salary
-                    ])
-
-                ws.append([])
-                ws.append(["Итого", "", "", total_hours, total_salary])
-                ws.row_dimensions[ws.max_row].font = Font(bold=True)
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            temp_path = os.path.join(tempfile.gettempdir(), f"Сводка_{timestamp}.xlsx")
-            wb.save(temp_path)
-
-            system = platform.system()
-            if system == "Windows":
-                os.startfile(temp_path)
-            elif system == "Darwin":  # macOS
-                subprocess.call(["open", temp_path])
-            elif system == "Linux":
-                subprocess.call(["xdg-open", temp_path])
-            else:
-                QMessageBox.information(self, "Инфо", f"Файл сохранён: {temp_path}\nОткройте его вручную.")
-
-            QMessageBox.information(self, "Готово", f"Файл экспортирован: {temp_path}")
+            # Файл строится в папке отчётов и копируется туда, куда выбрал пользователь
+            if os.path.abspath(report.path) != os.path.abspath(path):
+                shutil.copyfile(report.path, path)
+        except OSError as e:
+            self.show_error("Ошибка при экспорте", e)
+            return
+        if not QDesktopServices.openUrl(QUrl.fromLocalFile(path)):
+            QMessageBox.information(self, "Инфо", f"Файл сохранён: {path}\nОткройте его вручную.")
+        QMessageBox.information(self, "Готово", f"Файл экспортирован: {path}\n{report.summary()}")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при экспорте:\n{e}")
+    def show_error(self, title, error):
+        self.export_button.setEnabled(True)
+        if not isinstance(error, JobCancelled):
+            QMessageBox.critical(self, "Ошибка", f"{title}:\n{error}")
 
 
 class EmployeeTab(QWidget):
     def __init__(self):
         super().__init__()
         self.db = Database()
+        self.employees_data = {}
+        self.changed_ids = set()  # изменённые сотрудники, ещё не перечитанные из базы
+        self.employees_query = QueryChannel(self)
+        self.shifts_query = QueryChannel(self)
+        self.months = OrderedDict()  # (сотрудник, год, месяц) -> {дата: смена}
+        self.pending_click = None  # день, по которому щёлкнули до загрузки его месяца
         self.init_ui()
 
     def init_ui(self):
@@ -306,8 +298,9 @@ class EmployeeTab(QWidget):
         layout.addWidget(QLabel("Выберите сотрудника:"))
         layout.addWidget(self.employee_selector)
 
-        self.calendar = QCalendarWidget()
+        self.calendar = ShiftCalendar()
         self.calendar.clicked.connect(self.on_calendar_clicked)
+        self.calendar.currentPageChanged.connect(lambda year, month: self.load_shifts())
         layout.addWidget(self.calendar)
 
         self.info_browser = QTextBrowser()
@@ -322,18 +315,28 @@ class EmployeeTab(QWidget):
         self.summary_button.clicked.connect(self.open_summary)
         layout.addWidget(self.summary_button)
 
-        self.refresh_button = QPushButton("Обновить данные")
-        self.refresh_button.clicked.connect(self.load_employees)
-        layout.addWidget(self.refresh_button)
-
         self.add_employee_button = QPushButton("Добавить сотрудника")
         self.add_employee_button.clicked.connect(self.add_employee)
         layout.addWidget(self.add_employee_button)
 
+        # Сотрудники и смены обновляются сами после правок здесь и на других компьютерах
+        bus = event_bus(self.db)
+        bus.subscribe(self, ("employees",), self.on_employees_changed)
+        bus.subscribe(self, ("shifts",), self.on_shifts_changed)
         self.load_employees()
 
     def load_employees(self):
-        employees = self.db.fetch_all("SELECT id, first_name, last_name FROM employees")
+        self.employees_query.run(
+            self.db.fetch_all_async("SELECT id, first_name, last_name FROM employees"),
+            self.show_employees,
+            self.show_load_error
+        )
+
+    def show_load_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных:\n{error}")
+
+    def show_employees(self, employees):
+        self.employee_selector.blockSignals(True)
         self.employee_selector.clear()
         self.employees_data = {}
 
@@ -341,43 +344,137 @@ class EmployeeTab(QWidget):
             full_name = f"{emp['first_name']} {emp['last_name']}"
             self.employee_selector.addItem(full_name, emp['id'])
             self.employees_data[emp['id']] = full_name
+        self.employee_selector.blockSignals(False)
 
         if employees:
             self.load_shifts()
+        self.refresh_changed()
+
+    def on_employees_changed(self, event):
+        if event.changes is None:
+            self.load_employees()
+            return
+        self.changed_ids.update(event.ids)
+        self.refresh_changed()
+
+    def refresh_changed(self):
+        # Во время загрузки списка изменения ждут её окончания
+        if not self.changed_ids or self.employees_query.is_busy():
+            return
+        ids = sorted(self.changed_ids)
+        self.changed_ids.clear()
+        placeholders = ", ".join(["%s"] * len(ids))
+        self.employees_query.run(
+            self.db.fetch_all_async(
+                f"SELECT id, first_name, last_name FROM employees WHERE id IN ({placeholders})", ids
+            ),
+            lambda rows: self.apply_changes(ids, rows),
+            self.show_load_error
+        )
+
+    def apply_changes(self, ids, rows):
+        # Меняются только затронутые строки списка; смены перечитываются, если выбранный сотрудник удалён
+        selected = self.employee_selector.currentData()
+        found = {row['id']: row for row in rows}
+        self.employee_selector.blockSignals(True)
+        for emp_id in ids:
+            index = self.employee_selector.findData(emp_id)
+            emp = found.get(emp_id)
+            if emp is None:
+                if index >= 0:
+                    self.employee_selector.removeItem(index)
+                self.employees_data.pop(emp_id, None)
+                continue
+            full_name = f"{emp['first_name']} {emp['last_name']}"
+            if index >= 0:
+                self.employee_selector.setItemText(index, full_name)
+            else:
+                self.employee_selector.addItem(full_name, emp_id)
+            self.employees_data[emp_id] = full_name
+        self.employee_selector.blockSignals(False)
+
+        if self.employee_selector.currentData() != selected:
+            self.load_shifts()
+        self.refresh_changed()
 
     def load_shifts(self):
+        # Смены загружаются окном: видимый месяц и соседние, чтобы листание было мгновенным
         emp_id = self.employee_selector.currentData()
         if not emp_id:
             return
+        year, month = self.calendar.yearShown(), self.calendar.monthShown()
+        window = [add_months(year, month, delta) for delta in (-1, 0, 1)]
+        missing = [ym for ym in window if (emp_id, *ym) not in self.months]
+        if (emp_id, year, month) in self.months:
+            self.show_month()
+        else:
+            self.info_browser.setPlainText("Загрузка смен…")
+            self.calendar.set_days({})
+        if not missing:
+            return
+
+        # Одним запросом по индексу (сотрудник, дата) — от первого недостающего месяца до последнего
+        months = window[window.index(missing[0]):window.index(missing[-1]) + 1]
+        start, end = month_bounds(*months[0])[0], month_bounds(*months[-1])[1]
+        hours = self.db.backend.hours_between("shift_start", "shift_end")
+        self.shifts_query.run(
+            self.db.fetch_all_async(f"""
+                SELECT id, employee_id, shift_date, shift_start, shift_end, shift_salary, {hours} AS hours
+                FROM shifts
+                WHERE employee_id = %s AND shift_date BETWEEN %s AND %s
+                ORDER BY shift_date
+            """, (emp_id, start, end)),
+            lambda shifts: self.store_months(emp_id, months, shifts),
+            self.show_load_error
+        )
 
-        shifts = self.db.fetch_all("""
-            SELECT shift_date, shift_start, shift_end, shift_salary, employee_id
-            FROM shifts
-            WHERE employee_id = %s
-            ORDER BY shift_date
-        """, (emp_id,))
+    def store_months(self, emp_id, months, shifts):
+        for year, month in months:
+            self.months[(emp_id, year, month)] = {}
+        for shift in shifts:
+            day = shift['shift_date']
+            self.months[(emp_id, day.year, day.month)][day] = shift
+        for key in months:
+            self.months.move_to_end((emp_id, *key))
+        while len(self.months) > MONTH_CACHE:
+            self.months.popitem(last=False)
+
+        self.show_month()
+        if self.pending_click is not None:
+            date, self.pending_click = self.pending_click, None
+            self.on_calendar_clicked(date)
+
+    def day_map(self, emp_id, year, month):
+        return self.months.get((emp_id, year, month))
+
+    def show_month(self):
+        emp_id = self.employee_selector.currentData()
+        year, month = self.calendar.yearShown(), self.calendar.monthShown()
+        shifts = self.day_map(emp_id, year, month) or {}
 
         self.info_browser.clear()
         self.info_browser.append(f"Смен в месяц: {len(shifts)}\n📅 Смены:")
-
         total = 0
-        dates = []
-
-        for shift in shifts:
-            date = QDate.fromString(str(shift['shift_date']), "yyyy-MM-dd")
-            dates.append(date)
+        for day in sorted(shifts):
+            shift = shifts[day]
             salary = shift['shift_salary'] or 0
             total += salary
             self.info_browser.append(
-                f"— {date.toString('dd.MM.yyyy')} ({shift['shift_start']}–{shift['shift_end']}) — {salary:.2f} ₽"
+                f"— {day.strftime('%d.%m.%Y')} ({shift['shift_start']}–{shift['shift_end']}) — {salary:.2f} ₽"
             )
-
         self.info_browser.append(f"\n💰 Всего начислено: {total:.2f} ₽")
-        self.highlight_calendar_days(dates)
 
-    def highlight_calendar_days(self, dates):
-        if dates:
-            self.calendar.setSelectedDate(dates[-1])
+        # В сетке календаря видны и дни соседних месяцев
+        days = {}
+        for delta in (-1, 0, 1):
+            for day, shift in (self.day_map(emp_id, *add_months(year, month, delta)) or {}).items():
+                days[day] = shift['hours']
+        self.calendar.set_days(days)
+
+    def on_shifts_changed(self, event):
+        # Какие месяцы затронуты, по id не понять — перечитываем видимое окно
+        self.months.clear()
+        self.load_shifts()
 
     def on_calendar_clicked(self, date: QDate):
         emp_id = self.employee_selector.currentData()
@@ -385,14 +482,16 @@ class EmployeeTab(QWidget):
             QMessageBox.warning(self, "Ошибка", "Сначала выберите сотрудника.")
             return
 
-        shift_date = date.toString("yyyy-MM-dd")
+        shifts = self.day_map(emp_id, date.year(), date.month())
+        if shifts is None:
+            # Месяц ещё загружается — ответим, когда придёт
+            self.pending_click = date
+            self.load_shifts()
+            return
+        self.edit_day_shift(shifts.get(date.toPyDate()), date.toString("yyyy-MM-dd"))
 
+    def edit_day_shift(self, shift, shift_date):
         try:
-            shift = self.db.fetch_one(
-                "SELECT * FROM shifts WHERE employee_id = %s AND shift_date = %s",
-                (emp_id, shift_date)
-            )
-
             if shift:
                 reply = QMessageBox.question(self, "Смена существует", "Смена уже существует. Изменить?",
                                              QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
@@ -404,8 +503,7 @@ class EmployeeTab(QWidget):
                 dialog = EditShiftDialog(self, employees=self.employees_data)
                 if dialog.exec():
                     data = dialog.get_data()
-                    if self.db.fetch_one("SELECT * FROM shifts WHERE shift_date = %s AND employee_id = %s",
-                                         (shift_date, data[0])):
+                    if self.has_shift(data[0], shift_date):
                         QMessageBox.warning(self, "Ошибка", "Этот сотрудник уже работает в этот день.")
                         return
                     self._save_shift(data, shift_date)
@@ -413,6 +511,14 @@ class EmployeeTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при обработке смены:\n{e}")
 
+    def has_shift(self, emp_id, shift_date):
+        day = QDate.fromString(shift_date, "yyyy-MM-dd")
+        shifts = self.day_map(emp_id, day.year(), day.month())
+        if shifts is not None:
+            return day.toPyDate() in shifts
+        return self.db.fetch_one("SELECT id FROM shifts WHERE shift_date = %s AND employee_id = %s",
+                                 (shift_date, emp_id)) is not None
+
     def _save_shift(self, data, shift_date, existing_id=None):
         employee_id, start_time, end_time, hourly_rate = data
         start = QTime.fromString(start_time, "HH:mm:ss")
@@ -425,28 +531,31 @@ class EmployeeTab(QWidget):
         hours = start.secsTo(end) / 3600
         total_salary = round(hourly_rate * hours, 2)
 
+        # Смена и итоги зарплаты по дням и месяцам меняются вместе
         if existing_id:
-            self.db.execute("""
-                UPDATE shifts
-                SET shift_start = %s, shift_end = %s, shift_salary = %s, employee_id = %s
-                WHERE id = %s
-            """, (start_time, end_time, total_salary, employee_id, existing_id))
+            with self.db.transaction():
+                old = fetch_shift(self.db, existing_id)
+                self.db.execute("""
+                    UPDATE shifts
+                    SET shift_start = %s, shift_end = %s, shift_salary = %s, employee_id = %s
+                    WHERE id = %s
+                """, (start_time, end_time, total_salary, employee_id, existing_id))
+                apply_shift_change(self.db, old, fetch_shift(self.db, existing_id))
             QMessageBox.information(self, "Обновлено", "Смена обновлена.")
         else:
-            self.db.execute("""
-                INSERT INTO shifts (employee_id, shift_date, shift_start, shift_end, shift_salary)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (employee_id, shift_date, start_time, end_time, total_salary))
+            with self.db.transaction():
+                shift_id = self.db.insert_and_get_id("""
+                    INSERT INTO shifts (employee_id, shift_date, shift_start, shift_end, shift_salary)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (employee_id, shift_date, start_time, end_time, total_salary))
+                apply_shift_change(self.db, new=fetch_shift(self.db, shift_id))
             QMessageBox.information(self, "Добавлено", f"Смена на {shift_date} добавлена.")
 
-        self.load_shifts()
-
     def open_manage_shifts(self):
         try:
             from ui.manage_shifts_dialog import ManageShiftsDialog
             dialog = ManageShiftsDialog(self, self.db, self.employees_data)
             dialog.exec()
-            self.load_shifts()
         except ImportError:
             QMessageBox.warning(self, "Ошибка", "Диалог управления сменами не найден.")
 
@@ -473,7 +582,7 @@ class EmployeeTab(QWidget):
                     data['password'],  # Здесь надо в реальном приложении захешировать
                     data['photo_path']  # можно отправлять None, если нет фото
                 ))
+                # Новый сотрудник появится в списке через шину изменений
                 QMessageBox.information(self, "Успех", "Сотрудник успешно добавлен")
-                # Обнови список сотрудников, если он есть
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось добавить сотрудника:\n{e}")
@@ -1,12 +1,38 @@
+import os
+
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QScrollArea, QGridLayout,
-    QLineEdit, QComboBox, QMessageBox
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QLineEdit, QComboBox, QMessageBox, QFileDialog
 )
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import QTimer
 from database.db import Database
+from database.blobs import BlobColumn, RenditionSource
+from database.cache import reference_cache
+from database.events import event_bus
+from database.jobs import job_runner, JobCancelled
+from database.product_index import ProductSearchIndex, normalize
+from database.product_io import import_products, export_products
+from database.qt_async import QueryChannel
+from ui import image_ingest
 from ui.dialogs.edit_product_dialog import EditProductDialog
 from ui.dialogs.add_category_dialog import AddCategoryDialog
+from ui.product_catalog import ProductCatalogView
+
+# Пауза после ввода перед фильтрацией, мс
+SEARCH_DEBOUNCE_MS = 150
+# Товаров в одной странице каталога
+CATALOG_PAGE = 120
+CATALOG_KEY = ("p.id",)
+# Таблицы, от которых зависит содержимое каталога
+CATALOG_TABLES = ("products", "categories", "units")
+
+CATALOG_QUERY = """
+    SELECT p.id, p.name, p.category_id, p.price, p.description, p.unit_id,
+           p.weight_or_volume, p.photo_hash, u.name AS unit_name, c.name AS category_name
+    FROM products p 
+    LEFT JOIN units u ON p.unit_id = u.id 
+    LEFT JOIN categories c ON p.category_id = c.id
+"""
 
 
 class ProductTab(QWidget):
@@ -14,6 +40,21 @@ class ProductTab(QWidget):
         super().__init__()
         self.selected_product = None
         self.db = Database()
+        self.products_query = QueryChannel(self)
+        self.page_query = QueryChannel(self)
+        self.index = ProductSearchIndex()
+        self.changed_ids = set()  # изменённые товары, ещё не перечитанные из базы
+        # Каталог грузится страницами по id: loaded_until — последний id в индексе,
+        # catalog_after — ключ следующей страницы (None — страниц больше нет)
+        self.loaded_until = None
+        self.catalog_after = None
+        self.prefetched = None
+        self.want_more = False
+        self.last_filter = None  # (запрос, категория, маска) последней фильтрации
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.apply_filter)
         self.init_ui()
 
     def init_ui(self):
@@ -31,8 +72,8 @@ class ProductTab(QWidget):
 
         self.load_categories()
 
-        self.search_input.textChanged.connect(self.update_product_list)
-        self.category_filter.currentIndexChanged.connect(self.update_product_list)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.category_filter.currentIndexChanged.connect(self.apply_filter)
 
         filter_layout.addWidget(QLabel("Поиск"))
         filter_layout.addWidget(self.search_input)
@@ -50,111 +91,238 @@ class ProductTab(QWidget):
         add_cat_btn.clicked.connect(self.add_category)
         filter_layout.addWidget(add_cat_btn)
 
-        # Кнопка обновления
-        update_btn = QPushButton("🔄 Обновить")
-        update_btn.clicked.connect(self.update_product_list)
-        filter_layout.addWidget(update_btn)
+        # Импорт и экспорт каталога
+        self.import_btn = QPushButton("📥 Импорт из файла")
+        self.import_btn.clicked.connect(self.import_products)
+        filter_layout.addWidget(self.import_btn)
+
+        self.export_btn = QPushButton("📤 Экспорт в файл")
+        self.export_btn.clicked.connect(self.export_products)
+        filter_layout.addWidget(self.export_btn)
 
         filter_layout.addStretch()
         main_layout.addLayout(filter_layout, 1)
 
-        # Правая часть с карточками товаров
-        self.product_area = QScrollArea()
-        self.product_area.setWidgetResizable(True)
-        self.product_container = QWidget()
-        self.grid = QGridLayout(self.product_container)
-        self.grid.setSpacing(20)
-        self.grid.setAlignment(Qt.AlignmentFlag.AlignTop)  # 🧷 добавь эту строку
-        self.product_area.setWidget(self.product_container)
+        # Правая часть с карточками товаров: рисуются только видимые
+        # Карточкам нужна только миниатюра; у старых товаров без копий — исходное фото
+        photos = RenditionSource(self.db, "products", "thumb", fallback=BlobColumn(self.db, "products", "photo"))
+        self.catalog_view = ProductCatalogView(photos)
+        self.catalog_view.edit_requested.connect(self.edit_product)
+        self.catalog_view.more_requested.connect(self.show_more)
 
-        main_layout.addWidget(self.product_area, 4)
+        main_layout.addWidget(self.catalog_view, 4)
 
-        self.update_product_list()
+        # Изменения товаров, категорий и единиц — свои и с других компьютеров
+        event_bus(self.db).subscribe(self, CATALOG_TABLES, self.on_catalog_changed)
+        self.reload_catalog()
 
     def load_categories(self):
+        # Выбранная категория сохраняется, если её не удалили
+        selected = self.category_filter.currentData()
+        self.category_filter.blockSignals(True)
         self.category_filter.clear()
         self.category_filter.addItem("Все категории")
-        categories = self.db.fetch_all("SELECT id, name FROM categories")
-        for cat in categories:
-            self.category_filter.addItem(cat['name'], cat['id'])
-
-    def update_product_list(self):
-        search = self.search_input.text().strip()
-        category = self.category_filter.currentData()
-
-        query = """
-            SELECT p.*, u.name AS unit_name, c.name AS category_name 
-            FROM products p 
-            LEFT JOIN units u ON p.unit_id = u.id 
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE 1
-        """
-        params = []
-
-        if category and self.category_filter.currentIndex() != 0:
-            query += " AND p.category_id = %s"
-            params.append(category)
-
-        if search:
-            query += " AND p.name LIKE %s"
-            params.append(f"%{search}%")
-
-        products = self.db.fetch_all(query, params)
-
-        for i in reversed(range(self.grid.count())):
-            widget = self.grid.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-
-        for i, prod in enumerate(products):
-            self.grid.addWidget(self.create_product_card(prod), i // 3, i % 3)
-
-    def create_product_card(self, product):
-        widget = QWidget()
-        layout = QVBoxLayout(widget)
-
-        # Фото
-        if product['photo']:
-            pixmap = QPixmap()
-            pixmap.loadFromData(product['photo'])
-            scaled = pixmap.scaledToWidth(150, Qt.TransformationMode.FastTransformation)
-            img_label = QLabel()
-            img_label.setPixmap(scaled)
-            layout.addWidget(img_label)
+        for cat_id, name in reference_cache(self.db).categories().items():
+            self.category_filter.addItem(name, cat_id)
+        index = self.category_filter.findData(selected) if selected is not None else 0
+        self.category_filter.setCurrentIndex(max(index, 0))
+        self.category_filter.blockSignals(False)
+        if selected is not None and index < 0:
+            self.apply_filter()
+
+    def reload_catalog(self):
+        self.page_query.cancel()
+        self.products_query.run(
+            self.db.fetch_page_async(CATALOG_QUERY, CATALOG_KEY, limit=CATALOG_PAGE),
+            self.show_catalog,
+            self.show_load_error
+        )
+
+    def fetch_products(self, ids):
+        # Выполняется в фоновом потоке; после импорта id может быть много — читаем пачками
+        rows = []
+        for start in range(0, len(ids), CATALOG_PAGE):
+            batch = ids[start:start + CATALOG_PAGE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            rows += self.db.fetch_all(CATALOG_QUERY + f" WHERE p.id IN ({placeholders}) ORDER BY p.id", batch)
+        return rows
+
+    def show_load_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить товары:\n{error}")
+
+    def show_catalog(self, result):
+        # Первая страница: время до первой отрисовки не зависит от размера каталога
+        products, self.catalog_after = result
+        self.index.build(products)
+        self.loaded_until = products[-1]['id'] if products else None
+        self.prefetched = None
+        self.want_more = False
+        self.last_filter = None
+        self.apply_filter()
+        self.request_page()
+        # Изменения, пришедшие во время загрузки, могли в неё не попасть
+        self.refresh_changed()
+
+    def request_page(self):
+        # Следующая страница грузится заранее и ждёт, пока до неё докрутят
+        self.catalog_view.set_has_more(self.catalog_after is not None or bool(self.prefetched))
+        if self.catalog_after is None or self.prefetched is not None or self.page_query.is_busy():
+            return
+        self.page_query.run(
+            self.db.fetch_page_async(CATALOG_QUERY, CATALOG_KEY, self.catalog_after, CATALOG_PAGE),
+            self.page_loaded,
+            self.show_load_error
+        )
+
+    def page_loaded(self, page):
+        self.prefetched, self.catalog_after = page
+        # Поиску и фильтру нужен весь каталог, иначе ждём прокрутки
+        search, category = self.current_filter()
+        if self.want_more or search or category is not None:
+            self.show_more()
         else:
-            layout.addWidget(QLabel("Нет фото"))
-
-        # Информация
-        layout.addWidget(QLabel(f"<b>{product['name']}</b>"))
-        layout.addWidget(QLabel(f"Категория: {product['category_name']}"))
-        layout.addWidget(QLabel(f"Цена: {product['price']} ₽"))
-
-        if product['weight_or_volume'] and product['unit_name']:
-            layout.addWidget(QLabel(f"Объём/Вес: {product['weight_or_volume']} {product['unit_name']}"))
-
-        if product['description']:
-            layout.addWidget(QLabel(f"<i>{product['description']}</i>"))
-
-        # Кнопка редактирования
-        edit_btn = QPushButton("✏️ Редактировать")
-        edit_btn.clicked.connect(lambda: self.edit_product(product['id']))
-        layout.addWidget(edit_btn)
-
-        return widget
+            self.catalog_view.set_has_more(True)
+
+    def show_more(self):
+        if self.prefetched is None:
+            self.want_more = True
+            self.request_page()
+            return
+        products, self.prefetched = self.prefetched, None
+        self.want_more = False
+        for product in products:
+            self.index.upsert(product)
+        if products:
+            self.loaded_until = products[-1]['id']
+            self.refilter()
+        self.request_page()
+
+    def on_catalog_changed(self, event):
+        if event.table == "categories":
+            self.load_categories()
+        # Переименование или удаление категории/единицы меняет многие карточки сразу
+        if event.changes is None or (event.table != "products" and event.with_op("U", "D")):
+            self.reload_catalog()
+            return
+        if event.table == "products":
+            self.changed_ids.update(event.ids)
+            self.refresh_changed()
+
+    def refresh_changed(self):
+        # Идёт загрузка каталога или предыдущих изменений — перечитаем по её окончании
+        if not self.changed_ids or self.products_query.is_busy():
+            return
+        ids = sorted(self.changed_ids)
+        self.changed_ids.clear()
+        self.products_query.run(
+            self.db.submit(self.fetch_products, ids),
+            lambda rows: self.apply_changes(ids, rows),
+            self.show_load_error
+        )
+
+    def apply_changes(self, ids, rows):
+        if self.catalog_after is not None or self.prefetched is not None:
+            # Каталог загружен не целиком: строки дальше loaded_until придут со страницами,
+            # а заранее загруженная страница могла устареть
+            ids = [i for i in ids if self.loaded_until is not None and i <= self.loaded_until]
+            rows = [row for row in rows if self.loaded_until is not None and row['id'] <= self.loaded_until]
+            self.prefetched = None
+            self.page_query.cancel()
+            self.catalog_after = (self.loaded_until,) if self.loaded_until is not None else None
+            self.request_page()
+
+        found = {row['id'] for row in rows}
+        for product_id in ids:
+            if product_id not in found:
+                self.index.remove(product_id)
+        for row in rows:
+            self.index.upsert(row)
+        self.refilter()
+        self.refresh_changed()
+
+    def refilter(self):
+        # Текущий фильтр заново по индексу; в модели меняются только затронутые карточки
+        search, category = self.current_filter()
+        mask = self.index.match(search, category)
+        self.last_filter = (search, category, mask)
+        self.catalog_view.merge_products(self.index.products_for(mask))
+
+    def current_filter(self):
+        search = normalize(self.search_input.text())
+        category = self.category_filter.currentData() if self.category_filter.currentIndex() > 0 else None
+        return search, category
+
+    def apply_filter(self):
+        self.search_timer.stop()
+        search, category = self.current_filter()
+
+        # Запрос дополнен справа — уточняем предыдущий результат, а не весь каталог
+        within = None
+        if self.last_filter:
+            last_search, last_category, last_mask = self.last_filter
+            if last_category == category and search.startswith(last_search):
+                if search == last_search:
+                    return
+                within = last_mask
+
+        mask = self.index.match(search, category, within)
+        self.last_filter = (search, category, mask)
+        self.catalog_view.set_products(self.index.products_for(mask))
+
+        # Фильтр по недогруженному каталогу: дочитываем остальные страницы
+        if (search or category is not None) and (self.catalog_after is not None or self.prefetched is not None):
+            self.show_more()
 
     def edit_product(self, product_id):
-        dialog = EditProductDialog(self.db, product_id, self)
-        result = dialog.exec()
-        if result:
-            self.update_product_list()
+        # Сохранённые правки придут через шину изменений
+        EditProductDialog(self.db, product_id, self).exec()
 
     def add_product(self):
-        dialog = EditProductDialog(self.db, parent=self)
-        if dialog.exec():
-            self.update_product_list()
+        EditProductDialog(self.db, parent=self).exec()
 
     def add_category(self):
-        dialog = AddCategoryDialog(self.db, self)
-        if dialog.exec():
-            self.load_categories()
-            self.update_product_list()
+        AddCategoryDialog(self.db, self).exec()
+
+    def import_products(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Импорт товаров", "", "Таблицы (*.xlsx *.csv)"
+        )
+        if not path:
+            return
+        self.set_transfer_busy(True)
+        job_runner().start(
+            "products_import", f"Импорт товаров: {os.path.basename(path)}",
+            lambda job: import_products(self.db, path, image_ingest.ingest_file, progress=job.report),
+            owner=self, on_result=self.import_finished, on_error=self.transfer_failed
+        )
+
+    def import_finished(self, report):
+        self.set_transfer_busy(False)
+        QMessageBox.information(self, "Импорт", report.summary())
+
+    def export_products(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт товаров", "products.xlsx", "Excel (*.xlsx);;CSV (*.csv)"
+        )
+        if not path:
+            return
+        self.set_transfer_busy(True)
+        job_runner().start(
+            "products_export", f"Экспорт товаров: {os.path.basename(path)}",
+            lambda job: export_products(self.db, path, progress=job.report),
+            owner=self, on_result=lambda count: self.export_finished(count, path),
+            on_error=self.transfer_failed
+        )
+
+    def export_finished(self, count, path):
+        self.set_transfer_busy(False)
+        QMessageBox.information(self, "Экспорт", f"Выгружено товаров: {count}\n{path}")
+
+    def transfer_failed(self, error):
+        self.set_transfer_busy(False)
+        if not isinstance(error, JobCancelled):
+            QMessageBox.critical(self, "Ошибка", str(error))
+
+    def set_transfer_busy(self, busy):
+        self.import_btn.setEnabled(not busy)
+        self.export_btn.setEnabled(not busy)
@@ -1,46 +1,14 @@
 import os
-import pymysql
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
     QMessageBox, QDateEdit, QFileDialog, QFormLayout
 )
-from PyQt6.QtCore import QDate, Qt, QBuffer, QIODevice, QByteArray
+from PyQt6.QtCore import QDate, Qt
 from PyQt6.QtGui import QPixmap, QImage, QPainter, QPainterPath
-
-# === Класс Database ===
-class Database:
-    def __init__(self):
-        try:
-            self.conn = pymysql.connect(
-                host="localhost",
-                port=3306,
-                user="root",
-                password="",
-                database="coffee_shop",
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            self.cursor = self.conn.cursor()
-            print("[DB] Подключение успешно.")
-        except Exception as e:
-            print(f"[DB] Ошибка подключения: {e}")
-            self.conn = None
-
-    def is_connected(self):
-        return self.conn is not None
-
-    def fetch_one(self, query, params=()):
-        self.cursor.execute(query, params)
-        return self.cursor.fetchone()
-
-    def execute(self, query, params=()):
-        self.cursor.execute(query, params)
-        self.conn.commit()
-
-    def close(self):
-        if self.conn:
-            self.cursor.close()
-            self.conn.close()
+from database.blobs import BlobColumn, RenditionSource, save_renditions
+from database.db import Database
+from database.qt_async import QueryChannel
+from ui import image_ingest
 
 # === Вспомогательная функция ===
 def rounded_pixmap(pixmap, size=180):
@@ -63,12 +31,21 @@ class SettingsTab(QWidget):
         super().__init__()
         self.user_id = user_id
         self.avatar_pixmap = None
+        self.avatar_renditions = None  # копии нового фото, ещё не сохранённые в базе
 
-        self.db = Database()
-        if not self.db.is_connected():
+        try:
+            self.db = Database()
+        except Exception as e:
+            print(f"[DB] Ошибка подключения: {e}")
             QMessageBox.critical(self, "Ошибка", "Не удалось подключиться к базе данных.")
             return
 
+        self.user_query = QueryChannel(self)
+        self.avatar_query = QueryChannel(self)
+        self.ingest_query = QueryChannel(self)
+        # Для аватара хватает копии «card»; у старых записей — исходное фото
+        self.photos = RenditionSource(self.db, "employees", "card",
+                                      fallback=BlobColumn(self.db, "employees", "photo_path"))
         self.init_ui()
 
         if self.user_id:
@@ -171,8 +148,17 @@ class SettingsTab(QWidget):
         self.setMinimumSize(self.size())
 
     def load_user_data(self):
+        self.user_query.run(
+            self.db.fetch_one_async("""
+                SELECT first_name, last_name, birth_date, status, login, photo_hash
+                FROM employees WHERE id = %s
+            """, (self.user_id,)),
+            self.show_user_data,
+            lambda e: QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных:\n{e}")
+        )
+
+    def show_user_data(self, user):
         try:
-            user = self.db.fetch_one("SELECT * FROM employees WHERE id = %s", (self.user_id,))
             if not user:
                 QMessageBox.warning(self, "Ошибка", "Пользователь не найден.")
                 return
@@ -188,18 +174,27 @@ class SettingsTab(QWidget):
                 if qdate.isValid():
                     self.birth_date_input.setDate(qdate)
 
-            photo_data = user.get('photo_path')
-            if photo_data:
-                image = QImage()
-                image.loadFromData(photo_data)
-                if not image.isNull():
-                    pixmap = QPixmap.fromImage(image)
-                    self.avatar_pixmap = pixmap
-                    self.set_avatar(pixmap)
+            # Фото — отдельным запросом, форма заполняется не дожидаясь его
+            if user.get('photo_hash'):
+                self.avatar_query.run(
+                    self.db.submit(self.photos.fetch_one, self.user_id),
+                    self.show_avatar,
+                    lambda e: print(f"[DB] Не удалось загрузить фото: {e}")
+                )
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных:\n{e}")
 
+    def show_avatar(self, photo_data):
+        if not photo_data or self.avatar_renditions is not None:
+            return
+        image = QImage()
+        image.loadFromData(photo_data)
+        if not image.isNull():
+            pixmap = QPixmap.fromImage(image)
+            self.avatar_pixmap = pixmap
+            self.set_avatar(pixmap)
+
     def save_user_data(self):
         first_name = self.first_name_input.text().strip()
         last_name = self.last_name_input.text().strip()
@@ -210,21 +205,25 @@ class SettingsTab(QWidget):
             QMessageBox.warning(self, "Ошибка", "Имя и фамилия обязательны.")
             return
 
+        if self.ingest_query.is_busy():
+            QMessageBox.warning(self, "Ошибка", "Фото ещё обрабатывается, подождите.")
+            return
+
         try:
-            photo_data = None
-            if self.avatar_pixmap and not self.avatar_pixmap.isNull():
-                image = self.avatar_pixmap.toImage()
-                byte_array = QByteArray()
-                buffer = QBuffer(byte_array)
-                buffer.open(QIODevice.OpenModeFlag.WriteOnly)
-                image.save(buffer, "PNG")
-                photo_data = byte_array.data()
-
-            self.db.execute("""
-                UPDATE employees 
-                SET first_name = %s, last_name = %s, birth_date = %s, status = %s, photo_path = %s 
-                WHERE id = %s
-            """, (first_name, last_name, birth_date, status, photo_data, self.user_id))
+            with self.db.transaction():
+                self.db.execute("""
+                    UPDATE employees 
+                    SET first_name = %s, last_name = %s, birth_date = %s, status = %s 
+                    WHERE id = %s
+                """, (first_name, last_name, birth_date, status, self.user_id))
+
+                # Фото пересохраняем, только если его заменили
+                if self.avatar_renditions is not None:
+                    full = image_ingest.rendition(self.avatar_renditions, "full")
+                    self.db.execute("UPDATE employees SET photo_path = %s WHERE id = %s",
+                                    (full[4], self.user_id))
+                    save_renditions(self.db, "employees", self.user_id, self.avatar_renditions)
+            self.avatar_renditions = None
 
             QMessageBox.information(self, "Готово", "Изменения сохранены.")
         except Exception as e:
@@ -237,13 +236,22 @@ class SettingsTab(QWidget):
         if not fname:
             return
 
-        pixmap = QPixmap(fname)
-        if pixmap.isNull():
+        # Уменьшение и пережатие в фоне; показываем копию того же размера, что и после загрузки
+        self.ingest_query.run(
+            image_ingest.submit(image_ingest.ingest_file, fname),
+            self.avatar_ingested,
+            lambda e: QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить изображение.\n{e}")
+        )
+
+    def avatar_ingested(self, renditions):
+        image = QImage()
+        image.loadFromData(image_ingest.rendition(renditions, "card")[4])
+        if image.isNull():
             QMessageBox.warning(self, "Ошибка", "Не удалось загрузить изображение.")
             return
-
-        self.avatar_pixmap = pixmap
-        self.set_avatar(pixmap)
+        self.avatar_renditions = renditions
+        self.avatar_pixmap = QPixmap.fromImage(image)
+        self.set_avatar(self.avatar_pixmap)
 
     def set_avatar(self, pixmap):
         rounded = rounded_pixmap(pixmap, 180)
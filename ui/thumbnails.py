@@ -0,0 +1,178 @@
+# ui/thumbnails.py
+# Кэш миниатюр фото: LRU в памяти с бюджетом в байтах и каталог на диске.
+# Декодирование и масштабирование — в пуле потоков Qt.
+import hashlib
+import os
+from collections import OrderedDict
+
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QStandardPaths, QTimer, pyqtSignal
+
+MEMORY_BUDGET = 32 * 1024 * 1024
+DISK_FORMAT = "PNG"
+
+
+def photo_key(data):
+    """Ключ кэша — хэш содержимого, а не id товара: одинаковые фото делят миниатюру."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def default_directory():
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+    return os.path.join(base or os.path.expanduser("~/.cache/coffee_shop"), "thumbnails")
+
+
+class _Loaded(QObject):
+    # Сигнал из рабочего потока; получатель живёт в потоке GUI
+    loaded = pyqtSignal(str, QImage)
+
+
+class _ThumbnailJob(QRunnable):
+    """Пачка миниатюр: с диска, из переданных байтов или одним запросом к источнику."""
+
+    def __init__(self, cache, items, source=None):
+        super().__init__()
+        self.directory = cache.directory
+        self.path = cache.path
+        self.width = cache.width
+        self.height = cache.height
+        self.signals = cache._signals
+        self.items = items  # ключ -> байты или id строки в источнике
+        self.source = source
+
+    def run(self):
+        missing = {}
+        for key, data in self.items.items():
+            image = QImage()
+            path = self.path(key)
+            if os.path.exists(path):
+                image.load(path)
+            if image.isNull() and self.source is not None:
+                missing[key] = data
+                continue
+            if image.isNull() and data:
+                image = self.scale(key, data)
+            self.signals.loaded.emit(key, image)
+
+        if missing:
+            # Байты только для тех строк, чьих миниатюр нет на диске
+            try:
+                blobs = self.source.fetch(missing.values())
+            except Exception as e:
+                print(f"[Thumbnails] Не удалось загрузить фото: {e}")
+                blobs = {}
+            for key, row_id in missing.items():
+                data = blobs.get(row_id)
+                self.signals.loaded.emit(key, self.scale(key, data) if data else QImage())
+
+    def scale(self, key, data):
+        image = QImage.fromData(data)
+        if not image.isNull():
+            image = image.scaled(self.width, self.height, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+            self.save(image, self.path(key))
+        return image
+
+    def save(self, image, path):
+        # Пишем во временный файл и переименовываем: недописанный файл не прочтётся
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            if image.save(tmp_path, DISK_FORMAT):
+                os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[Thumbnails] Не удалось сохранить миниатюру: {e}")
+
+
+class ThumbnailCache(QObject):
+    """Миниатюры фиксированного размера по ключу содержимого.
+
+    get() возвращает готовый QPixmap или None и ставит загрузку в очередь;
+    по готовности испускается thumbnail_ready(key). Вместо байтов можно передать
+    source (database.blobs.BlobColumn) и id строки: запросы, накопившиеся за один
+    проход цикла событий (отрисовку видимых карточек), уходят одной пачкой.
+    """
+
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, width, height, budget=MEMORY_BUDGET, directory=None, parent=None):
+        super().__init__(parent)
+        self.width = width
+        self.height = height
+        self.budget = budget
+        self.directory = directory or default_directory()
+        self.pool = QThreadPool.globalInstance()
+        self._pixmaps = OrderedDict()  # ключ -> QPixmap, от давно использованных к недавним
+        self._size = 0
+        self._pending = set()
+        self._failed = set()
+        self._batches = {}  # источник -> {ключ: id строки}
+        self._signals = _Loaded(self)
+        self._signals.loaded.connect(self._on_loaded)
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(0)
+        self._flush_timer.timeout.connect(self._flush)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}_{self.width}x{self.height}.png")
+
+    def get(self, key, data=None, source=None, row_id=None):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            return pixmap
+        if key not in self._pending and key not in self._failed:
+            self._pending.add(key)
+            if source is None:
+                self.pool.start(_ThumbnailJob(self, {key: data}))
+            else:
+                self._batches.setdefault(source, {})[key] = row_id
+                self._flush_timer.start()
+        return None
+
+    def _flush(self):
+        batches, self._batches = self._batches, {}
+        for source, items in batches.items():
+            self.pool.start(_ThumbnailJob(self, items, source))
+
+    def failed(self, key):
+        return key in self._failed
+
+    def clear(self):
+        self._pixmaps.clear()
+        self._size = 0
+        self._failed.clear()
+
+    @staticmethod
+    def _cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def _on_loaded(self, key, image):
+        self._pending.discard(key)
+        if image.isNull():
+            self._failed.add(key)
+            self.thumbnail_ready.emit(key)
+            return
+        # QPixmap создаём только в потоке GUI
+        pixmap = QPixmap.fromImage(image)
+        old = self._pixmaps.pop(key, None)
+        if old is not None:
+            self._size -= self._cost(old)
+        self._pixmaps[key] = pixmap
+        self._size += self._cost(pixmap)
+        while self._size > self.budget and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._size -= self._cost(evicted)
+        self.thumbnail_ready.emit(key)
+
+
+_caches = {}
+
+
+def thumbnail_cache(width, height):
+    """Общий кэш миниатюр заданного размера на всё приложение."""
+    cache = _caches.get((width, height))
+    if cache is None:
+        cache = _caches[(width, height)] = ThumbnailCache(width, height)
+    return cache